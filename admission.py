@@ -0,0 +1,80 @@
+"""
+Control de admisión del servidor web
+
+Cada proceso atiende como mucho max_inflight peticiones a la vez; las que
+llegan con el presupuesto agotado se rechazan al momento con 503 y
+Retry-After en lugar de acumular hilos y memoria. La profundidad de la
+cola de trabajos se limita aparte en JobManager (QueueFullError → 429).
+"""
+
+import logging
+import threading
+
+from flask import g, jsonify, request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HTTP_IN_FLIGHT = metrics.REGISTRY.gauge(
+    'http_requests_in_flight',
+    'Peticiones HTTP en curso en este proceso'
+)
+HTTP_SHED = metrics.REGISTRY.counter(
+    'http_requests_shed_total',
+    'Peticiones rechazadas por saturación (inflight, job_queue, update_queue)',
+    ('endpoint', 'reason')
+)
+
+
+def shed_response(status, retry_after, reason, message):
+    """Respuesta de rechazo rápida con Retry-After (y su métrica)"""
+    HTTP_SHED.inc(endpoint=request.endpoint or 'unknown', reason=reason)
+    response = jsonify({'error': message, 'retry_after': int(retry_after)})
+    response.status_code = status
+    response.headers['Retry-After'] = str(int(retry_after))
+    return response
+
+
+class AdmissionController:
+    """Presupuesto de peticiones en curso por proceso"""
+
+    def __init__(self, max_inflight=64, retry_after=2, exempt=('api_metrics', 'api_status', 'api_ready')):
+        self.max_inflight = max_inflight
+        self.retry_after = retry_after
+        self.exempt = set(exempt)
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Reservar un hueco; False si el presupuesto está agotado"""
+        with self._lock:
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                return False
+            self.inflight += 1
+            HTTP_IN_FLIGHT.set(self.inflight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+            HTTP_IN_FLIGHT.set(self.inflight)
+
+    def init_app(self, app):
+        """Registrar los hooks de entrada y salida en la app Flask"""
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        # Métricas, estado y readiness siempre responden, también bajo carga
+        if request.endpoint in self.exempt:
+            return None
+        if not self.try_acquire():
+            logger.warning(f"🚦 Saturado ({self.inflight} en curso), rechazando {request.path}")
+            return shed_response(503, self.retry_after, 'inflight', 'Servidor saturado, reintenta más tarde')
+        g.admitted = True
+        return None
+
+    def _teardown_request(self, exc):
+        if g.pop('admitted', False):
+            self.release()
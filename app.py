@@ -2,14 +2,26 @@
 Aplicación Flask principal para Bot OJS Uploader
 """
 
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, Response, send_file
+from werkzeug.security import safe_join
 import os
-import json
 import logging
+import time
 from datetime import datetime
 import uuid
 import hashlib
-import requests
+from functools import wraps
+
+import metrics
+from admission import AdmissionController, shed_response
+from config_manager import ConfigManager, json_cache, create_json_if_missing
+from events import format_sse, get_broadcaster
+from jobs import JobManager, QueueFullError
+from link_ingest import CANDIDATE_PATTERN, LinkIngestor
+from scheduler import parse_weights
+from telegram_dispatcher import get_dispatcher
+from telegram_handler import TelegramHandler
+from update_queue import UpdateQueue
 
 # Configuración
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +33,52 @@ app.secret_key = os.environ.get('SESSION_SECRET', hashlib.sha256(str(uuid.uuid4(
 # Token de Telegram (se puede configurar después)
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN', '')
 
+# URL base de la API de Telegram (sobrescribible para pruebas locales)
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+
+# Recepción de updates: 'webhook' (por defecto) o 'polling' (python main.py poll)
+TELEGRAM_MODE = os.environ.get('TELEGRAM_MODE', 'webhook')
+TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', 'https://revista-amyn.onrender.com/telegram')
+
+# Control de admisión: peticiones en curso por proceso, trabajos y updates en cola.
+# Un worker atiende como mucho GUNICORN_THREADS peticiones a la vez: con un presupuesto
+# de GUNICORN_THREADS - 1 la última petición se rechaza al momento y el hilo libre queda
+# para métricas y health checks (lo que no cabe espera en la cola de gunicorn, ver serving.py)
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+MAX_INFLIGHT_REQUESTS = int(os.environ.get('MAX_INFLIGHT_REQUESTS', max(1, GUNICORN_THREADS - 1)))
+MAX_QUEUE_DEPTH = int(os.environ.get('MAX_QUEUE_DEPTH', 200))
+MAX_UPDATE_BACKLOG = int(os.environ.get('MAX_UPDATE_BACKLOG', 1000))
+RETRY_AFTER = int(os.environ.get('RETRY_AFTER', 2))
+QUEUE_RETRY_AFTER = int(os.environ.get('QUEUE_RETRY_AFTER', 30))
+
+# Motor de subidas: 'sync' (un hilo por trabajo, UPLOAD_WORKERS) o 'async'
+# (un event loop con hasta ASYNC_UPLOAD_JOBS trabajos; requiere aiohttp)
+UPLOADER_ENGINE = os.environ.get('UPLOADER_ENGINE', 'sync')
+
+# Artefactos descargables en /api/artifacts/<tipo>/<ruta>: reportes y manifiestos,
+# y chunks ZIP de los trabajos en curso (directorio de trabajo bajo temp/)
+ARTIFACT_DIRS = {'reports': 'reports', 'chunks': 'temp'}
+
+# Cada stream SSE ocupa un hilo de gunicorn: siempre queda al menos uno para el resto de peticiones
+SSE_MAX_SUBSCRIBERS = max(0, min(int(os.environ.get('SSE_MAX_SUBSCRIBERS', GUNICORN_THREADS - 1)),
+                                 GUNICORN_THREADS - 1))
+SSE_MAX_DURATION = int(os.environ.get('SSE_MAX_DURATION', 300))
+SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))
+# Cada cuántos segundos publica cada proceso sus métricas para /api/metrics (0: solo las del proceso)
+METRICS_SHARE_INTERVAL = int(os.environ.get('METRICS_SHARE_INTERVAL', 10))
+
 class SimpleConfig:
     def __init__(self):
         self.config_dir = "config"
+        self._initialized = False
+    
+    def initialize(self):
+        """Crear config/ y los archivos por defecto en el primer uso"""
+        if self._initialized:
+            return
         os.makedirs(self.config_dir, exist_ok=True)
         self.init_configs()
+        self._initialized = True
     
     def init_configs(self):
         # Admin config
@@ -36,8 +89,7 @@ class SimpleConfig:
                 "bot_token": str(uuid.uuid4()),
                 "created_at": datetime.now().isoformat()
             }
-            with open(f"{self.config_dir}/admin.json", 'w') as f:
-                json.dump(default, f, indent=2)
+            create_json_if_missing(f"{self.config_dir}/admin.json", default)
         
         # Telegram config
         if not os.path.exists(f"{self.config_dir}/telegram.json"):
@@ -48,17 +100,65 @@ class SimpleConfig:
                 "configured_at": "",
                 "is_active": False
             }
-            with open(f"{self.config_dir}/telegram.json", 'w') as f:
-                json.dump(default, f, indent=2)
+            create_json_if_missing(f"{self.config_dir}/telegram.json", default)
     
     def get_config(self, name):
-        try:
-            with open(f"{self.config_dir}/{name}.json", 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+        """Instantánea inmutable de config/<name>.json (cacheada por mtime)"""
+        self.initialize()
+        return json_cache.load(f"{self.config_dir}/{name}.json")
 
 config = SimpleConfig()
+# Sin tocar el disco al importar: ver initialize()
+config_manager = ConfigManager(lazy=True)
+job_manager = JobManager(config_manager,
+                         max_workers=int(os.environ.get('UPLOAD_WORKERS', 2)),
+                         per_host_limit=int(os.environ.get('UPLOAD_PER_HOST_LIMIT', 2)),
+                         idempotency_ttl=int(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600)),
+                         lease_seconds=int(os.environ.get('JOB_LEASE_SECONDS', 60)),
+                         max_queue_depth=MAX_QUEUE_DEPTH,
+                         queue_retry_after=QUEUE_RETRY_AFTER,
+                         engine=UPLOADER_ENGINE,
+                         async_jobs=int(os.environ.get('ASYNC_UPLOAD_JOBS', 100)),
+                         # Reparto justo ponderado: JSON {dueño: peso}, p. ej. {"admin": 2}
+                         scheduler_weights=parse_weights(os.environ.get('SCHEDULER_WEIGHTS', '')))
+telegram_handler = TelegramHandler(config_manager, job_manager)
+events = get_broadcaster()
+# /api/metrics suma las métricas de todos los workers (cada uno tiene su propio registro)
+shared_metrics = metrics.SharedMetrics(metrics.REGISTRY, config_manager.metrics_store,
+                                       interval=METRICS_SHARE_INTERVAL, max_age=6 * METRICS_SHARE_INTERVAL)
+# Cambios de trabajos de otras instancias: una consulta por proceso, solo con paneles abiertos
+events.add_poller(job_manager.publish_remote_changes, 2.0)
+# El stream SSE tiene su propio límite (SSE_MAX_SUBSCRIBERS) y no cuenta como petición en curso
+admission = AdmissionController(max_inflight=MAX_INFLIGHT_REQUESTS, retry_after=RETRY_AFTER,
+                                exempt=('api_metrics', 'api_status', 'api_ready', 'admin_events'))
+admission.init_app(app)
+
+def initialize():
+    """Inicialización diferida: config en disco, base SQLite y migraciones
+
+    Se ejecuta con la primera petición de cada proceso, en el master de
+    gunicorn con preload (serving.py) o al arrancar los modos de main.py.
+    """
+    config.initialize()
+    config_manager.initialize()
+
+@app.before_request
+def start_process():
+    """Primera petición del proceso: inicializar y arrancar los workers de subida"""
+    initialize()
+    job_manager.start()
+    shared_metrics.start()
+
+def require_api_token(view):
+    """Exigir header X-Bot-Token (o sesión de administrador)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Bot-Token', '')
+        admin_config = config.get_config('admin')
+        if 'admin_logged_in' in session or (token and token == admin_config.get('bot_token')):
+            return view(*args, **kwargs)
+        return jsonify({'error': 'Token inválido'}), 401
+    return wrapper
 
 # ==================== RUTAS PRINCIPALES ====================
 
@@ -100,21 +200,76 @@ def admin_dashboard():
     admin_config = config.get_config('admin')
     telegram_config = config.get_config('telegram')
     
-    return f"""
-    <h1>⚙️ Panel de Administración</h1>
-    <p>Token del bot: {admin_config.get('bot_token', 'No configurado')}</p>
-    <p>Telegram configurado: {'✅' if telegram_config.get('is_active') else '❌'}</p>
-    <a href="/telegram/setup">Configurar Telegram</a>
-    """
+    try:
+        return render_template('dashboard.html', admin_config=admin_config, telegram_config=telegram_config)
+    except:
+        return f"""
+        <h1>⚙️ Panel de Administración</h1>
+        <p>Token del bot: {admin_config.get('bot_token', 'No configurado')}</p>
+        <p>Telegram configurado: {'✅' if telegram_config.get('is_active') else '❌'}</p>
+        <a href="/telegram/setup">Configurar Telegram</a>
+        """
+
+@app.route('/admin/events')
+@require_api_token
+def admin_events():
+    """Estado de trabajos, progreso y logs en vivo (Server-Sent Events)"""
+    if events.subscribers() >= SSE_MAX_SUBSCRIBERS:
+        return shed_response(503, 5, 'sse', 'Demasiados paneles conectados')
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = events.subscribe(last_event_id)
+    # Sin Last-Event-ID válido para este proceso (o fuera del historial) se empieza por una instantánea
+    snapshot = not subscription.resumed
+    
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if snapshot:
+                yield format_sse({'event': 'snapshot', 'data': job_manager.recent_jobs()})
+            dropped = 0
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline and not job_manager.stopping:
+                pending = subscription.get(timeout=SSE_HEARTBEAT)
+                if subscription.dropped != dropped:
+                    # Cliente lento: se perdieron eventos, reenviar el estado completo
+                    dropped = subscription.dropped
+                    yield format_sse({'event': 'snapshot', 'data': job_manager.recent_jobs()})
+                if not pending:
+                    yield ": ping\n\n"
+                for item in pending:
+                    yield format_sse(item)
+        finally:
+            events.unsubscribe(subscription)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 # ==================== TELEGRAM ====================
 
 @app.route('/telegram', methods=['POST'])
 def telegram_webhook():
-    """Webhook para Telegram"""
+    """Webhook para Telegram: encola el update y responde de inmediato"""
+    started = time.monotonic()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        response = (jsonify({'error': 'Update inválido'}), 400)
+        outcome = 'error'
+    else:
+        outcome = update_queue.submit(data)
+        if outcome == 'shed':
+            # Telegram reintenta la entrega cuando el webhook no responde 2xx
+            response = shed_response(503, RETRY_AFTER, 'update_queue', 'Cola de updates llena')
+        else:
+            response = jsonify({'status': outcome})
+    metrics.WEBHOOK_DURATION.observe(time.monotonic() - started, outcome=outcome)
+    return response
+
+def handle_telegram_update(data):
+    """Procesar un update (en un worker de la cola de updates)"""
     try:
-        data = request.json
-        
         if 'message' in data:
             message = data['message']
             chat_id = message['chat']['id']
@@ -124,7 +279,14 @@ def telegram_webhook():
             token = telegram_config.get('telegram_bot_token') or TELEGRAM_TOKEN
             
             if not token:
-                return jsonify({'error': 'Token no configurado'}), 400
+                logger.warning("⚠️ Update recibido sin token de Telegram configurado")
+                return 'error'
+            
+            # Subidas (/upload <revista> [envío], documentos/fotos y enlaces pegados) y /report
+            links = bool(text) and not text.startswith('/') and CANDIDATE_PATTERN.search(text)
+            if (text.startswith(('/upload', '/report')) or message.get('document') or message.get('photo')
+                    or links):
+                return 'ok' if telegram_handler.handle_webhook_update(data) else 'ignored'
             
             # Comando /start
             if text == '/start':
@@ -139,7 +301,7 @@ Envía /help para ver comandos disponibles
                 """
                 
                 send_telegram_message(token, chat_id, response)
-                return jsonify({'status': 'ok'})
+                return 'ok'
             
             # Comando /help
             elif text == '/help':
@@ -149,11 +311,13 @@ Envía /help para ver comandos disponibles
 /start - Iniciar el bot
 /help - Mostrar esta ayuda
 /status - Ver estado del sistema
+/upload - Elegir revista/envío y luego enviar documentos, fotos o enlaces
+/report - Último reporte de subida de un envío
 
 📞 *Soporte:* Contacta al administrador
                 """
                 send_telegram_message(token, chat_id, response)
-                return jsonify({'status': 'ok'})
+                return 'ok'
             
             # Comando /status
             elif text == '/status':
@@ -167,25 +331,22 @@ Envía /help para ver comandos disponibles
 ⚡ Modo: Render + Webhook
                 """
                 send_telegram_message(token, chat_id, response)
-                return jsonify({'status': 'ok'})
+                return 'ok'
         
-        return jsonify({'status': 'ignored'})
+        return 'ignored'
         
     except Exception as e:
         logger.error(f"Error en webhook: {e}")
-        return jsonify({'error': str(e)}), 500
+        return 'error'
+
+# Workers de updates (se arrancan con el primer update de cada proceso)
+update_queue = UpdateQueue(handle_telegram_update, max_pending=MAX_UPDATE_BACKLOG,
+                           claim=lambda update_id: config_manager.update_store.claim(update_id))
 
 def send_telegram_message(token, chat_id, text):
-    """Enviar mensaje a Telegram"""
+    """Encolar mensaje a Telegram (devuelve un Future con la respuesta)"""
     try:
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload = {
-            'chat_id': chat_id,
-            'text': text,
-            'parse_mode': 'Markdown'
-        }
-        response = requests.post(url, json=payload, timeout=10)
-        return response.json()
+        return get_dispatcher().send_message(token, chat_id, text, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error enviando mensaje: {e}")
         return None
@@ -206,25 +367,37 @@ def setup_telegram():
                 'is_active': True
             }
             
-            with open('config/telegram.json', 'w') as f:
-                json.dump(telegram_config, f, indent=2)
+            try:
+                config_manager.update_telegram_config(telegram_config)
+            except ValueError as e:
+                # telegram.json dañado: no se sobrescribe (ver config_manager.update_json)
+                return f"Error: {e}"
+            
+            # En modo polling no se registra webhook (main.py poll lo elimina)
+            if TELEGRAM_MODE == 'polling':
+                send_telegram_message(token, user_id,
+                    "✅ *Bot configurado exitosamente*\n\nModo: long polling\n\nEnvía /start para comenzar")
+                return """
+                <h2>✅ Telegram configurado (long polling)</h2>
+                <p>Inicia el receptor con <code>python main.py poll</code></p>
+                <a href="/">Volver al inicio</a>
+                """
             
             # Configurar webhook
-            webhook_url = "https://revista-amyn.onrender.com/telegram"
+            import requests
+            webhook_url = TELEGRAM_WEBHOOK_URL
             try:
                 # Eliminar webhook anterior
-                requests.post(f"https://api.telegram.org/bot{token}/deleteWebhook")
+                requests.post(f"{TELEGRAM_API_URL}/bot{token}/deleteWebhook")
                 
                 # Configurar nuevo
                 response = requests.post(
-                    f"https://api.telegram.org/bot{token}/setWebhook",
+                    f"{TELEGRAM_API_URL}/bot{token}/setWebhook",
                     json={'url': webhook_url, 'drop_pending_updates': True}
                 )
                 
                 if response.json().get('ok'):
-                    telegram_config['webhook_url'] = webhook_url
-                    with open('config/telegram.json', 'w') as f:
-                        json.dump(telegram_config, f, indent=2)
+                    config_manager.update_telegram_config({'webhook_url': webhook_url})
                     
                     # Enviar mensaje de confirmación
                     send_telegram_message(token, user_id, 
@@ -279,6 +452,152 @@ def api_status():
         'telegram_webhook': telegram_config.get('webhook_url', '')
     })
 
+@app.route('/api/ready')
+def api_ready():
+    """Readiness: la base compartida responde y el proceso no se está apagando"""
+    try:
+        config_manager.job_store.db.execute("SELECT 1").fetchone()
+    except Exception as e:
+        return jsonify({'ready': False, 'error': str(e)}), 503
+    if job_manager.stopping:
+        return jsonify({'ready': False, 'error': 'Apagando'}), 503
+    return jsonify({'ready': True, 'pid': os.getpid()})
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Métricas en formato de texto Prometheus (suma de todos los procesos)"""
+    try:
+        job_manager.queue_depth()
+    except Exception as e:
+        logger.error(f"Error leyendo profundidad de cola: {e}")
+    return Response(shared_metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def request_owner():
+    """Dueño de la petición para el reparto justo: token de la API o sesión admin"""
+    token = request.headers.get('X-Bot-Token', '')
+    if token:
+        return 'api:' + hashlib.sha256(token.encode()).hexdigest()[:12]
+    return 'admin'
+
+def upload_request():
+    """Parámetros y fuente de enlaces de /api/upload
+    
+    JSON ({"links": [...]} o {"text": "..."}), formulario con un archivo .txt
+    en el campo "file", o cuerpo text/plain con journal_id y submission_id en
+    la URL. Los archivos y el texto plano se leen en streaming (link_ingest).
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        links = data.get('links')
+        return data, links if isinstance(links, list) else data.get('text') or ''
+    if request.files.get('file'):
+        return request.form.to_dict(), request.files['file'].stream
+    return request.args.to_dict(), request.stream
+
+@app.route('/api/upload', methods=['POST'])
+@require_api_token
+def api_upload():
+    """Iniciar una subida en segundo plano (un trabajo por lote de enlaces)"""
+    data, source = upload_request()
+    journal_id = data.get('journal_id', '')
+    
+    if not journal_id:
+        return jsonify({'error': 'Se requieren journal_id y links'}), 400
+    
+    # Reintentos de la misma petición devuelven los trabajos existentes
+    ingestor = LinkIngestor()
+    try:
+        results = job_manager.submit_links(journal_id, data.get('submission_id'), source,
+                                           idempotency_key=request.headers.get('Idempotency-Key', '').strip() or None,
+                                           ingestor=ingestor, profile=data.get('profile'),
+                                           chat_id=data.get('chat_id'), owner=request_owner())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except QueueFullError as e:
+        return shed_response(429, e.retry_after, 'job_queue', str(e))
+    
+    if not results:
+        return jsonify({'error': 'Se requieren journal_id y links', 'ingest': ingestor.summary()}), 400
+    
+    if len(results) == 1:
+        body = dict(results[0][0], ingest=ingestor.summary())
+    else:
+        body = {'jobs': [job for job, _ in results], 'ingest': ingestor.summary()}
+    if any(created for _, created in results):
+        return jsonify(body), 202
+    return jsonify(body), 200, {'Idempotent-Replayed': 'true'}
+
+@app.route('/api/jobs/<job_id>')
+@require_api_token
+def api_job_status(job_id):
+    """Estado de un trabajo de subida"""
+    job = job_manager.get_status(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job)
+
+@app.route('/api/reports')
+@require_api_token
+def api_reports():
+    """Reportes del índice: filtros journal_id, submission_id, since, until (ISO) y limit"""
+    args = request.args
+    reports = config_manager.report_store.list(journal_id=args.get('journal_id'),
+                                               submission_id=args.get('submission_id'),
+                                               since=args.get('since'), until=args.get('until'),
+                                               limit=min(args.get('limit', 20, type=int), 200))
+    for report in reports:
+        report['manifest_url'] = artifact_url(report['manifest'])
+        report['report_url'] = artifact_url(report['report_file'])
+    return jsonify({'reports': reports})
+
+def artifact_url(path):
+    """URL de descarga de un archivo bajo reports/ o temp/ (None si está fuera)"""
+    if not path:
+        return None
+    real = os.path.realpath(path)
+    for kind, root in ARTIFACT_DIRS.items():
+        # Misma comprobación que api_artifact: rutas reales, sin '..' ni enlaces fuera del directorio
+        root = os.path.realpath(root)
+        if real != root and os.path.commonpath([root, real]) == root:
+            return url_for('api_artifact', kind=kind, name=os.path.relpath(real, root).replace(os.sep, '/'))
+    return None
+
+@app.route('/api/artifacts/<kind>/<path:name>')
+@require_api_token
+def api_artifact(kind, name):
+    """Descargar un reporte, manifiesto o chunk ZIP
+
+    send_file con conditional=True responde ETag, Last-Modified, 304 y
+    Range (206, reanudar descargas) con el Content-Length exacto; el cuerpo
+    completo sale por wsgi.file_wrapper, que gunicorn envía con sendfile().
+    """
+    root = ARTIFACT_DIRS.get(kind)
+    path = safe_join(os.path.abspath(root), name) if root else None
+    if path and not os.path.isfile(path) and os.path.isfile(path + '.gz'):
+        # Reporte ya rotado (reports.rotate_reports lo comprimió)
+        path += '.gz'
+    if (not path or not os.path.isfile(path)
+            or not os.path.realpath(path).startswith(os.path.realpath(root) + os.sep)):
+        return jsonify({'error': 'Artefacto no encontrado'}), 404
+    response = send_file(path, as_attachment=True, conditional=True, etag=True, max_age=0)
+    # Contenido autenticado: sin cachés compartidas, revalidar siempre con el ETag
+    response.cache_control.private = True
+    response.cache_control.public = False
+    return response
+
+@app.route('/api/bandwidth', methods=['GET', 'PUT'])
+@require_api_token
+def api_bandwidth():
+    """Límites de ancho de banda (bytes/s o "10M"; 0 = sin límite), modificables en caliente"""
+    if request.method == 'PUT':
+        try:
+            job_manager.bandwidth.update(request.get_json(silent=True) or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        job_manager.bandwidth.refresh(force=True)
+    return jsonify(job_manager.bandwidth.status())
+
 @app.route('/api/test')
 def api_test():
     """Endpoint de prueba"""
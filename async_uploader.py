@@ -0,0 +1,560 @@
+"""
+Motor de subidas asíncrono (UPLOADER_ENGINE=async)
+
+OJSUploader usa requests: cada trabajo en curso ocupa un hilo que pasa casi
+todo el tiempo bloqueado en sockets. AsyncOJSUploader hace las mismas
+etapas (login, descubrimiento, descarga, ZIP y subida) sobre aiohttp, y
+AsyncUploadEngine ejecuta los trabajos del proceso en un único event loop:
+
+- un hilo con el loop y un TCPConnector compartido (ASYNC_MAX_CONNECTIONS
+  conexiones en total, ASYNC_CONNECTIONS_PER_HOST por host)
+- cada trabajo tiene su propia ClientSession (sus cookies de login)
+- la compresión ZIP, el reporte y la limpieza van a un pool de
+  ASYNC_ZIP_WORKERS hilos: la CPU no frena el loop y la memoria de los ZIP
+  en curso queda acotada
+
+Manifiesto, métricas, progreso, log y reporte son los del uploader
+síncrono, que sigue siendo el motor por defecto.
+"""
+
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+import metrics
+from bot_core import (MAX_CHUNK_SIZE, OJSUploader, UploadCancelled, find_upload_action,
+                      login_form_data, parse_submission_ids)
+from streaming import multipart_envelope
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 200))
+CONNECTIONS_PER_HOST = int(os.environ.get('ASYNC_CONNECTIONS_PER_HOST', 8))
+ZIP_WORKERS = int(os.environ.get('ASYNC_ZIP_WORKERS', 2))
+READ_SIZE = 64 * 1024
+
+# Sin límite total: una subida grande puede durar más que cualquier timeout fijo
+OJS_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+# Equivalente al timeout=30 de requests (conexión y cada lectura)
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+
+
+def atimed_stage(stage):
+    """timed_stage para corrutinas"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            started = time.monotonic()
+            ok = cancelled = False
+            try:
+                result = await func(self, *args, **kwargs)
+                ok = result is not False
+                return result
+            except UploadCancelled:
+                cancelled = True
+                raise
+            finally:
+                metrics.record_stage(stage, self.metrics_host, time.monotonic() - started, ok, cancelled)
+        return wrapper
+    return decorator
+
+
+async def iter_file(path, size=READ_SIZE):
+    """Bloques de un archivo local (lecturas cortas: no bloquean el loop de forma apreciable)"""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(size)
+            if not data:
+                return
+            yield data
+
+
+class _HashingStream:
+    """Envuelve un iterable asíncrono de bloques y calcula su sha256"""
+
+    def __init__(self, source):
+        self.source = source
+        self.sha256 = hashlib.sha256()
+        self.bytes_read = 0
+
+    async def __aiter__(self):
+        async for data in self.source:
+            self.sha256.update(data)
+            self.bytes_read += len(data)
+            yield data
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+class AsyncOJSUploader(OJSUploader):
+    """OJSUploader sobre aiohttp: mismas etapas, registros y reporte
+
+    Se usa con `async with` (abre y cierra la sesión HTTP del trabajo). Los
+    métodos de red son corrutinas; ZIP, reporte y limpieza se ejecutan en
+    `executor`.
+    """
+
+    def __init__(self, host, username, password, work_dir="temp", connector=None, executor=None):
+        super().__init__(host, username, password, work_dir)
+        self.connector = connector
+        self.executor = executor
+        self.http = None
+
+    async def __aenter__(self):
+        # Cabeceras de navegador de OJSUploader; la compresión la negocia aiohttp
+        headers = {key: value for key, value in self.session.headers.items() if key != 'Accept-Encoding'}
+        # unsafe=True: como requests, acepta cookies de hosts con IP
+        self.http = aiohttp.ClientSession(connector=self.connector, connector_owner=self.connector is None,
+                                          cookie_jar=aiohttp.CookieJar(unsafe=True), headers=headers,
+                                          timeout=OJS_TIMEOUT)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    def _csrf_headers(self):
+        """X-CSRF-Token tras el login (extract_csrf_token lo deja en las cabeceras de la sesión)"""
+        token = self.session.headers.get('X-CSRF-Token')
+        return {'X-CSRF-Token': token} if token else {}
+
+    async def _in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+
+    @atimed_stage('login')
+    async def login(self):
+        """Iniciar sesión en OJS (mismo formulario que OJSUploader.login)"""
+        try:
+            login_url = f"{self.host}/login"
+            self.log(f"Accediendo a: {login_url}")
+            async with self.http.get(login_url) as response:
+                response.raise_for_status()
+                html = await response.text()
+
+            try:
+                action, form_data = login_form_data(html, self.host, self.username, self.password)
+            except LookupError as e:
+                self.log(str(e))
+                return False
+
+            self.log(f"Enviando login a: {action}")
+            async with self.http.post(action, data=form_data) as response:
+                response.raise_for_status()
+                html = await response.text()
+                final_url = str(response.url)
+
+            if 'submissions' in final_url or 'dashboard' in final_url:
+                self.log("✅ Login exitoso")
+                self.extract_csrf_token(html)
+                return True
+            self.log("❌ Login fallido - Redirección no esperada")
+            return False
+
+        except Exception as e:
+            self.log(f"❌ Error en login: {str(e)}")
+            return False
+
+    @atimed_stage('discover')
+    async def navigate_to_submissions(self):
+        """Navegar a la sección de envíos"""
+        try:
+            submissions_url = f"{self.host}/submissions"
+            self.log(f"Navegando a envíos: {submissions_url}")
+            async with self.http.get(submissions_url, headers=self._csrf_headers()) as response:
+                response.raise_for_status()
+                html = await response.text()
+
+            submission_ids = parse_submission_ids(html)
+            self.log(f"Encontrados {len(submission_ids)} envíos")
+            return submission_ids
+
+        except Exception as e:
+            self.log(f"❌ Error navegando a envíos: {str(e)}")
+            metrics.STAGE_ERRORS.inc(stage='discover', host=self.metrics_host)
+            return []
+
+    async def upload_to_submission(self, submission_id, file_path, file_name=None):
+        """Subir un archivo local a un envío"""
+        try:
+            if not file_name:
+                file_name = os.path.basename(file_path)
+            return await self.upload_stream(submission_id, iter_file(file_path), os.path.getsize(file_path),
+                                            file_name)
+        except Exception as e:
+            self.log(f"❌ Error subiendo archivo: {str(e)}")
+            metrics.STAGE_ERRORS.inc(stage='upload', host=self.metrics_host)
+            return False
+
+    @atimed_stage('upload')
+    async def upload_stream(self, submission_id, source, size, file_name):
+        """Subir `size` bytes de `source` (iterable asíncrono de bloques) sin cargarlos en memoria"""
+        started = time.monotonic()
+        ok = await self._upload_stream(submission_id, source, size, file_name)
+        self.record('upload', file=file_name, size=size, ms=round((time.monotonic() - started) * 1000),
+                    status='uploaded' if ok else 'failed')
+        return ok
+
+    async def _upload_stream(self, submission_id, source, size, file_name):
+        try:
+            upload_url = f"{self.host}/submission/wizard/2"
+            self.log(f"Preparando subida a envío {submission_id}")
+
+            # 1. Obtener página de subida
+            params = {'submissionId': str(submission_id)}
+            async with self.http.get(upload_url, params=params, headers=self._csrf_headers()) as response:
+                response.raise_for_status()
+                html = await response.text()
+
+            # 2. Buscar formulario de subida (o botón "Añadir archivo")
+            try:
+                upload_action, via_button = find_upload_action(html, self.host, upload_url)
+            except LookupError as e:
+                self.log(str(e))
+                return False
+            if via_button:
+                self.log("Botón 'Añadir archivo' encontrado")
+
+            # 3. Cuerpo multipart en streaming con Content-Length exacto (sin chunked)
+            boundary = uuid.uuid4().hex
+            head, tail = multipart_envelope(boundary, {'submissionId': submission_id}, 'submissionFile',
+                                            file_name, self.guess_mime_type(file_name))
+            headers = {
+                **self._csrf_headers(),
+                'Content-Type': f"multipart/form-data; boundary={boundary}",
+                'Content-Length': str(len(head) + size + len(tail)),
+            }
+
+            # 4. Enviar archivo
+            self.log(f"Subiendo {file_name} ({size:,} bytes)")
+            upload_started = time.monotonic()
+            body = self._multipart_body(head, source, size, tail)
+            async with self.http.post(upload_action, params=params, data=body, headers=headers) as response:
+                response.raise_for_status()
+                await response.read()
+                status = response.status
+
+            # 5. Verificar subida exitosa
+            if status == 200:
+                self.log(f"✅ Archivo subido exitosamente: {file_name}")
+                metrics.record_transfer('upload', self.metrics_host, size, time.monotonic() - upload_started)
+                self._uploaded(submission_id, file_name)
+                return True
+            self.log(f"❌ Error en subida: HTTP {status}")
+            return False
+
+        except Exception as e:
+            self.log(f"❌ Error subiendo archivo: {str(e)}")
+            return False
+
+    async def _multipart_body(self, head, source, size, tail):
+        """Cabecera, exactamente `size` bytes de `source` y cierre; error si el origen se acaba antes"""
+        yield head
+        sent = 0
+        async for data in source:
+            data = data[:size - sent]
+            if data:
+                sent += len(data)
+                yield data
+                if self.progress is not None:
+                    self.report_progress(bytes_done=sent, bytes_total=size)
+                if self.bandwidth is not None:
+                    await self.bandwidth.athrottle('upload', len(data), self.host)
+            if sent >= size:
+                break
+        if sent < size:
+            raise IOError(f"Origen truncado: faltan {size - sent:,} bytes")
+        yield tail
+
+    @atimed_stage('download')
+    async def download_from_url(self, url, save_path):
+        """Descargar archivo desde URL (reintenta errores de conexión)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.log(f"Descargando: {url}")
+                started = time.monotonic()
+
+                received = 0
+                sha256 = hashlib.sha256()
+                async with self.http.get(url, timeout=DOWNLOAD_TIMEOUT) as response:
+                    response.raise_for_status()
+                    with open(save_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(READ_SIZE):
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            received += len(chunk)
+                            self.report_progress(bytes_done=self.bytes_downloaded + received)
+                            if self.bandwidth is not None:
+                                await self.bandwidth.athrottle('download', len(chunk), url)
+                self.bytes_downloaded += received
+
+                file_size = os.path.getsize(save_path)
+                elapsed = time.monotonic() - started
+                metrics.record_transfer('download', self.metrics_host, file_size, elapsed)
+                self.record('file', name=os.path.basename(save_path), source=url, size=file_size,
+                            sha256=sha256.hexdigest(), ms=round(elapsed * 1000), status='downloaded')
+                self.log(f"✅ Descargado: {os.path.basename(save_path)} ({file_size:,} bytes)")
+                return True
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < self.max_retries:
+                    metrics.record_retry('download', self.metrics_host)
+                    self.log(f"⚠️ Reintentando descarga ({attempt + 1}/{self.max_retries}): {url}")
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                self.log(f"❌ Error descargando {url}: {str(e) or type(e).__name__}")
+                self.record('file', name=os.path.basename(save_path), source=url, status='failed',
+                            error=str(e) or type(e).__name__)
+                return False
+
+            except Exception as e:
+                self.log(f"❌ Error descargando {url}: {str(e)}")
+                self.record('file', name=os.path.basename(save_path), source=url, status='failed', error=str(e))
+                return False
+
+        return False
+
+    @atimed_stage('job')
+    async def upload_from_links(self, links, submission_id=None, profile=False):
+        """Descargar y subir archivos desde enlaces directos"""
+        self._skip_profile(profile)
+        return await self._upload_from_links(links, submission_id)
+
+    @atimed_stage('job')
+    async def upload_telegram_files(self, client, files, submission_id=None, profile=False):
+        """Subir archivos enviados al bot de Telegram en streaming (ver telegram_files)"""
+        self._skip_profile(profile)
+        return await self._upload_telegram_files(client, files, submission_id)
+
+    def _skip_profile(self, profile):
+        if profile:
+            # JobProfiler mide el proceso entero: con muchos trabajos en el mismo loop no es del trabajo
+            self.log("⚠️ Perfilado no disponible con el motor asyncio; usar UPLOADER_ENGINE=sync")
+
+    async def _resolve_submission(self, submission_id):
+        """Login si hace falta y envío destino (el indicado o el primero encontrado)"""
+        if not self.csrf_token:
+            self.report_progress('login')
+            if not await self.login():
+                return None
+
+        if submission_id:
+            self.submission_id = submission_id
+            return submission_id
+
+        self.report_progress('discover')
+        submission_ids = await self.navigate_to_submissions()
+        if submission_ids:
+            self.log(f"Usando envío ID: {submission_ids[0]}")
+            self.submission_id = submission_ids[0]
+            return submission_ids[0]
+
+        self.log("❌ No se encontraron envíos")
+        return None
+
+    async def _upload_telegram_files(self, client, files, submission_id=None):
+        """Flujo para archivos de Telegram: login, descubrimiento y subida en streaming"""
+        loop = asyncio.get_running_loop()
+        try:
+            submission_id = await self._resolve_submission(submission_id)
+            if not submission_id:
+                return False
+
+            successful_uploads = 0
+            self.report_progress('upload', done=0, total=len(files))
+            for index, item in enumerate(files, 1):
+                self.check_cancelled()
+                # getFile es una llamada corta de la Bot API (cliente síncrono, pool por defecto)
+                info = await loop.run_in_executor(None, client.get_file, item['file_id'])
+                size = info.get('file_size') or item.get('file_size')
+                async with self.http.get(client.file_url(info['file_path']), timeout=DOWNLOAD_TIMEOUT,
+                                         headers={'Accept-Encoding': 'identity'}) as response:
+                    response.raise_for_status()
+                    size = int(response.headers.get('Content-Length') or size or 0)
+                    if size <= 0:
+                        # El multipart necesita el tamaño exacto: sin él se subiría un archivo vacío
+                        self.log(f"❌ Tamaño desconocido para {item['file_name']}, no se sube")
+                        source, ok = None, False
+                    else:
+                        source = _HashingStream(response.content.iter_chunked(READ_SIZE))
+                        ok = await self.upload_stream(submission_id, source, size, item['file_name'])
+                self.record('file', name=item['file_name'], source=f"telegram:{item['file_id']}", size=size,
+                            sha256=source.hexdigest() if source and source.bytes_read == size else None,
+                            status='uploaded' if ok else 'failed')
+                if ok:
+                    successful_uploads += 1
+                self.report_progress(done=index)
+
+            if successful_uploads > 0:
+                await self._in_executor(self.generate_report, submission_id)
+
+            self.log(f"✅ Proceso completado: {successful_uploads}/{len(files)} archivos subidos")
+            return successful_uploads > 0
+
+        except UploadCancelled:
+            # Lease perdido: JobManager lo registra como cancelado, no como fallo
+            raise
+        except Exception as e:
+            self.log(f"❌ Error en proceso completo: {str(e)}")
+            return False
+
+    async def _upload_chunk(self, submission_id, paths, number):
+        """Subir un chunk recién cerrado y borrarlo; devuelve los archivos subidos"""
+        uploaded = 0
+        self.report_progress('upload', detail=f"📦 Chunk {number}")
+        for file_path in paths:
+            self.check_cancelled()
+            if await self.upload_to_submission(submission_id, file_path):
+                uploaded += 1
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return uploaded
+
+    async def _upload_from_links(self, links, submission_id=None):
+        """Flujo completo: login, descubrimiento, descarga, ZIP (en el executor) y subida"""
+        try:
+            submission_id = await self._resolve_submission(submission_id)
+            if not submission_id:
+                return False
+
+            temp_dir = os.path.join(self.work_dir, "downloads")
+            os.makedirs(temp_dir, exist_ok=True)
+
+            # Cada chunk lleno se comprime (executor), se sube y se borra: en disco solo queda el chunk en curso
+            downloaded = 0
+            chunks = 0
+            successful_uploads = 0
+            current_chunk = []
+            current_size = 0
+
+            for i, url in enumerate(links, 1):
+                self.check_cancelled()
+                self.report_progress('download', done=i - 1, total=len(links), bytes_done=self.bytes_downloaded)
+                if not url.strip():
+                    continue
+
+                file_name = f"file_{i}{self.get_file_extension(url)}"
+                file_path = os.path.join(temp_dir, file_name)
+
+                if not await self.download_from_url(url, file_path):
+                    continue
+                downloaded += 1
+                file_size = os.path.getsize(file_path)
+
+                if file_size > MAX_CHUNK_SIZE:
+                    self.log(f"⚠️ Archivo grande ({file_size:,} bytes), se subirá individualmente")
+                    self.record('chunk', name=file_name, size=file_size, members=[file_name], zipped=False)
+                    chunks += 1
+                    successful_uploads += await self._upload_chunk(submission_id, [file_path], chunks)
+                elif current_size + file_size > MAX_CHUNK_SIZE and current_chunk:
+                    chunks += 1
+                    zip_paths = await self._in_executor(self._close_chunk, current_chunk, chunks)
+                    successful_uploads += await self._upload_chunk(submission_id, zip_paths, chunks)
+                    current_chunk = [file_path]
+                    current_size = file_size
+                else:
+                    current_chunk.append(file_path)
+                    current_size += file_size
+
+            if not downloaded:
+                self.log("❌ No se descargaron archivos")
+                return False
+
+            self.log(f"✅ Descargados {downloaded} archivos")
+
+            if current_chunk:
+                self.report_progress('zip', bytes_done=self.bytes_downloaded)
+                chunks += 1
+                zip_paths = await self._in_executor(self._close_chunk, current_chunk, chunks)
+                successful_uploads += await self._upload_chunk(submission_id, zip_paths, chunks)
+
+            if successful_uploads > 0:
+                await self._in_executor(self.generate_report, submission_id)
+
+            self.log(f"✅ Proceso completado: {successful_uploads}/{chunks} archivos subidos")
+            return successful_uploads > 0
+
+        except UploadCancelled:
+            # Lease perdido: JobManager lo registra como cancelado, no como fallo
+            raise
+        except Exception as e:
+            self.log(f"❌ Error en proceso completo: {str(e)}")
+            return False
+        finally:
+            await self._in_executor(self.cleanup_temp_files)
+
+
+class AsyncUploadEngine:
+    """Event loop en un hilo propio, con conexiones y pool de ZIP compartidos por todos los trabajos"""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, per_host=CONNECTIONS_PER_HOST, zip_workers=ZIP_WORKERS):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.zip_workers = zip_workers
+        self.loop = None
+        self.connector = None
+        self.executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return self
+            self.loop = asyncio.new_event_loop()
+            self.executor = ThreadPoolExecutor(max_workers=self.zip_workers, thread_name_prefix='upload-zip')
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="upload-async-loop",
+                                            daemon=True)
+            self._thread.start()
+            ready.wait()
+        logger.info(f"⚡ Motor asyncio: {self.max_connections} conexiones ({self.per_host} por host), "
+                    f"{self.zip_workers} hilos de ZIP")
+        return self
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._open())
+        ready.set()
+        self.loop.run_forever()
+
+    async def _open(self):
+        # El connector se crea dentro del loop que lo usa
+        self.connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+
+    def uploader(self, host, username, password, work_dir):
+        """AsyncOJSUploader que comparte conexiones y pool de ZIP del motor"""
+        return AsyncOJSUploader(host, username, password, work_dir, connector=self.connector,
+                                executor=self.executor)
+
+    def submit(self, coro):
+        """Programar una corrutina en el loop; devuelve un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout=10):
+        """Cerrar conexiones y parar el loop (los trabajos en curso deben haber terminado)"""
+        with self._lock:
+            if not self.running:
+                return
+            try:
+                self.submit(self.connector.close()).result(timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ Error cerrando conexiones del motor asyncio: {str(e)}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,276 @@
+"""
+Control de ancho de banda (token bucket) para descargas y subidas
+
+Cada bloque transferido pasa por tres límites, en bytes por segundo y
+separados por dirección (download / upload); 0 es sin límite:
+
+- global: todo el tráfico del proceso
+- job: cada trabajo por separado
+- host: cada host remoto (con excepciones por host en `hosts`)
+
+Así un trabajo grande no se queda con todo el enlace: se cambia velocidad
+punta de un trabajo por un reparto predecible entre varios, y queda margen
+para los webhooks.
+
+Los límites se leen del entorno (BANDWIDTH_DOWNLOAD_GLOBAL,
+BANDWIDTH_UPLOAD_JOB, ...; admiten sufijos K/M/G) y se cambian en caliente
+con /api/bandwidth. Los cambios se guardan en la base compartida y cada
+proceso los recoge en unos segundos. El límite global se aplica por
+proceso.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ('download', 'upload')
+SCOPES = ('global', 'job', 'host')
+META_KEY = 'bandwidth_limits'
+UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+BANDWIDTH_WAIT = metrics.REGISTRY.counter(
+    'bandwidth_throttle_seconds_total',
+    'Segundos de espera por límite de ancho de banda',
+    ('direction', 'scope')
+)
+BANDWIDTH_BYTES = metrics.REGISTRY.counter(
+    'bandwidth_shaped_bytes_total',
+    'Bytes que pasaron por el control de ancho de banda',
+    ('direction',)
+)
+
+
+def parse_rate(value):
+    """Bytes por segundo desde un número o texto con sufijo ("512K", "10M"); 0 = sin límite"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        rate = value
+    elif isinstance(value, str):
+        text = value.strip().upper()
+        text = text[:-2] if text.endswith('/S') else text
+        text = text[:-1] if text.endswith('B') else text
+        multiplier = UNITS.get(text[-1:], 1)
+        try:
+            rate = float(text[:-1] if text[-1:] in UNITS else text) * multiplier
+        except ValueError:
+            raise ValueError(f"Límite no válido: {value}")
+    else:
+        raise ValueError(f"Límite no válido: {value}")
+    if rate < 0:
+        raise ValueError(f"Límite no válido: {value}")
+    return int(rate)
+
+
+def limits_from_env():
+    """Límites iniciales desde BANDWIDTH_<DIRECCIÓN>_<ÁMBITO>"""
+    return {
+        direction: {
+            **{scope: parse_rate(os.environ.get(f"BANDWIDTH_{direction.upper()}_{scope.upper()}"))
+               for scope in SCOPES},
+            'hosts': {},
+        }
+        for direction in DIRECTIONS
+    }
+
+
+def url_host(url):
+    return urlsplit(url or '').netloc.lower()
+
+
+class BandwidthShaper:
+    """Buckets global, por trabajo y por host para cada dirección"""
+
+    def __init__(self, limits=None, refresh_interval=5.0):
+        self.limits = limits or limits_from_env()
+        self.refresh_interval = refresh_interval
+        self.db = None
+        self._buckets = {}          # (dirección, ámbito, clave) -> TokenBucket
+        self._jobs = {}             # job_id -> número de transferencias abiertas
+        self._lock = threading.Lock()
+        self._refreshed = 0.0
+        self._stored = None
+
+    def use_store(self, db):
+        """Compartir los límites entre procesos a través de la tabla meta de `db`"""
+        self.db = db
+
+    # ==================== LÍMITES ====================
+    def _rate(self, direction, scope, key):
+        limits = self.limits[direction]
+        if scope == 'host' and key in limits['hosts']:
+            return limits['hosts'][key]
+        return limits[scope]
+
+    def _apply(self, limits):
+        """Sustituir los límites y ajustar los buckets existentes (bajo self._lock)"""
+        self.limits = limits
+        for (direction, scope, key), bucket in list(self._buckets.items()):
+            rate = self._rate(direction, scope, key)
+            if rate:
+                bucket.set_rate(rate)
+            else:
+                del self._buckets[(direction, scope, key)]
+
+    def refresh(self, force=False):
+        """Recoger cambios guardados por otro proceso (como mucho cada refresh_interval)"""
+        if self.db is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._refreshed < self.refresh_interval:
+            return
+        self._refreshed = now
+        try:
+            stored = self.db.get_meta(META_KEY)
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo límites de ancho de banda: {str(e)}")
+            return
+        if stored and stored != self._stored:
+            with self._lock:
+                self._stored = stored
+                self._apply(json.loads(stored))
+            logger.info("📶 Límites de ancho de banda actualizados")
+
+    def update(self, changes):
+        """Cambiar límites en caliente; devuelve los límites vigentes
+
+        changes: {"download": {"global": "20M", "job": "5M", "host": 0,
+                  "hosts": {"files.example.org": "2M"}}, "upload": {...}}
+        Un host con límite null vuelve al límite por host general.
+        """
+        if not isinstance(changes, dict):
+            raise ValueError("Se esperaba un objeto con límites por dirección")
+        self.refresh(force=True)
+        with self._lock:
+            limits = json.loads(json.dumps(self.limits))
+        for direction, values in changes.items():
+            if direction not in DIRECTIONS or not isinstance(values, dict):
+                raise ValueError(f"Dirección no válida: {direction}")
+            for scope, value in values.items():
+                if scope in SCOPES:
+                    limits[direction][scope] = parse_rate(value)
+                elif scope == 'hosts' and isinstance(value, dict):
+                    for host, rate in value.items():
+                        if rate is None:
+                            limits[direction]['hosts'].pop(host.lower(), None)
+                        else:
+                            limits[direction]['hosts'][host.lower()] = parse_rate(rate)
+                else:
+                    raise ValueError(f"Ámbito no válido: {scope}")
+
+        stored = json.dumps(limits, sort_keys=True)
+        if self.db is not None:
+            self.db.set_meta(META_KEY, stored)
+        with self._lock:
+            self._stored = stored
+            self._apply(limits)
+        logger.info(f"📶 Nuevos límites de ancho de banda: {stored}")
+        return limits
+
+    def status(self):
+        with self._lock:
+            return {
+                'limits': json.loads(json.dumps(self.limits)),
+                'active_jobs': len(self._jobs),
+                'buckets': len(self._buckets),
+            }
+
+    # ==================== TRANSFERENCIAS ====================
+    def _bucket(self, direction, scope, key):
+        rate = self._rate(direction, scope, key)
+        if not rate:
+            return None
+        with self._lock:
+            bucket = self._buckets.get((direction, scope, key))
+            if bucket is None:
+                bucket = self._buckets[(direction, scope, key)] = TokenBucket(rate)
+            return bucket
+
+    def _applicable(self, direction, amount, job_id, host):
+        """Buckets que limitan la transferencia, con su ámbito"""
+        self.refresh()
+        BANDWIDTH_BYTES.inc(amount, direction=direction)
+        for scope, key in (('global', None), ('job', job_id), ('host', host)):
+            if scope != 'global' and not key:
+                continue
+            bucket = self._bucket(direction, scope, key)
+            if bucket is not None:
+                yield scope, bucket
+
+    def throttle(self, direction, amount, job_id=None, host=None):
+        """Esperar hasta que los límites aplicables permitan `amount` bytes"""
+        for scope, bucket in self._applicable(direction, amount, job_id, host):
+            started = time.monotonic()
+            bucket.acquire(amount)
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                BANDWIDTH_WAIT.inc(waited, direction=direction, scope=scope)
+
+    async def athrottle(self, direction, amount, job_id=None, host=None):
+        """Como throttle, pero cediendo el event loop mientras espera (motor asyncio)"""
+        import asyncio
+
+        for scope, bucket in self._applicable(direction, amount, job_id, host):
+            started = time.monotonic()
+            while True:
+                wait = bucket.try_acquire(amount)
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                BANDWIDTH_WAIT.inc(waited, direction=direction, scope=scope)
+
+    def for_job(self, job_id):
+        """Control de ancho de banda de un trabajo (cerrar al terminar)"""
+        with self._lock:
+            self._jobs[job_id] = self._jobs.get(job_id, 0) + 1
+        return JobBandwidth(self, job_id)
+
+    def _release(self, job_id):
+        with self._lock:
+            remaining = self._jobs.get(job_id, 1) - 1
+            if remaining > 0:
+                self._jobs[job_id] = remaining
+                return
+            self._jobs.pop(job_id, None)
+            for direction in DIRECTIONS:
+                self._buckets.pop((direction, 'job', job_id), None)
+
+
+class JobBandwidth:
+    """Vista de BandwidthShaper para un trabajo concreto"""
+
+    def __init__(self, shaper, job_id):
+        self.shaper = shaper
+        self.job_id = job_id
+
+    def throttle(self, direction, amount, url=None):
+        self.shaper.throttle(direction, amount, job_id=self.job_id, host=url_host(url))
+
+    async def athrottle(self, direction, amount, url=None):
+        await self.shaper.athrottle(direction, amount, job_id=self.job_id, host=url_host(url))
+
+    def close(self):
+        self.shaper._release(self.job_id)
+
+
+_shaper = None
+_shaper_lock = threading.Lock()
+
+
+def get_shaper():
+    """Control de ancho de banda compartido del proceso"""
+    global _shaper
+    with _shaper_lock:
+        if _shaper is None:
+            _shaper = BandwidthShaper()
+        return _shaper
@@ -0,0 +1,195 @@
+"""
+Benchmark del planificador de trabajos (JobScheduler) frente a FIFO
+
+Simula carga mixta: un usuario encola un lote enorme y otros van enviando
+trabajos pequeños. Cada trabajo "dura" su tamaño / throughput (sleep), así
+que se mide solo la política de orden. La variante del planificador usa la
+cola compartida real (JobStore.claim sobre una base SQLite temporal). Emite JSON con latencia (espera +
+ejecución) p50/p95/máx por política y por tipo de trabajo.
+
+Uso:
+    python benchmarks/bench_scheduler.py
+    python benchmarks/bench_scheduler.py --workers 2 --per-host 1 --throughput 200000000 -o sched.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from scheduler import JobScheduler  # noqa: E402
+from storage import Database, JobStore  # noqa: E402
+
+MB = 1024 * 1024
+
+
+class _Job:
+    def __init__(self, job_id, owner, host, size, kind):
+        self.id = job_id
+        self.owner = owner
+        self.host = host
+        self.size = size
+        self.kind = kind
+        self.submitted = None
+        self.finished = None
+
+
+def build_workload(seed, small_users, small_jobs, big_jobs):
+    """(retardo de llegada, trabajo): lote grande al inicio y pequeños repartidos"""
+    rng = random.Random(seed)
+    arrivals = []
+    for i in range(big_jobs):
+        arrivals.append((0.0, _Job(f"big{i}", 'user-big', 'ojs-a', rng.randint(300, 600) * MB, 'big')))
+    for i in range(small_jobs):
+        owner = f"user-{i % small_users}"
+        host = rng.choice(['ojs-a', 'ojs-b'])
+        arrivals.append((rng.uniform(0, 1.0), _Job(f"small{i}", owner, host, rng.randint(1, 8) * MB, 'small')))
+    return sorted(arrivals, key=lambda item: item[0])
+
+
+def run_fifo(arrivals, workers, throughput):
+    pending = queue.Queue()
+
+    def worker():
+        while True:
+            job = pending.get()
+            if job is None:
+                return
+            time.sleep(job.size / throughput)
+            job.finished = time.monotonic()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    _feed(arrivals, lambda job: pending.put(job))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+
+
+def run_scheduler(arrivals, workers, throughput, per_host):
+    scheduler = JobScheduler(per_host_limit=per_host, aging_rate=50 * MB, max_wait=30)
+    jobs = {job.id: job for _, job in arrivals}
+    remaining = [len(arrivals)]
+    lock = threading.Lock()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(Database(os.path.join(tmp, 'bench.db')))
+
+        def submit(job):
+            store.enqueue({'job_id': job.id, 'status': 'queued', 'created_at': datetime.now().isoformat()},
+                          {}, job.host, job.owner, job.size)
+
+        def worker(instance_id):
+            while True:
+                row = store.claim(instance_id, 60, scheduler.choose)
+                if row is None:
+                    with lock:
+                        if remaining[0] == 0:
+                            return
+                    time.sleep(0.01)
+                    continue
+                job = jobs[row['id']]
+                time.sleep(job.size / throughput)
+                job.finished = time.monotonic()
+                store.finish({'job_id': job.id, 'status': 'completed',
+                              'created_at': datetime.now().isoformat()}, instance_id)
+                with lock:
+                    remaining[0] -= 1
+
+        threads = [threading.Thread(target=worker, args=(f"bench-{i}",), daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        _feed(arrivals, submit)
+        for thread in threads:
+            thread.join()
+
+
+def _feed(arrivals, submit):
+    started = time.monotonic()
+    for delay, job in arrivals:
+        wait = started + delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        job.submitted = time.monotonic()
+        submit(job)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return round(values[index], 3)
+
+
+def summarize(jobs):
+    result = {}
+    for kind in ('all', 'small', 'big'):
+        latencies = [job.finished - job.submitted for job in jobs if kind == 'all' or job.kind == kind]
+        result[kind] = {
+            'jobs': len(latencies),
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'max': _percentile(latencies, 100),
+        }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de JobScheduler frente a FIFO")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--per-host', type=int, default=2, help="Trabajos simultáneos por host OJS")
+    parser.add_argument('--throughput', type=float, default=400 * MB,
+                        help="Bytes/s simulados por trabajo (acelera la simulación)")
+    parser.add_argument('--small-users', type=int, default=5)
+    parser.add_argument('--small-jobs', type=int, default=40)
+    parser.add_argument('--big-jobs', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for policy in ('fifo', 'scheduler'):
+        arrivals = build_workload(args.seed, args.small_users, args.small_jobs, args.big_jobs)
+        started = time.monotonic()
+        if policy == 'fifo':
+            run_fifo(arrivals, args.workers, args.throughput)
+        else:
+            run_scheduler(arrivals, args.workers, args.throughput, args.per_host)
+        results[policy] = summarize([job for _, job in arrivals])
+        results[policy]['makespan'] = round(time.monotonic() - started, 3)
+        print(f"✅ {policy}: p50 {results[policy]['all']['p50']}s, "
+              f"p50 pequeños {results[policy]['small']['p50']}s", file=sys.stderr)
+
+    report = {
+        'benchmark': 'job_scheduler',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
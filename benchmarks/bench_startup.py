@@ -0,0 +1,206 @@
+"""
+Benchmark de arranque en frío
+
+Cada repetición corre en un proceso nuevo y un directorio vacío (sin
+config/), como una instancia de Render recién levantada. Mide el tiempo
+de `import app`, la primera respuesta de /api/status y de /telegram (con
+el cliente de pruebas de Flask) y los módulos pesados que quedaron
+cargados. Con --serve mide además `python main.py serve` hasta la señal
+de listo y la primera respuesta HTTP.
+
+Sirve como control de regresiones: con --max-import-ms, --max-first-ms o
+módulos prohibidos cargados al importar (--forbid) termina con código 1.
+
+Uso:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --serve --max-import-ms 300 -o startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+# Se ejecuta en el proceso medido: solo stdlib antes de importar la app
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+t = time.perf_counter()
+status = client.get('/api/status').status_code
+first_status = time.perf_counter() - t
+t = time.perf_counter()
+webhook = client.post('/telegram', json={'update_id': 1, 'message': {'chat': {'id': 1}, 'text': 'hola'}}).status_code
+first_webhook = time.perf_counter() - t
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_status_ms': first_status * 1000,
+    'first_webhook_ms': first_webhook * 1000,
+    'status_code': status,
+    'webhook_code': webhook,
+    'loaded': sorted(m for m in sys.argv[1].split(',') if m in sys.modules),
+}))
+"""
+
+DEFAULT_FORBID = 'requests,urllib3,bs4,gunicorn'
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = REPO_ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env.setdefault('TELEGRAM_API_URL', 'http://127.0.0.1:9')
+    return env
+
+
+def run_probe(forbid):
+    """Una repetición en frío; devuelve las medidas del proceso"""
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    try:
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', PROBE, ','.join(forbid)], cwd=workdir, env=_env(),
+                                capture_output=True, text=True, timeout=120)
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        data['process_ms'] = wall * 1000
+        return data
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def import_profile(top=15):
+    """Módulos con más tiempo propio de importación (python -X importtime)"""
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    try:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=workdir,
+                                env=_env(), capture_output=True, text=True, timeout=120)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append({'module': name.strip(), 'self_ms': int(own) / 1000, 'cumulative_ms': int(cumulative) / 1000})
+    return sorted(rows, key=lambda row: row['self_ms'], reverse=True)[:top]
+
+
+def run_serve(timeout=60):
+    """`main.py serve` en frío: tiempo hasta READY_FILE y hasta la primera respuesta"""
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    ready_file = os.path.join(workdir, 'ready')
+    env = _env()
+    env.update({'PORT': str(port), 'READY_FILE': ready_file, 'GUNICORN_WORKERS': '1'})
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py'), 'serve'], cwd=workdir,
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(ready_file):
+            if time.perf_counter() - started > timeout or process.poll() is not None:
+                raise RuntimeError("El servidor no llegó a estar listo")
+            time.sleep(0.005)
+        ready = time.perf_counter() - started
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/status", timeout=5) as response:
+                    response.read()
+                break
+            except OSError:
+                if time.perf_counter() - started > timeout:
+                    raise
+                time.sleep(0.005)
+        first = time.perf_counter() - started
+        return {'ready_ms': ready * 1000, 'first_response_ms': first * 1000}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(samples, keys):
+    summary = {}
+    for key in keys:
+        values = [sample[key] for sample in samples]
+        summary[key] = {
+            'median': round(statistics.median(values), 1),
+            'max': round(max(values), 1),
+            'min': round(min(values), 1),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--serve', action='store_true', help="Medir también main.py serve (gunicorn)")
+    parser.add_argument('--forbid', default=DEFAULT_FORBID,
+                        help="Módulos que no deben cargarse al importar la app (separados por comas)")
+    parser.add_argument('--max-import-ms', type=float, help="Mediana máxima de `import app`")
+    parser.add_argument('--max-first-ms', type=float, help="Mediana máxima de la primera respuesta")
+    parser.add_argument('--top', type=int, default=15, help="Módulos a listar en el perfil de importación")
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+    forbid = [name.strip() for name in args.forbid.split(',') if name.strip()]
+
+    samples = [run_probe(forbid) for _ in range(args.runs)]
+    results = {
+        'probe': summarize(samples, ('import_ms', 'first_status_ms', 'first_webhook_ms', 'process_ms')),
+        'loaded_forbidden': sorted({name for sample in samples for name in sample['loaded']}),
+        'import_profile': import_profile(args.top),
+    }
+    print(f"✅ import app: mediana {results['probe']['import_ms']['median']} ms, "
+          f"primer /telegram {results['probe']['first_webhook_ms']['median']} ms", file=sys.stderr)
+    if args.serve:
+        serve_samples = [run_serve() for _ in range(args.runs)]
+        results['serve'] = summarize(serve_samples, ('ready_ms', 'first_response_ms'))
+        print(f"✅ serve: listo en {results['serve']['ready_ms']['median']} ms", file=sys.stderr)
+
+    failures = []
+    if results['loaded_forbidden']:
+        failures.append(f"módulos cargados al importar: {', '.join(results['loaded_forbidden'])}")
+    if args.max_import_ms and results['probe']['import_ms']['median'] > args.max_import_ms:
+        failures.append(f"import app {results['probe']['import_ms']['median']} ms > {args.max_import_ms} ms")
+    first = max(results['probe']['first_status_ms']['median'], results['probe']['first_webhook_ms']['median'])
+    if args.max_first_ms and first > args.max_first_ms:
+        failures.append(f"primera respuesta {first} ms > {args.max_first_ms} ms")
+
+    report = {
+        'benchmark': 'startup',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results,
+        'failures': failures,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for failure in failures:
+        print(f"❌ Regresión: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Benchmark de extremo a extremo de OJSUploader.upload_from_links
+
+Levanta un OJS falso y un host de archivos locales, ejecuta escenarios
+(muchos archivos pequeños, pocos enormes, mixto) y emite JSON con tiempo
+total, MB/s, pico de RSS y conteo de peticiones.
+
+Uso:
+    python benchmarks/bench_uploader.py
+    python benchmarks/bench_uploader.py --scenario mixed --latency 0.02 --bandwidth 5000000 -o bench.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import FakeOJSServer, FileHostServer, FaultConfig  # noqa: E402
+
+KB = 1024
+MB = 1024 * 1024
+
+# Escenarios: lista de (extensión, tamaño en bytes, cantidad)
+SCENARIOS = {
+    'many_small': [('pdf', 20 * KB, 80), ('docx', 20 * KB, 60), ('txt', 20 * KB, 60)],
+    'few_huge': [('pdf', 25 * MB, 3)],
+    'mixed': [('txt', 100 * KB, 50), ('docx', 2 * MB, 10), ('pdf', 15 * MB, 2)],
+}
+
+
+def build_links(file_host, scenario, scale):
+    """Generar enlaces del escenario sobre el host de archivos"""
+    links = []
+    for ext, size, count in SCENARIOS[scenario]:
+        for i in range(count):
+            links.append(file_host.link(f"{scenario}_{ext}_{i}.{ext}", max(1, int(size * scale))))
+    return links
+
+
+def run_scenario(ojs_url, links, submission_id, result_queue):
+    """Ejecutar un escenario en un proceso hijo (RSS aislado por escenario)"""
+    sys.path.insert(0, REPO_ROOT)
+    import logging
+    logging.disable(logging.CRITICAL)
+    from bot_core import OJSUploader
+
+    workdir = tempfile.mkdtemp(prefix="ojs_bench_")
+    os.chdir(workdir)
+
+    uploader = OJSUploader(ojs_url, 'bench', 'bench')
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        ok = uploader.upload_from_links(links, submission_id)
+    wall = time.perf_counter() - started
+
+    result_queue.put({
+        'ok': bool(ok),
+        'wall_seconds': round(wall, 4),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'uploaded_entries': len(uploader.uploaded_urls),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de OJSUploader contra servidores locales")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Escenario a ejecutar (repetible; por defecto todos)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiplicador de tamaños de archivo")
+    parser.add_argument('--repeat', type=int, default=1, help="Repeticiones por escenario")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia por petición (s)")
+    parser.add_argument('--bandwidth', type=int, default=None, help="Límite por conexión (bytes/s)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probabilidad de error 500")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    faults = dict(latency=args.latency, bandwidth=args.bandwidth, error_rate=args.error_rate)
+    ojs = FakeOJSServer(FaultConfig(seed=args.seed, **faults)).start()
+    files = FileHostServer(FaultConfig(seed=args.seed + 1, **faults), seed=args.seed).start()
+
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        for scenario in args.scenario or sorted(SCENARIOS):
+            links = build_links(files, scenario, args.scale)
+            for run in range(args.repeat):
+                ojs.reset_stats()
+                files.reset_stats()
+
+                queue = ctx.Queue()
+                proc = ctx.Process(target=run_scenario,
+                                   args=(ojs.url, links, ojs.submission_ids[0], queue))
+                proc.start()
+                outcome = queue.get()
+                proc.join()
+
+                downloaded = files.stats()['bytes_sent']
+                uploaded = ojs.stats()['bytes_received']
+                wall = outcome['wall_seconds']
+                results.append({
+                    'scenario': scenario,
+                    'run': run + 1,
+                    'files': len(links),
+                    'ok': outcome['ok'],
+                    'wall_seconds': wall,
+                    'downloaded_bytes': downloaded,
+                    'uploaded_bytes': uploaded,
+                    'download_mb_s': round(downloaded / MB / wall, 3) if wall else None,
+                    'upload_mb_s': round(uploaded / MB / wall, 3) if wall else None,
+                    'peak_rss_mb': round(outcome['peak_rss_kb'] / KB, 1),
+                    'uploads': ojs.stats()['uploads'],
+                    'ojs_requests': ojs.stats()['requests'],
+                    'file_requests': files.stats()['total_requests'],
+                })
+                print(f"✅ {scenario} #{run + 1}: {wall:.2f}s, "
+                      f"{results[-1]['download_mb_s']} MB/s descarga, "
+                      f"RSS {results[-1]['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        ojs.stop()
+        files.stop()
+
+    report = {
+        'benchmark': 'ojs_uploader',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Prueba de carga del webhook /telegram
+
+Reproduce Updates sintéticos de Telegram a tasas crecientes contra la app
+Flask (servidor de desarrollo y/o gunicorn), con una API de Telegram local.
+Reporta p50/p95/p99, tasa de errores, throughput logrado y el punto de
+saturación (primera tasa donde no se sostiene la carga o se rompe el SLO).
+
+Uso:
+    python benchmarks/bench_webhook.py
+    python benchmarks/bench_webhook.py --server gunicorn --rates 20,50,100,200 --duration 5 -o webhook.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import FakeTelegramServer, FaultConfig  # noqa: E402
+
+BOT_TOKEN = "123456:BENCH-token"
+COMMANDS = ['/start', '/help', '/status', 'hola']
+
+
+def free_port():
+    """Puerto TCP libre en localhost"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def prepare_workdir():
+    """Directorio de trabajo con configuración de Telegram lista"""
+    workdir = tempfile.mkdtemp(prefix="webhook_bench_")
+    os.makedirs(os.path.join(workdir, 'config'))
+    with open(os.path.join(workdir, 'config', 'telegram.json'), 'w') as f:
+        json.dump({
+            'telegram_bot_token': BOT_TOKEN,
+            'telegram_admin_user_id': '1',
+            'is_active': True
+        }, f)
+    return workdir
+
+
+def start_app(server, port, workdir, telegram_url, workers, threads):
+    """Arrancar la app bajo el servidor indicado y esperar a que responda"""
+    env = dict(os.environ, PORT=str(port), TELEGRAM_API_URL=telegram_url,
+               PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    if server == 'dev':
+        cmd = [sys.executable, os.path.join(REPO_ROOT, 'app.py')]
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning', 'app:app']
+
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/status", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"La app ({server}) no respondió en el puerto {port}")
+
+
+def run_step(url, rate, duration, concurrency, update_ids, timeout):
+    """Carga de lazo abierto a tasa fija; latencia medida desde el envío programado"""
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def fire(scheduled, update_id):
+        nonlocal errors
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        chat_id = 1000 + update_id % 50
+        payload = {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+                'text': random.choice(COMMANDS)
+            }
+        }
+        ok = False
+        try:
+            response = local.session.post(url, json=payload, timeout=timeout)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            pass
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    total = max(1, int(rate * duration))
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(total):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, scheduled, next(update_ids))
+    wall = time.perf_counter() - started
+
+    return {
+        'offered_rps': rate,
+        'requests': total,
+        'achieved_rps': round(total / wall, 2),
+        'error_rate': round(errors / total, 4),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def is_saturated(step, slo_p99_ms, max_error_rate):
+    """La tasa no se sostiene: throughput bajo, p99 fuera de SLO o demasiados errores"""
+    return (step['achieved_rps'] < 0.9 * step['offered_rps']
+            or step['p99_ms'] > slo_p99_ms
+            or step['error_rate'] > max_error_rate)
+
+
+def bench_server(server, args, telegram):
+    """Ejecutar todos los escalones de tasa contra un servidor"""
+    workdir = prepare_workdir()
+    port = free_port()
+    proc = start_app(server, port, workdir, telegram.url, args.workers, args.threads)
+    url = f"http://127.0.0.1:{port}/telegram"
+    update_ids = itertools.count(1)
+    steps = []
+    saturation = None
+    try:
+        for rate in args.rates:
+            telegram.reset_stats()
+            step = run_step(url, rate, args.duration, args.concurrency, update_ids, args.timeout)
+            step['telegram_calls'] = telegram.stats()['total_requests']
+            steps.append(step)
+            print(f"  {server} @ {rate} rps: p50={step['p50_ms']}ms p99={step['p99_ms']}ms "
+                  f"err={step['error_rate']:.2%} logrado={step['achieved_rps']} rps", file=sys.stderr)
+            if is_saturated(step, args.slo_p99_ms, args.max_error_rate):
+                saturation = rate
+                if not args.keep_going:
+                    break
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'server': server, 'saturation_rps': saturation, 'steps': steps}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del webhook /telegram")
+    parser.add_argument('--server', action='append', choices=['dev', 'gunicorn'],
+                        help="Servidor a probar (repetible; por defecto ambos)")
+    parser.add_argument('--rates', default='10,25,50,100,200',
+                        help="Tasas (updates/s) separadas por comas")
+    parser.add_argument('--duration', type=float, default=5.0, help="Segundos por escalón")
+    parser.add_argument('--concurrency', type=int, default=64, help="Peticiones simultáneas máximas")
+    parser.add_argument('--timeout', type=float, default=15.0, help="Timeout por petición (s)")
+    parser.add_argument('--telegram-latency', type=float, default=0.05,
+                        help="Latencia simulada de api.telegram.org (s)")
+    parser.add_argument('--workers', type=int, default=2, help="Workers de gunicorn")
+    parser.add_argument('--threads', type=int, default=4, help="Hilos por worker de gunicorn")
+    parser.add_argument('--slo-p99-ms', type=float, default=1000.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--keep-going', action='store_true', help="Seguir tras la saturación")
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+    args.rates = [float(rate) for rate in args.rates.split(',') if rate.strip()]
+
+    telegram = FakeTelegramServer(FaultConfig(latency=args.telegram_latency)).start()
+    results = []
+    try:
+        for server in args.server or ['dev', 'gunicorn']:
+            print(f"🚀 Servidor: {server}", file=sys.stderr)
+            results.append(bench_server(server, args, telegram))
+    finally:
+        telegram.stop()
+
+    report = {
+        'benchmark': 'telegram_webhook',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
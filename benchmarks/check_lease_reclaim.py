@@ -0,0 +1,158 @@
+"""
+Comprobación de leases entre procesos: dos `main.py worker` sobre la misma base SQLite
+
+Levanta un OJS falso y un host de archivos lento, encola un trabajo y
+arranca dos workers con un lease corto. Cuando uno reclama el trabajo:
+
+- kill: se mata con SIGKILL; el otro debe retomarlo al vencer el lease.
+- stop: se congela con SIGSTOP hasta que el otro lo retoma y luego se
+  reanuda con SIGCONT; al renovar el lease ve que lo perdió y se detiene
+  sin pisar el estado (Event cancelled del trabajo).
+
+Emite JSON con la instancia inicial, la que lo retomó, los intentos y el
+estado final. Termina con código 1 si el trabajo no se retomó.
+
+Uso:
+    python benchmarks/check_lease_reclaim.py
+    python benchmarks/check_lease_reclaim.py --mode stop --lease 3 --files 12 -o lease.json
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from fake_servers import FakeOJSServer, FileHostServer, FaultConfig  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def enqueue_job(config_manager, ojs_url, links):
+    """Revista apuntando al OJS falso y un trabajo en la cola compartida"""
+    from jobs import UploadJob
+    from scheduler import initial_cost, job_host
+
+    journal_id = config_manager.add_journal_config({
+        'name': 'Lease', 'host': ojs_url, 'username': 'bench', 'password': 'bench',
+    })
+    job = UploadJob(journal_id, '2415', links, owner='bench')
+    config_manager.job_store.enqueue(job.to_dict(), job.spec(), job_host(ojs_url), job.owner,
+                                     initial_cost(links, None))
+    return job.id
+
+
+def job_row(db, job_id):
+    row = db.execute("SELECT status, lease_owner, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row)
+
+
+def owner_pid(lease_owner):
+    """PID de una instancia (host:pid:sufijo, ver JobManager._ensure_workers)"""
+    return int(lease_owner.split(':')[-2]) if lease_owner else None
+
+
+def wait_for(predicate, timeout, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(interval)
+    return None
+
+
+def start_worker(work_dir, lease, log_path):
+    env = dict(os.environ, JOB_LEASE_SECONDS=str(lease), UPLOAD_WORKERS='1', PYTHONUNBUFFERED='1')
+    log = open(log_path, 'w', encoding='utf-8')
+    return subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py'), 'worker'],
+                            cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dos workers sobre una base SQLite: retomar un trabajo")
+    parser.add_argument('--mode', choices=('kill', 'stop'), default='kill',
+                        help="SIGKILL al worker con el trabajo o SIGSTOP/SIGCONT")
+    parser.add_argument('--lease', type=int, default=3, help="JOB_LEASE_SECONDS de los workers")
+    parser.add_argument('--files', type=int, default=12, help="Archivos de 1 MB del trabajo")
+    parser.add_argument('--bandwidth', type=int, default=MB, help="Límite del host de archivos (bytes/s)")
+    parser.add_argument('--timeout', type=float, default=120, help="Espera máxima total (s)")
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+
+    work_dir = tempfile.mkdtemp(prefix='lease_reclaim_')
+    os.chdir(work_dir)
+    from config_manager import ConfigManager
+
+    ojs = FakeOJSServer().start()
+    files = FileHostServer(FaultConfig(bandwidth=args.bandwidth)).start()
+    config_manager = ConfigManager()
+    db = config_manager.db
+    job_id = enqueue_job(config_manager, ojs.url,
+                         [files.link(f"doc_{i}.pdf", MB) for i in range(args.files)])
+
+    workers = [start_worker(work_dir, args.lease, os.path.join(work_dir, f"worker_{i}.log")) for i in range(2)]
+    started = time.monotonic()
+    result = {'mode': args.mode, 'job_id': job_id, 'work_dir': work_dir}
+    try:
+        first = wait_for(lambda: owner_pid(job_row(db, job_id)['lease_owner']), args.timeout)
+        if first is None:
+            raise RuntimeError("Ningún worker reclamó el trabajo")
+        victim = next(proc for proc in workers if proc.pid == first)
+        survivor = next(proc for proc in workers if proc.pid != first)
+        time.sleep(args.lease)  # Que el trabajo esté a mitad de descarga
+        result['first_owner'] = first
+        result['interrupted_after'] = round(time.monotonic() - started, 2)
+
+        victim.send_signal(signal.SIGKILL if args.mode == 'kill' else signal.SIGSTOP)
+        print(f"💥 Worker {first} interrumpido ({args.mode})", file=sys.stderr)
+
+        reclaimed = wait_for(lambda: owner_pid(job_row(db, job_id)['lease_owner']) == survivor.pid,
+                             args.timeout)
+        result['reclaimed_by'] = survivor.pid if reclaimed else None
+        result['reclaimed_after'] = round(time.monotonic() - started, 2) if reclaimed else None
+        if args.mode == 'stop':
+            victim.send_signal(signal.SIGCONT)
+
+        wait_for(lambda: job_row(db, job_id)['status'] in ('completed', 'failed'), args.timeout)
+        row = job_row(db, job_id)
+        result.update(status=row['status'], attempts=row['attempts'], uploads=ojs.stats()['uploads'],
+                      wall_seconds=round(time.monotonic() - started, 2))
+        if args.mode == 'stop':
+            time.sleep(args.lease)
+            with open(os.path.join(work_dir, f"worker_{workers.index(victim)}.log"), encoding='utf-8') as f:
+                result['victim_cancelled'] = 'Lease perdido' in f.read()
+    finally:
+        for proc in workers:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGCONT)
+                proc.terminate()
+        for proc in workers:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        ojs.stop()
+        files.stop()
+
+    text = json.dumps(result, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    ok = result.get('reclaimed_by') and result.get('status') == 'completed'
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
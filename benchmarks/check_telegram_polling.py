@@ -0,0 +1,194 @@
+"""
+Comprobación de extremo a extremo del modo long polling contra una API de Telegram local
+
+Levanta FakeTelegramServer y un OJS falso en un directorio temporal y
+comprueba:
+
+- poll_once: TelegramPoller entrega los updates a la cola y avanza el
+  offset; con la cola llena el offset se queda en el primer rechazado.
+- main_poll: con el bot configurado (token, administrador y una revista)
+  arranca `main.py poll` con TELEGRAM_API_URL apuntando al servidor local,
+  envía como administrador `/upload <revista> <envío>` y un documento, y
+  espera a que el documento llegue íntegro al OJS falso.
+
+Emite JSON con los updates entregados, las llamadas a la Bot API y el
+resultado de la subida. Termina con código 1 si algo falla.
+
+Uso:
+    python benchmarks/check_telegram_polling.py
+    python benchmarks/check_telegram_polling.py --size 2000000 -o polling.json
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from fake_servers import FakeOJSServer, FakeTelegramServer  # noqa: E402
+
+TOKEN = '123456:bench-token'
+ADMIN_ID = 4242
+
+
+def wait_for(predicate, timeout, interval=0.1):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(interval)
+    return None
+
+
+class ListQueue:
+    """Cola mínima con la interfaz de UpdateQueue.submit y capacidad opcional"""
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.items = []
+
+    def submit(self, update):
+        if self.capacity is not None and len(self.items) >= self.capacity:
+            return 'shed'
+        self.items.append(update)
+        return 'queued'
+
+
+def check_poll_once(telegram):
+    """TelegramPoller.poll_once: updates en la cola y offset tras el último aceptado"""
+    from telegram_polling import TelegramPoller
+
+    ids = [telegram.push_message(ADMIN_ID, f"mensaje {i}") for i in range(3)]
+    queue = ListQueue()
+    poller = TelegramPoller(TOKEN, queue, api_url=telegram.url, timeout=1)
+    accepted = poller.poll_once()
+    result = {
+        'accepted': accepted,
+        'queued_ids': [u['update_id'] for u in queue.items],
+        'offset': poller.offset,
+        'empty_poll': poller.poll_once(timeout=0),
+    }
+
+    # Cola llena tras dos updates: el tercero se vuelve a pedir con el mismo offset
+    ids += [telegram.push_message(ADMIN_ID, f"mensaje {i}") for i in range(3, 6)]
+    poller.update_queue = ListQueue(capacity=2)
+    result['backlog_accepted'] = poller.poll_once()
+    result['backlogged'] = poller.backlogged
+    result['backlog_offset'] = poller.offset
+    poller.update_queue = queue
+    poller.poll_once()
+    result['final_offset'] = poller.offset
+    poller.poll_once(timeout=0)  # Confirma el último offset: no quedan updates para main.py poll
+    result['updates_left'] = len(telegram.updates)
+
+    result['ok'] = (accepted == 3 and result['queued_ids'] == ids[:3] and result['offset'] == ids[2] + 1
+                    and result['empty_poll'] == 0 and result['backlog_accepted'] == 2 and result['backlogged']
+                    and result['backlog_offset'] == ids[4] + 1 and result['final_offset'] == ids[5] + 1
+                    and [u['update_id'] for u in queue.items] == ids[:3] + ids[5:]
+                    and result['updates_left'] == 0)
+    return result
+
+
+def configure(ojs_url):
+    """Token, administrador y revista en config/ del directorio actual; devuelve el id de la revista"""
+    from config_manager import ConfigManager
+
+    config_manager = ConfigManager()
+    config_manager.update_telegram_config({
+        'telegram_bot_token': TOKEN,
+        'telegram_admin_user_id': str(ADMIN_ID),
+        'is_active': True,
+    })
+    return config_manager, config_manager.add_journal_config({
+        'name': 'Polling', 'host': ojs_url, 'username': 'bench', 'password': 'bench',
+    })
+
+
+def start_poller(work_dir, api_url, log_path):
+    env = dict(os.environ, TELEGRAM_API_URL=api_url, TELEGRAM_TOKEN=TOKEN, PYTHONUNBUFFERED='1')
+    log = open(log_path, 'w', encoding='utf-8')
+    return subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, 'main.py'), 'poll'],
+                            cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def check_main_poll(telegram, ojs, size, timeout):
+    """main.py poll: /upload y un documento del administrador acaban subidos al OJS"""
+    work_dir = os.getcwd()
+    config_manager, journal_id = configure(ojs.url)
+    content = random.Random(size).randbytes(size)
+    telegram.add_file('doc-1', content)
+    telegram.reset_stats()
+
+    poller = start_poller(work_dir, telegram.url, os.path.join(work_dir, 'poll.log'))
+    result = {}
+    try:
+        telegram.push_message(ADMIN_ID, f"/upload {journal_id} {ojs.submission_ids[0]}", from_id=ADMIN_ID)
+        # El destino se guarda antes de que llegue el documento (mismo chat, mismo worker)
+        telegram.push_message(ADMIN_ID, from_id=ADMIN_ID, document={
+            'file_id': 'doc-1', 'file_unique_id': 'u1', 'file_name': 'articulo.pdf',
+            'mime_type': 'application/pdf', 'file_size': size,
+        })
+        uploaded = wait_for(lambda: ojs.recorded_uploads, timeout)
+        job = wait_for(lambda: next((j for j in config_manager.job_store.list(limit=1)
+                                     if j['status'] in ('completed', 'failed')), None), timeout)
+        requests_seen = telegram.stats()['requests']
+        result.update({
+            'updates_pending': len(telegram.updates),
+            'delete_webhook_calls': requests_seen.get('deleteWebhook', 0),
+            'get_updates_calls': requests_seen.get('getUpdates', 0),
+            'get_file_calls': requests_seen.get('getFile', 0),
+            'messages_sent': requests_seen.get('sendMessage', 0),
+            'job_status': job['status'] if job else None,
+            'uploads': len(ojs.recorded_uploads),
+            'upload_intact': bool(uploaded) and content in ojs.recorded_uploads[0][1],
+        })
+    finally:
+        poller.send_signal(signal.SIGTERM)
+        try:
+            poller.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            poller.kill()
+    result['ok'] = (result.get('job_status') == 'completed' and result.get('upload_intact')
+                    and result.get('delete_webhook_calls', 0) >= 1 and result.get('updates_pending') == 0)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="main.py poll contra una API de Telegram local")
+    parser.add_argument('--size', type=int, default=256 * 1024, help="Tamaño del documento (bytes)")
+    parser.add_argument('--timeout', type=float, default=60, help="Espera máxima por paso (s)")
+    parser.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+
+    os.chdir(tempfile.mkdtemp(prefix='telegram_polling_'))
+    telegram = FakeTelegramServer().start()
+    ojs = FakeOJSServer(record_uploads=True).start()
+    try:
+        report = {'work_dir': os.getcwd(), 'poll_once': check_poll_once(telegram)}
+        report['main_poll'] = check_main_poll(telegram, ojs, args.size, args.timeout)
+    finally:
+        telegram.stop()
+        ojs.stop()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all(check['ok'] for name, check in report.items() if name != 'work_dir') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
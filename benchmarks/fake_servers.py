@@ -0,0 +1,416 @@
+"""
+Servidores locales para benchmarks: OJS falso, host de archivos sintéticos
+y sustituto de la API de Telegram
+Permiten inyectar latencia, límite de ancho de banda y tasa de errores
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CHUNK_SIZE = 64 * 1024
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Entrar</title></head>
+<body>
+<form class="pkp_form" id="login" method="post" action="/login/signIn">
+  <input type="hidden" name="csrfToken" value="{csrf}">
+  <input type="text" name="username" id="username" value="">
+  <input type="password" name="password" id="password" value="">
+  <button type="submit">Entrar</button>
+</form>
+</body></html>
+"""
+
+SUBMISSIONS_PAGE = """<!DOCTYPE html>
+<html><head><meta name="csrf-token" content="{csrf}"><title>Envíos</title></head>
+<body>
+{items}
+</body></html>
+"""
+
+WIZARD_PAGE = """<!DOCTYPE html>
+<html><head><meta name="csrf-token" content="{csrf}"></head>
+<body>
+<form id="submitStep2Form" method="post" action="/submission/wizard/2" enctype="multipart/form-data">
+  <input type="file" name="submissionFile">
+  <button class="pkpButton">Añadir archivo</button>
+</form>
+</body></html>
+"""
+
+# Tipos de archivo sintético: contenido incompresible (PDF/DOCX) o texto
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain; charset=utf-8',
+}
+
+
+class FaultConfig:
+    """Latencia, ancho de banda y tasa de errores inyectables"""
+
+    def __init__(self, latency=0.0, bandwidth=None, error_rate=0.0, seed=None):
+        self.latency = latency          # segundos por petición
+        self.bandwidth = bandwidth      # bytes/segundo por conexión (None = sin límite)
+        self.error_rate = error_rate    # probabilidad de responder 500
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self):
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    """Handler base con conteo de peticiones y fallos inyectados"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def faults(self):
+        return self.server.faults
+
+    def _count(self, name):
+        with self.server.stats_lock:
+            self.server.request_counts[name] += 1
+
+    def _inject(self):
+        """Aplicar latencia y error aleatorio; True si ya se respondió con error"""
+        if self.faults.latency:
+            time.sleep(self.faults.latency)
+        if self.faults.should_fail():
+            with self.server.stats_lock:
+                self.server.request_counts['errors_injected'] += 1
+            self._send_body(500, b'Error inyectado', 'text/plain')
+            return True
+        return False
+
+    def _throttle(self, nbytes, started):
+        """Dormir lo necesario para respetar el ancho de banda"""
+        if self.faults.bandwidth:
+            expected = nbytes / self.faults.bandwidth
+            elapsed = time.monotonic() - started
+            if expected > elapsed:
+                time.sleep(expected - elapsed)
+
+    def _send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self, keep=False):
+        """Leer el cuerpo de la petición (respetando el ancho de banda)
+
+        Devuelve los bytes leídos, o el cuerpo completo con keep=True.
+        """
+        length = int(self.headers.get('Content-Length', 0))
+        started = time.monotonic()
+        received = 0
+        parts = []
+        while received < length:
+            data = self.rfile.read(min(CHUNK_SIZE, length - received))
+            if not data:
+                break
+            received += len(data)
+            if keep:
+                parts.append(data)
+            self._throttle(received, started)
+        with self.server.stats_lock:
+            self.server.bytes_received += received
+        return b''.join(parts) if keep else received
+
+
+class FakeOJSHandler(_BaseHandler):
+    """OJS mínimo: login, lista de envíos y paso 2 del asistente"""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip('/')
+        self._count(f"GET {path}")
+        if self._inject():
+            return
+
+        csrf = self.server.csrf_token
+        if path == '/login':
+            self._send_body(200, LOGIN_PAGE.format(csrf=csrf).encode(), 'text/html; charset=utf-8')
+        elif path == '/submissions':
+            items = '\n'.join(
+                f'<div class="pkp_submission_id">{sid}</div>' for sid in self.server.submission_ids
+            )
+            self._send_body(200, SUBMISSIONS_PAGE.format(csrf=csrf, items=items).encode(),
+                            'text/html; charset=utf-8')
+        elif path == '/submission/wizard/2':
+            self._send_body(200, WIZARD_PAGE.format(csrf=csrf).encode(), 'text/html; charset=utf-8')
+        else:
+            self._send_body(404, b'No encontrado', 'text/plain')
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip('/')
+        self._count(f"POST {path}")
+        body = self._read_body(keep=self.server.record_uploads)
+        received = len(body) if self.server.record_uploads else body
+        if self._inject():
+            return
+
+        if path.startswith('/login'):
+            self._send_body(302, b'', 'text/plain', {'Location': '/submissions'})
+        elif path == '/submission/wizard/2':
+            with self.server.stats_lock:
+                self.server.uploads += 1
+                if self.server.record_uploads:
+                    self.server.recorded_uploads.append((self.headers.get('Content-Type'), body))
+            self._send_body(200, f'{{"status": true, "bytes": {received}}}'.encode(), 'application/json')
+        else:
+            self._send_body(404, b'No encontrado', 'text/plain')
+
+
+class FileHostHandler(_BaseHandler):
+    """Host de archivos sintéticos: /files/<nombre>.<ext>?size=<bytes>"""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        self._count('GET /files')
+        if self._inject():
+            return
+
+        match = re.match(r'^/files/[\w.-]+\.(\w+)$', parsed.path)
+        if not match:
+            self._send_body(404, b'No encontrado', 'text/plain')
+            return
+
+        ext = match.group(1).lower()
+        size = int(parse_qs(parsed.query).get('size', ['1048576'])[0])
+        block = self.server.blocks.get(ext, self.server.blocks['pdf'])
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(ext, 'application/octet-stream'))
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+        # Transmitir sin construir el archivo completo en memoria
+        started = time.monotonic()
+        sent = 0
+        while sent < size:
+            piece = block[:min(len(block), size - sent)]
+            self.wfile.write(piece)
+            sent += len(piece)
+            self._throttle(sent, started)
+        with self.server.stats_lock:
+            self.server.bytes_sent += sent
+
+
+class _BenchServer(ThreadingHTTPServer):
+    """Servidor en hilo propio con estadísticas compartidas"""
+
+    daemon_threads = True
+
+    def __init__(self, handler, faults, host='127.0.0.1', port=0):
+        super().__init__((host, port), handler)
+        self.faults = faults or FaultConfig()
+        self.stats_lock = threading.Lock()
+        self.request_counts = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.uploads = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.request_counts = Counter()
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.uploads = 0
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'requests': dict(self.request_counts),
+                'total_requests': sum(v for k, v in self.request_counts.items() if k != 'errors_injected'),
+                'bytes_received': self.bytes_received,
+                'bytes_sent': self.bytes_sent,
+                'uploads': self.uploads,
+            }
+
+
+class FakeOJSServer(_BenchServer):
+    """OJS falso con login, CSRF, /submissions y /submission/wizard/2"""
+
+    def __init__(self, faults=None, submission_ids=('2415',), record_uploads=False, **kwargs):
+        super().__init__(FakeOJSHandler, faults, **kwargs)
+        self.csrf_token = 'bench-csrf-token-0123456789abcdef'
+        self.submission_ids = list(submission_ids)
+        # Guardar (Content-Type, cuerpo) de cada subida para verificarla en pruebas
+        self.record_uploads = record_uploads
+        self.recorded_uploads = []
+
+
+class FileHostServer(_BenchServer):
+    """Host de archivos PDF/DOCX/TXT sintéticos de tamaño configurable"""
+
+    def __init__(self, faults=None, seed=1234, **kwargs):
+        super().__init__(FileHostHandler, faults, **kwargs)
+        rng = random.Random(seed)
+        noise = bytes(rng.getrandbits(8) for _ in range(CHUNK_SIZE))
+        text = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 1200).encode()[:CHUNK_SIZE]
+        self.blocks = {
+            'pdf': b'%PDF-1.4\n' + noise[9:],
+            'docx': b'PK\x03\x04' + noise[4:],
+            'txt': text,
+        }
+
+    def link(self, name, size):
+        """URL de un archivo sintético"""
+        return f"{self.url}/files/{name}?size={size}"
+
+
+class FakeTelegramHandler(_BaseHandler):
+    """Sustituto de api.telegram.org: responde ok a cualquier método /bot<token>/<método>
+
+    getUpdates entrega los updates añadidos con push_update() (long polling
+    incluido) respetando offset y limit; getFile y /file/bot... sirven los
+    archivos añadidos con add_file().
+    """
+
+    def do_GET(self):
+        if self.path.startswith('/file/bot'):
+            self._serve_file()
+            return
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _serve_file(self):
+        """Descarga /file/bot<token>/<file_path> de un archivo añadido con add_file()"""
+        self._count('file')
+        if self._inject():
+            return
+        file_path = urlparse(self.path).path.split('/', 3)[-1]
+        content = self.server.files_by_path.get(file_path)
+        if content is None:
+            self._send_body(404, b'{"ok": false, "error_code": 404}', 'application/json')
+            return
+        with self.server.stats_lock:
+            self.server.bytes_sent += len(content)
+        self._send_body(200, content, 'application/octet-stream')
+
+    def _handle(self):
+        parsed = urlparse(self.path)
+        match = re.match(r'^/bot[^/]+/(\w+)$', parsed.path)
+        method = match.group(1) if match else 'unknown'
+        self._count(method)
+        body = self._read_body(keep=True)
+        if self._inject():
+            return
+
+        if not match:
+            self._send_body(404, b'{"ok": false, "error_code": 404}', 'application/json')
+            return
+
+        if method == 'getUpdates':
+            params = json.loads(body or b'{}')
+            params.update({key: values[0] for key, values in parse_qs(parsed.query).items()})
+            updates = self.server.wait_updates(int(params.get('offset', 0)),
+                                               int(params.get('limit', 100)),
+                                               float(params.get('timeout', 0)))
+            payload = json.dumps({'ok': True, 'result': updates}).encode()
+            self._send_body(200, payload, 'application/json')
+            return
+
+        if method == 'getFile':
+            file_id = json.loads(body or b'{}').get('file_id')
+            content = self.server.files_by_path.get(f"documents/{file_id}")
+            if content is None:
+                payload = {'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid file_id'}
+            else:
+                payload = {'ok': True, 'result': {'file_id': file_id, 'file_size': len(content),
+                                                  'file_path': f"documents/{file_id}"}}
+            self._send_body(200, json.dumps(payload).encode(), 'application/json')
+            return
+
+        with self.server.stats_lock:
+            self.server.message_seq += 1
+            message_id = self.server.message_seq
+        body = (
+            '{"ok": true, "result": {"message_id": %d, "date": %d, "chat": {"id": 0}}}'
+            % (message_id, int(time.time()))
+        )
+        self._send_body(200, body.encode(), 'application/json')
+
+
+class FakeTelegramServer(_BenchServer):
+    """API de Telegram local para pruebas de carga del webhook"""
+
+    def __init__(self, faults=None, **kwargs):
+        super().__init__(FakeTelegramHandler, faults, **kwargs)
+        self.message_seq = 0
+        self.update_seq = 0
+        self.updates = []
+        self.updates_cond = threading.Condition()
+        self.files_by_path = {}
+
+    def add_file(self, file_id, content):
+        """Archivo descargable con getFile + /file/bot<token>/documents/<file_id>"""
+        self.files_by_path[f"documents/{file_id}"] = content
+
+    def push_update(self, update):
+        """Añadir un update para getUpdates (asigna update_id si falta)"""
+        with self.updates_cond:
+            self.update_seq += 1
+            update.setdefault('update_id', self.update_seq)
+            self.updates.append(update)
+            self.updates_cond.notify_all()
+        return update['update_id']
+
+    def push_message(self, chat_id, text=None, from_id=None, **fields):
+        """Añadir un update con un mensaje (texto o campos como document) del usuario from_id"""
+        message = {
+            'message_id': self.update_seq + 1,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': from_id or chat_id, 'is_bot': False},
+            'date': int(time.time()),
+            **fields,
+        }
+        if text is not None:
+            message['text'] = text
+        return self.push_update({'message': message})
+
+    def wait_updates(self, offset, limit, timeout):
+        """Updates con id >= offset; espera hasta timeout si no hay ninguno"""
+        deadline = time.monotonic() + timeout
+        with self.updates_cond:
+            # Como Telegram: pedir con offset confirma (olvida) los anteriores
+            while True:
+                self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                remaining = deadline - time.monotonic()
+                if self.updates or remaining <= 0:
+                    return self.updates[:limit]
+                self.updates_cond.wait(remaining)
@@ -4,22 +4,135 @@ Basado en la estructura HTML proporcionada
 """
 
 import requests
-from bs4 import BeautifulSoup
 import os
-import zipfile
 import io
 import time
 import logging
 import re
+import functools
+import hashlib
 from urllib.parse import urljoin, urlparse
-import mimetypes
+
+import metrics
+from profiling import JobProfiler
+from streaming import HashingReader, MultipartStream
 
 logger = logging.getLogger(__name__)
 
+# Tamaño máximo de cada chunk ZIP (y umbral para subir un archivo suelto)
+MAX_CHUNK_SIZE = 10 * 1024 * 1024
+
+
+class UploadCancelled(Exception):
+    """El trabajo se canceló a mitad del proceso (ver OJSUploader.cancelled)"""
+
+
+def parse_html(html):
+    """Parsear HTML con BeautifulSoup (bs4 se importa en el primer uso)"""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, 'html.parser')
+
+
+def timed_stage(stage):
+    """Medir la duración de una etapa del uploader; un retorno False cuenta como error"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            started = time.monotonic()
+            ok = cancelled = False
+            try:
+                result = func(self, *args, **kwargs)
+                ok = result is not False
+                return result
+            except UploadCancelled:
+                cancelled = True
+                raise
+            finally:
+                metrics.record_stage(stage, self.metrics_host, time.monotonic() - started, ok, cancelled)
+        return wrapper
+    return decorator
+
+
+def login_form_data(html, host, username, password):
+    """Acción y campos del formulario de login; LookupError con el motivo si falta algo"""
+    soup = parse_html(html)
+    
+    # Buscar formulario de login
+    login_form = soup.find('form')
+    if not login_form:
+        # Intentar encontrar formulario por acción
+        login_form = soup.find('form', {'action': lambda x: x and 'login' in x})
+    
+    if not login_form:
+        raise LookupError("No se encontró formulario de login")
+    
+    # Campos de entrada basados en el HTML proporcionado
+    username_field = soup.find('input', {'name': 'username', 'id': 'username'})
+    password_field = soup.find('input', {'name': 'password', 'id': 'password', 'type': 'password'})
+    
+    if not username_field or not password_field:
+        raise LookupError("No se encontraron campos de usuario/contraseña")
+    
+    # Campos obligatorios y ocultos
+    form_data = {'username': username, 'password': password}
+    for hidden in login_form.find_all('input', {'type': 'hidden'}):
+        if hidden.get('name') and hidden.get('value'):
+            form_data[hidden['name']] = hidden['value']
+    
+    action = login_form.get('action')
+    if action:
+        if not action.startswith('http'):
+            action = urljoin(host, action)
+    else:
+        action = f"{host}/login"
+    return action, form_data
+
+
+def find_csrf_token(html):
+    """Token CSRF del HTML: (token, origen) con origen 'meta' o 'input'; (None, None) si no hay"""
+    soup = parse_html(html)
+    
+    # Buscar token en meta tags
+    meta_token = soup.find('meta', {'name': 'csrf-token'})
+    if meta_token and meta_token.get('content'):
+        return meta_token['content'], 'meta'
+    
+    # Buscar token en input hidden
+    csrf_input = soup.find('input', {'name': 'csrfToken'})
+    if csrf_input and csrf_input.get('value'):
+        return csrf_input['value'], 'input'
+    return None, None
+
+
+def parse_submission_ids(html):
+    """IDs de envío listados en la página de envíos"""
+    soup = parse_html(html)
+    submission_elements = soup.find_all('div', class_=re.compile(r'.*submission.*id.*', re.I))
+    return [text for text in (elem.get_text(strip=True) for elem in submission_elements) if text.isdigit()]
+
+
+def find_upload_action(html, host, upload_url):
+    """URL del formulario de subida: (acción, solo_botón); LookupError si la página no permite subir"""
+    soup = parse_html(html)
+    
+    upload_form = soup.find('form', {'enctype': 'multipart/form-data'})
+    if upload_form:
+        action = upload_form.get('action')
+        if action and not action.startswith('http'):
+            action = urljoin(host, action)
+        return action or upload_url, False
+    
+    # Buscar botón "Añadir archivo"
+    if soup.find('button', class_='pkpButton', string=re.compile(r'Añadir archivo', re.I)):
+        return upload_url, True
+    raise LookupError("No se encontró formulario de subida")
+
+
 class OJSUploader:
     """Bot para subir archivos a revistas OJS"""
     
-    def __init__(self, host, username, password):
+    def __init__(self, host, username, password, work_dir="temp"):
         self.host = host.rstrip('/')
         self.username = username
         self.password = password
@@ -37,7 +150,20 @@ class OJSUploader:
         self.csrf_token = None
         self.logs = []
         self.uploaded_urls = []
+        self.report_file = None
+        self.profile_summary = None
+        self.max_retries = 2
+        self.metrics_host = metrics.host_label(self.host)
+        self.progress = None  # ProgressReporter opcional (progress.py)
+        self.on_log = None  # callback(línea) por cada mensaje de log (eventos del panel)
+        self.manifest = None  # UploadManifest opcional (reports.py)
+        self.bandwidth = None  # JobBandwidth opcional (bandwidth.py)
+        self.cancelled = None  # threading.Event opcional: detener el proceso (lease perdido, jobs.py)
+        self.submission_id = None  # Envío usado (el indicado o el descubierto)
+        self.work_dir = work_dir  # Directorio de trabajo propio por trabajo en paralelo
+        self.bytes_downloaded = 0
         
+    @timed_stage('login')
     def login(self):
         """Iniciar sesión en OJS basado en la estructura HTML proporcionada"""
         try:
@@ -48,47 +174,13 @@ class OJSUploader:
             response = self.session.get(login_url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 2. Buscar formulario de login
-            login_form = soup.find('form')
-            if not login_form:
-                # Intentar encontrar formulario por acción
-                login_form = soup.find('form', {'action': lambda x: x and 'login' in x})
-            
-            if not login_form:
-                self.log("No se encontró formulario de login")
-                return False
-            
-            # 3. Extraer campos del formulario
-            form_data = {}
-            
-            # Campos de entrada basados en el HTML proporcionado
-            username_field = soup.find('input', {'name': 'username', 'id': 'username'})
-            password_field = soup.find('input', {'name': 'password', 'id': 'password', 'type': 'password'})
-            
-            if not username_field or not password_field:
-                self.log("No se encontraron campos de usuario/contraseña")
+            # 2-4. Formulario, campos obligatorios y ocultos, y acción
+            try:
+                action, form_data = login_form_data(response.text, self.host, self.username, self.password)
+            except LookupError as e:
+                self.log(str(e))
                 return False
             
-            # Agregar campos obligatorios
-            form_data['username'] = self.username
-            form_data['password'] = self.password
-            
-            # Buscar campos ocultos
-            hidden_inputs = login_form.find_all('input', {'type': 'hidden'})
-            for hidden in hidden_inputs:
-                if hidden.get('name') and hidden.get('value'):
-                    form_data[hidden['name']] = hidden['value']
-            
-            # 4. Enviar formulario
-            action = login_form.get('action')
-            if action:
-                if not action.startswith('http'):
-                    action = urljoin(self.host, action)
-            else:
-                action = login_url
-            
             self.log(f"Enviando login a: {action}")
             
             response = self.session.post(action, data=form_data)
@@ -109,22 +201,16 @@ class OJSUploader:
     
     def extract_csrf_token(self, html_content):
         """Extraer token CSRF del HTML"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Buscar token en meta tags
-        meta_token = soup.find('meta', {'name': 'csrf-token'})
-        if meta_token and meta_token.get('content'):
-            self.csrf_token = meta_token['content']
+        token, origin = find_csrf_token(html_content)
+        if origin == 'meta':
+            self.csrf_token = token
             self.session.headers['X-CSRF-Token'] = self.csrf_token
             self.log(f"Token CSRF encontrado: {self.csrf_token[:20]}...")
-        
-        # Buscar token en input hidden
-        if not self.csrf_token:
-            csrf_input = soup.find('input', {'name': 'csrfToken'})
-            if csrf_input and csrf_input.get('value'):
-                self.csrf_token = csrf_input['value']
-                self.log(f"Token CSRF (input): {self.csrf_token[:20]}...")
+        elif origin == 'input' and not self.csrf_token:
+            self.csrf_token = token
+            self.log(f"Token CSRF (input): {self.csrf_token[:20]}...")
     
+    @timed_stage('discover')
     def navigate_to_submissions(self):
         """Navegar a la sección de envíos"""
         try:
@@ -135,24 +221,39 @@ class OJSUploader:
             response.raise_for_status()
             
             # Extraer submission IDs de la página
-            soup = BeautifulSoup(response.text, 'html.parser')
-            submission_elements = soup.find_all('div', class_=re.compile(r'.*submission.*id.*', re.I))
-            
-            submission_ids = []
-            for elem in submission_elements:
-                text = elem.get_text(strip=True)
-                if text.isdigit():
-                    submission_ids.append(text)
-            
+            submission_ids = parse_submission_ids(response.text)
             self.log(f"Encontrados {len(submission_ids)} envíos")
             return submission_ids
             
         except Exception as e:
             self.log(f"❌ Error navegando a envíos: {str(e)}")
+            metrics.STAGE_ERRORS.inc(stage='discover', host=self.metrics_host)
             return []
     
     def upload_to_submission(self, submission_id, file_path, file_name=None):
         """Subir archivo a un envío específico basado en la estructura HTML"""
+        try:
+            if not file_name:
+                file_name = os.path.basename(file_path)
+            
+            with open(file_path, 'rb') as f:
+                return self.upload_stream(submission_id, f, os.path.getsize(file_path), file_name)
+                
+        except Exception as e:
+            self.log(f"❌ Error subiendo archivo: {str(e)}")
+            metrics.STAGE_ERRORS.inc(stage='upload', host=self.metrics_host)
+            return False
+    
+    @timed_stage('upload')
+    def upload_stream(self, submission_id, source, size, file_name):
+        """Subir `size` bytes leídos de `source` (archivo o respuesta HTTP) sin cargarlos en memoria"""
+        started = time.monotonic()
+        ok = self._upload_stream(submission_id, source, size, file_name)
+        self.record('upload', file=file_name, size=size, ms=round((time.monotonic() - started) * 1000),
+                    status='uploaded' if ok else 'failed')
+        return ok
+    
+    def _upload_stream(self, submission_id, source, size, file_name):
         try:
             # URL para subir archivos
             upload_url = f"{self.host}/submission/wizard/2"
@@ -164,66 +265,40 @@ class OJSUploader:
             response = self.session.get(upload_url, params=params)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 2. Buscar formulario de subida
-            upload_form = soup.find('form', {'enctype': 'multipart/form-data'})
-            if not upload_form:
-                # Buscar botón "Añadir archivo"
-                add_file_btn = soup.find('button', class_='pkpButton', string=re.compile(r'Añadir archivo', re.I))
-                if add_file_btn:
-                    self.log("Botón 'Añadir archivo' encontrado")
-                else:
-                    self.log("No se encontró formulario de subida")
-                    return False
-            
-            # 3. Leer archivo
-            if not file_name:
-                file_name = os.path.basename(file_path)
-            
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-            
-            # 4. Preparar datos del formulario
-            files = {
-                'submissionFile': (file_name, file_content, self.guess_mime_type(file_name))
-            }
-            
-            # 5. Enviar archivo
-            self.log(f"Subiendo {file_name} ({len(file_content):,} bytes)")
+            # 2. Buscar formulario de subida (o botón "Añadir archivo")
+            try:
+                upload_action, via_button = find_upload_action(response.text, self.host, upload_url)
+            except LookupError as e:
+                self.log(str(e))
+                return False
+            if via_button:
+                self.log("Botón 'Añadir archivo' encontrado")
             
-            # Intentar encontrar la URL de subida
-            upload_action = None
-            if upload_form and upload_form.get('action'):
-                upload_action = upload_form['action']
-                if not upload_action.startswith('http'):
-                    upload_action = urljoin(self.host, upload_action)
+            # 3. Preparar cuerpo multipart en streaming
+            body = MultipartStream({'submissionId': submission_id}, 'submissionFile', file_name,
+                                   source, size, self.guess_mime_type(file_name))
+            body.on_read = lambda n: self._on_upload_read(body, n, size)
             
-            if not upload_action:
-                upload_action = upload_url
+            # 4. Enviar archivo
+            self.log(f"Subiendo {file_name} ({size:,} bytes)")
+            upload_started = time.monotonic()
             
             response = self.session.post(
                 upload_action,
                 params=params,
-                files=files,
-                data={'submissionId': submission_id}
+                data=body,
+                headers={'Content-Type': body.content_type}
             )
             
             response.raise_for_status()
             
-            # 6. Verificar subida exitosa
+            # 5. Verificar subida exitosa
             if response.status_code == 200:
                 self.log(f"✅ Archivo subido exitosamente: {file_name}")
+                metrics.record_transfer('upload', self.metrics_host, size,
+                                        time.monotonic() - upload_started)
                 
-                # Guardar enlace (URL relativa del archivo)
-                file_url = f"{self.host}/submission/{submission_id}#files"
-                self.uploaded_urls.append({
-                    'file': file_name,
-                    'url': file_url,
-                    'submission_id': submission_id,
-                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-                })
-                
+                self._uploaded(submission_id, file_name)
                 return True
             else:
                 self.log(f"❌ Error en subida: HTTP {response.status_code}")
@@ -233,30 +308,62 @@ class OJSUploader:
             self.log(f"❌ Error subiendo archivo: {str(e)}")
             return False
     
+    @timed_stage('download')
     def download_from_url(self, url, save_path):
-        """Descargar archivo desde URL"""
-        try:
-            self.log(f"Descargando: {url}")
-            
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            file_size = os.path.getsize(save_path)
-            self.log(f"✅ Descargado: {os.path.basename(save_path)} ({file_size:,} bytes)")
-            return True
-            
-        except Exception as e:
-            self.log(f"❌ Error descargando {url}: {str(e)}")
-            return False
+        """Descargar archivo desde URL (reintenta errores de conexión)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.log(f"Descargando: {url}")
+                started = time.monotonic()
+                
+                response = requests.get(url, stream=True, timeout=30)
+                response.raise_for_status()
+                
+                received = 0
+                sha256 = hashlib.sha256()
+                with open(save_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            received += len(chunk)
+                            self.report_progress(bytes_done=self.bytes_downloaded + received)
+                            if self.bandwidth is not None:
+                                self.bandwidth.throttle('download', len(chunk), url)
+                self.bytes_downloaded += received
+                
+                file_size = os.path.getsize(save_path)
+                elapsed = time.monotonic() - started
+                metrics.record_transfer('download', self.metrics_host, file_size, elapsed)
+                self.record('file', name=os.path.basename(save_path), source=url, size=file_size,
+                            sha256=sha256.hexdigest(), ms=round(elapsed * 1000), status='downloaded')
+                self.log(f"✅ Descargado: {os.path.basename(save_path)} ({file_size:,} bytes)")
+                return True
+                
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt < self.max_retries:
+                    metrics.record_retry('download', self.metrics_host)
+                    self.log(f"⚠️ Reintentando descarga ({attempt + 1}/{self.max_retries}): {url}")
+                    time.sleep(2 ** attempt)
+                    continue
+                self.log(f"❌ Error descargando {url}: {str(e)}")
+                self.record('file', name=os.path.basename(save_path), source=url, status='failed', error=str(e))
+                return False
+                
+            except Exception as e:
+                self.log(f"❌ Error descargando {url}: {str(e)}")
+                self.record('file', name=os.path.basename(save_path), source=url, status='failed', error=str(e))
+                return False
+        
+        return False
     
+    @timed_stage('zip')
     def create_zip_chunk(self, files, chunk_name, max_size_mb=10):
         """Crear archivo ZIP con tamaño máximo"""
+        import zipfile
+        
         max_size = max_size_mb * 1024 * 1024
+        started = time.monotonic()
         
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -272,101 +379,188 @@ class OJSUploader:
                 total_size += file_size
         
         if zip_buffer.tell() > 0:
-            zip_path = f"temp/{chunk_name}.zip"
+            zip_path = os.path.join(self.work_dir, f"{chunk_name}.zip")
             with open(zip_path, 'wb') as f:
                 f.write(zip_buffer.getvalue())
             
+            elapsed = time.monotonic() - started
+            metrics.record_transfer('zip', self.metrics_host, zip_buffer.tell(), elapsed)
+            self.record('chunk', name=f"{chunk_name}.zip", size=zip_buffer.tell(),
+                        sha256=hashlib.sha256(zip_buffer.getbuffer()).hexdigest(),
+                        members=[os.path.basename(path) for path in files[:len(zipf.namelist())]],
+                        ms=round(elapsed * 1000))
             self.log(f"📦 ZIP creado: {chunk_name}.zip ({zip_buffer.tell():,} bytes)")
             return zip_path
         
         return None
     
-    def upload_from_links(self, links, submission_id=None):
-        """Descargar y subir archivos desde enlaces directos"""
+    @timed_stage('job')
+    def upload_from_links(self, links, submission_id=None, profile=False):
+        """Descargar y subir archivos desde enlaces directos
+        
+        Con profile=True se perfila CPU y memoria del proceso y los artefactos
+        se guardan en reports/ junto al reporte TXT.
+        """
+        return self._run_profiled(profile, self._upload_from_links, links, submission_id)
+    
+    @timed_stage('job')
+    def upload_telegram_files(self, client, files, submission_id=None, profile=False):
+        """Subir archivos enviados al bot de Telegram (ver telegram_files)
+        
+        Cada archivo se descarga en streaming y se reenvía directamente al
+        formulario de OJS, sin pasar por el directorio de trabajo.
+        """
+        return self._run_profiled(profile, self._upload_telegram_files, client, files, submission_id)
+    
+    def _run_profiled(self, profile, func, *args):
+        """Ejecutar un flujo completo, perfilado si se pide"""
+        if not profile:
+            return func(*args)
+        
+        profiler = JobProfiler()
+        with profiler:
+            result = func(*args)
+        self.save_profile(profiler)
+        return result
+    
+    def _resolve_submission(self, submission_id):
+        """Login si hace falta y envío destino (el indicado o el primero encontrado)"""
+        if not self.csrf_token:
+            self.report_progress('login')
+            if not self.login():
+                return None
+        
+        if submission_id:
+            self.submission_id = submission_id
+            return submission_id
+        
+        self.report_progress('discover')
+        submission_ids = self.navigate_to_submissions()
+        if submission_ids:
+            self.log(f"Usando envío ID: {submission_ids[0]}")
+            self.submission_id = submission_ids[0]
+            return submission_ids[0]
+        
+        self.log("❌ No se encontraron envíos")
+        return None
+    
+    def _upload_telegram_files(self, client, files, submission_id=None):
+        """Flujo para archivos de Telegram: login, descubrimiento y subida en streaming"""
         try:
-            # 1. Login si es necesario
-            if not self.csrf_token:
-                if not self.login():
-                    return False
+            submission_id = self._resolve_submission(submission_id)
+            if not submission_id:
+                return False
+            
+            successful_uploads = 0
+            self.report_progress('upload', done=0, total=len(files))
+            for index, item in enumerate(files, 1):
+                self.check_cancelled()
+                info = client.get_file(item['file_id'])
+                size = info.get('file_size') or item.get('file_size')
+                response = client.open(info['file_path'])
+                try:
+                    size = int(response.headers.get('Content-Length') or size or 0)
+                    if size <= 0:
+                        # El multipart necesita el tamaño exacto: sin él se subiría un archivo vacío
+                        self.log(f"❌ Tamaño desconocido para {item['file_name']}, no se sube")
+                        source, ok = None, False
+                    else:
+                        source = HashingReader(response.raw)
+                        ok = self.upload_stream(submission_id, source, size, item['file_name'])
+                    self.record('file', name=item['file_name'], source=f"telegram:{item['file_id']}", size=size,
+                                sha256=source.hexdigest() if source and source.bytes_read == size else None,
+                                status='uploaded' if ok else 'failed')
+                    if ok:
+                        successful_uploads += 1
+                finally:
+                    response.close()
+                self.report_progress(done=index)
+            
+            if successful_uploads > 0:
+                self.generate_report(submission_id)
+            
+            self.log(f"✅ Proceso completado: {successful_uploads}/{len(files)} archivos subidos")
+            return successful_uploads > 0
             
-            # 2. Usar submission_id proporcionado o buscar
+        except UploadCancelled:
+            # Lease perdido: JobManager lo registra como cancelado, no como fallo
+            raise
+        except Exception as e:
+            self.log(f"❌ Error en proceso completo: {str(e)}")
+            return False
+    
+    def _upload_from_links(self, links, submission_id=None):
+        """Flujo completo: login, descubrimiento, descarga, ZIP y subida"""
+        try:
+            # 1-2. Login si es necesario y envío proporcionado o buscado
+            submission_id = self._resolve_submission(submission_id)
             if not submission_id:
-                submission_ids = self.navigate_to_submissions()
-                if submission_ids:
-                    submission_id = submission_ids[0]
-                    self.log(f"Usando envío ID: {submission_id}")
-                else:
-                    self.log("❌ No se encontraron envíos")
-                    return False
+                return False
             
-            # 3. Descargar archivos
-            downloaded_files = []
-            temp_dir = "temp/downloads"
+            # 3-5. Descargar y agrupar en chunks ZIP de máximo 10MB a medida que llegan
+            # (cada chunk lleno se comprime, se sube y se borra: en disco solo queda el chunk en curso)
+            temp_dir = os.path.join(self.work_dir, "downloads")
             os.makedirs(temp_dir, exist_ok=True)
             
+            downloaded = 0
+            chunks = 0
+            successful_uploads = 0
+            current_chunk = []
+            current_size = 0
+            
             for i, url in enumerate(links, 1):
+                self.check_cancelled()
+                self.report_progress('download', done=i - 1, total=len(links), bytes_done=self.bytes_downloaded)
                 if not url.strip():
                     continue
                 
                 file_name = f"file_{i}{self.get_file_extension(url)}"
                 file_path = os.path.join(temp_dir, file_name)
                 
-                if self.download_from_url(url, file_path):
-                    downloaded_files.append(file_path)
-            
-            if not downloaded_files:
-                self.log("❌ No se descargaron archivos")
-                return False
-            
-            self.log(f"✅ Descargados {len(downloaded_files)} archivos")
-            
-            # 4. Crear chunks ZIP de máximo 10MB
-            zip_chunks = []
-            current_chunk = []
-            current_size = 0
-            
-            for file_path in downloaded_files:
+                if not self.download_from_url(url, file_path):
+                    continue
+                downloaded += 1
                 file_size = os.path.getsize(file_path)
                 
-                if file_size > 10 * 1024 * 1024:
+                if file_size > MAX_CHUNK_SIZE:
                     # Archivo individual grande
                     self.log(f"⚠️ Archivo grande ({file_size:,} bytes), se subirá individualmente")
-                    zip_chunks.append([file_path])
-                    continue
-                
-                if current_size + file_size > 10 * 1024 * 1024 and current_chunk:
-                    # Crear chunk
-                    chunk_name = f"chunk_{len(zip_chunks)+1}"
-                    zip_path = self.create_zip_chunk(current_chunk, chunk_name)
-                    if zip_path:
-                        zip_chunks.append([zip_path])
+                    self.record('chunk', name=file_name, size=file_size, members=[file_name], zipped=False)
+                    chunks += 1
+                    successful_uploads += self._upload_chunk(submission_id, [file_path], chunks)
+                elif current_size + file_size > MAX_CHUNK_SIZE and current_chunk:
+                    chunks += 1
+                    zip_paths = self._close_chunk(current_chunk, chunks)
+                    successful_uploads += self._upload_chunk(submission_id, zip_paths, chunks)
                     current_chunk = [file_path]
                     current_size = file_size
                 else:
                     current_chunk.append(file_path)
                     current_size += file_size
             
+            if not downloaded:
+                self.log("❌ No se descargaron archivos")
+                return False
+            
+            self.log(f"✅ Descargados {downloaded} archivos")
+            
             # Último chunk
             if current_chunk:
-                chunk_name = f"chunk_{len(zip_chunks)+1}"
-                zip_path = self.create_zip_chunk(current_chunk, chunk_name)
-                if zip_path:
-                    zip_chunks.append([zip_path])
-            
-            # 5. Subir archivos
-            successful_uploads = 0
-            for chunk in zip_chunks:
-                for file_path in chunk:
-                    if self.upload_to_submission(submission_id, file_path):
-                        successful_uploads += 1
+                self.report_progress('zip', bytes_done=self.bytes_downloaded)
+                chunks += 1
+                zip_paths = self._close_chunk(current_chunk, chunks)
+                successful_uploads += self._upload_chunk(submission_id, zip_paths, chunks)
             
             # 6. Generar reporte
             if successful_uploads > 0:
                 self.generate_report(submission_id)
             
-            self.log(f"✅ Proceso completado: {successful_uploads}/{len(zip_chunks)} archivos subidos")
+            self.log(f"✅ Proceso completado: {successful_uploads}/{chunks} archivos subidos")
             return successful_uploads > 0
             
+        except UploadCancelled:
+            # Lease perdido: JobManager lo registra como cancelado, no como fallo
+            raise
         except Exception as e:
             self.log(f"❌ Error en proceso completo: {str(e)}")
             return False
@@ -374,6 +568,72 @@ class OJSUploader:
             # Limpieza
             self.cleanup_temp_files()
     
+    def _close_chunk(self, files, number):
+        """Comprimir un chunk completo y borrar los archivos ya incluidos; devuelve [zip] o []"""
+        zip_path = self.create_zip_chunk(files, f"chunk_{number}")
+        if not zip_path:
+            return []
+        for file_path in files:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return [zip_path]
+    
+    def _upload_chunk(self, submission_id, paths, number):
+        """Subir un chunk recién cerrado y borrarlo; devuelve los archivos subidos"""
+        uploaded = 0
+        self.report_progress('upload', detail=f"📦 Chunk {number}")
+        for file_path in paths:
+            self.check_cancelled()
+            if self.upload_to_submission(submission_id, file_path):
+                uploaded += 1
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return uploaded
+    
+    def _uploaded(self, submission_id, file_name):
+        """Guardar enlace (URL relativa del archivo) para el reporte"""
+        file_url = f"{self.host}/submission/{submission_id}#files"
+        self.uploaded_urls.append({
+            'file': file_name,
+            'url': file_url,
+            'submission_id': submission_id,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+        })
+    
+    def _on_upload_read(self, body, amount, size):
+        """Bloque del cuerpo multipart leído: progreso y control de ancho de banda"""
+        if self.progress is not None:
+            self.report_progress(bytes_done=body.bytes_read, bytes_total=size)
+        if self.bandwidth is not None:
+            self.bandwidth.throttle('upload', amount, self.host)
+    
+    def check_cancelled(self):
+        """Lanzar UploadCancelled si el trabajo se canceló (entre archivos y chunks)"""
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise UploadCancelled("Trabajo cancelado: otra instancia lo retoma")
+    
+    def record(self, record_type, **fields):
+        """Añadir un registro al manifiesto del trabajo, si hay"""
+        if self.manifest is None:
+            return
+        try:
+            self.manifest.write(record_type, **fields)
+        except Exception as e:
+            logger.warning(f"⚠️ Error escribiendo manifiesto: {str(e)}")
+    
+    def report_progress(self, stage=None, **fields):
+        """Publicar el estado de la etapa en el reporter de progreso, si hay"""
+        if self.progress is None:
+            return
+        try:
+            self.progress.update(stage, **fields)
+        except Exception as e:
+            logger.warning(f"⚠️ Error publicando progreso: {str(e)}")
+    
     def get_file_extension(self, url):
         """Obtener extensión de archivo desde URL"""
         # Extraer nombre de archivo
@@ -407,9 +667,19 @@ class OJSUploader:
     
     def guess_mime_type(self, filename):
         """Adivinar tipo MIME"""
+        import mimetypes
+        
         mime_type, _ = mimetypes.guess_type(filename)
         return mime_type or 'application/octet-stream'
     
+    def run_tag(self):
+        """Sufijo de los archivos de esta ejecución (el directorio de trabajo, p. ej. job_<id>)
+
+        Dos trabajos que terminan en el mismo segundo no comparten work_dir,
+        así que sus reportes no se pisan.
+        """
+        return os.path.basename(os.path.normpath(self.work_dir)) or "run"
+    
     def generate_report(self, submission_id):
         """Generar archivo de reporte TXT"""
         try:
@@ -417,7 +687,7 @@ class OJSUploader:
             os.makedirs(report_dir, exist_ok=True)
             
             timestamp = time.strftime("%Y%m%d_%H%M%S")
-            report_file = f"{report_dir}/upload_report_{timestamp}.txt"
+            report_file = f"{report_dir}/upload_report_{timestamp}_{self.run_tag()}.txt"
             
             with open(report_file, 'w', encoding='utf-8') as f:
                 f.write("=" * 60 + "\n")
@@ -443,6 +713,7 @@ class OJSUploader:
                 f.write("FIN DEL REPORTE\n")
                 f.write("=" * 60 + "\n")
             
+            self.report_file = report_file
             self.log(f"📄 Reporte generado: {report_file}")
             return report_file
             
@@ -450,13 +721,45 @@ class OJSUploader:
             self.log(f"⚠️ Error generando reporte: {str(e)}")
             return None
     
+    def save_profile(self, profiler):
+        """Guardar artefactos de perfilado junto al reporte y referenciarlos en él"""
+        try:
+            report_dir = "reports"
+            os.makedirs(report_dir, exist_ok=True)
+            
+            # Mismo nombre base que el reporte TXT (o uno propio si no hubo reporte)
+            if self.report_file:
+                prefix = self.report_file[:-len('.txt')] + "_profile"
+            else:
+                prefix = f"{report_dir}/upload_profile_{time.strftime('%Y%m%d_%H%M%S')}_{self.run_tag()}"
+            
+            self.profile_summary = profiler.save(prefix)
+            
+            if self.report_file:
+                with open(self.report_file, 'a', encoding='utf-8') as f:
+                    f.write("\nPERFIL DEL PROCESO:\n")
+                    f.write("-" * 60 + "\n")
+                    f.write(f"Duración: {self.profile_summary['elapsed']} s\n")
+                    f.write(f"Pico de memoria: {self.profile_summary['peak_memory']:,} bytes\n")
+                    for kind, path in self.profile_summary['artifacts'].items():
+                        f.write(f"Artefacto {kind}: {path}\n")
+            
+            self.log(f"🔬 Perfil guardado: {prefix}_summary.txt")
+            return self.profile_summary
+            
+        except Exception as e:
+            self.log(f"⚠️ Error guardando perfil: {str(e)}")
+            return None
+    
     def cleanup_temp_files(self):
         """Limpiar archivos temporales"""
         try:
             import shutil
-            if os.path.exists('temp'):
-                shutil.rmtree('temp')
-            os.makedirs('temp', exist_ok=True)
+            if os.path.exists(self.work_dir):
+                shutil.rmtree(self.work_dir)
+            # El directorio compartido por defecto se conserva; los de trabajo se eliminan
+            if self.work_dir == "temp":
+                os.makedirs(self.work_dir, exist_ok=True)
             self.log("🧹 Archivos temporales limpiados")
         except Exception as e:
             self.log(f"⚠️ Error limpiando archivos temporales: {str(e)}")
@@ -468,6 +771,11 @@ class OJSUploader:
         self.logs.append(log_message)
         logger.info(log_message)
         print(log_message)
+        if self.on_log is not None:
+            try:
+                self.on_log(log_message)
+            except Exception as e:
+                logger.warning(f"⚠️ Error publicando log: {str(e)}")
     
     def get_logs(self):
         """Obtener todos los logs"""
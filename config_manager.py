@@ -4,22 +4,261 @@ Autor: Bot OJS Uploader
 """
 
 import json
+import logging
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 import uuid
 
-class ConfigManager:
+try:
+    import fcntl
+except ImportError:  # Windows: sin locks consultivos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Clave con el contador de versión que se incrementa en cada escritura
+VERSION_KEY = '_version'
+
+
+class FrozenDict(dict):
+    """Diccionario de solo lectura para instantáneas de configuración cacheadas"""
+    
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Configuración de solo lectura: usar thaw() para obtener una copia editable")
+    
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+    
+    def __copy__(self):
+        return dict(self)
+    
+    def __deepcopy__(self, memo):
+        return thaw(self)
+    
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Convertir datos JSON en una instantánea inmutable (dict -> FrozenDict, list -> tuple)"""
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Copia editable de una instantánea (FrozenDict -> dict, tuple -> list)"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+class JsonFileCache:
+    """Caché de lectura de archivos JSON invalidada por mtime/tamaño/inodo
+    
+    Cada lectura hace un os.stat(); el archivo solo se vuelve a abrir y
+    parsear cuando cambió en disco. Las escrituras propias actualizan la
+    caché directamente (write-through).
+    """
+    
     def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _signature(filepath):
+        stat = os.stat(filepath)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def load(self, filepath):
+        """Instantánea inmutable del archivo (FrozenDict vacío si no existe o es inválido)"""
+        try:
+            signature = self._signature(filepath)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(filepath, None)
+            return FrozenDict()
+        
+        with self._lock:
+            entry = self._entries.get(filepath)
+        if entry and entry[0] == signature:
+            return entry[1]
+        
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                snapshot = freeze(json.load(f))
+        except FileNotFoundError:
+            return FrozenDict()
+        except json.JSONDecodeError:
+            # Conservar la última versión válida en lugar de "olvidar" la configuración
+            logger.warning(f"⚠️ JSON inválido en {filepath}, usando la última versión válida")
+            return entry[1] if entry else FrozenDict()
+        
+        with self._lock:
+            self._entries[filepath] = (signature, snapshot)
+        return snapshot
+    
+    def store(self, filepath, data):
+        """Registrar en caché los datos recién escritos"""
+        snapshot = freeze(data)
+        try:
+            signature = self._signature(filepath)
+        except FileNotFoundError:
+            return snapshot
+        with self._lock:
+            self._entries[filepath] = (signature, snapshot)
+        return snapshot
+    
+    def invalidate(self, filepath=None):
+        """Descartar una entrada (o toda la caché)"""
+        with self._lock:
+            if filepath is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(filepath, None)
+
+
+# Caché compartida por todo el proceso (ConfigManager y SimpleConfig)
+json_cache = JsonFileCache()
+
+
+@contextmanager
+def file_lock(filepath):
+    """Lock consultivo exclusivo sobre <archivo>.lock (entre hilos y procesos)"""
+    with open(f"{filepath}.lock", 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_temp_json(filepath, data):
+    """Escribir JSON completo (con fsync) en un temporal del mismo directorio"""
+    directory = os.path.dirname(filepath) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filepath)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+def atomic_write_json(filepath, data):
+    """Reemplazar el archivo de forma atómica: los lectores ven la versión vieja o la nueva"""
+    tmp_path = _write_temp_json(filepath, data)
+    try:
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    json_cache.store(filepath, data)
+
+
+def create_json_if_missing(filepath, data):
+    """Crear el archivo solo si no existe (seguro con varios workers arrancando a la vez)"""
+    tmp_path = _write_temp_json(filepath, data)
+    try:
+        os.link(tmp_path, filepath)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(tmp_path)
+
+
+def update_json(filepath, mutate):
+    """Read-modify-write bajo lock con escritura atómica e incremento de versión
+    
+    mutate recibe una copia editable de los datos y puede devolver un valor,
+    o False para cancelar la escritura. Si el archivo existe pero no es JSON
+    válido se lanza ValueError sin escribir: reemplazarlo por {} borraría
+    la configuración.
+    """
+    with file_lock(filepath):
+        json_cache.invalidate(filepath)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ JSON inválido en {filepath}, no se sobrescribe: {str(e)}")
+            raise ValueError(f"JSON inválido en {filepath}") from e
+        result = mutate(data)
+        if result is False:
+            return False
+        data[VERSION_KEY] = data.get(VERSION_KEY, 0) + 1
+        atomic_write_json(filepath, data)
+        return result
+
+
+class ConfigManager:
+    def __init__(self, lazy=False):
         self.config_dir = "config"
-        os.makedirs(self.config_dir, exist_ok=True)
         
         # Archivos de configuración
         self.admin_config_file = os.path.join(self.config_dir, "admin.json")
         self.telegram_config_file = os.path.join(self.config_dir, "telegram.json")  # ⭐ NUEVO
-        self.journals_config_file = os.path.join(self.config_dir, "journals.json")
+        self.journals_config_file = os.path.join(self.config_dir, "journals.json")  # Solo para migración
+        self.database_file = os.path.join(self.config_dir, "ojs_uploader.db")
+        
+        # Revistas, trabajos, reportes, updates de Telegram y métricas de los procesos en SQLite
+        from storage import Database, JournalStore, JobStore, MetricsStore, ReportStore, UpdateStore
+        self.db = Database(self.database_file)
+        self._journal_store = JournalStore(self.db)
+        self.job_store = JobStore(self.db)
+        self.report_store = ReportStore(self.db)
+        self.update_store = UpdateStore(self.db)
+        self.metrics_store = MetricsStore(self.db)
+        
+        # Estado volátil de Telegram (notificaciones, chat ids, contadores)
+        from state_log import StateLog
+        self._telegram_state = StateLog(os.path.join(self.config_dir, "telegram_state.log"))
+        self._telegram_view = (None, None, None)
         
-        # Inicializar configuraciones por defecto
-        self.init_default_configs()
+        # Con lazy=True el disco no se toca hasta initialize() (arranque en frío)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        if not lazy:
+            self.initialize()
+    
+    def initialize(self):
+        """Crear config/, archivos por defecto y migrar revistas (una vez por proceso)"""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(self.config_dir, exist_ok=True)
+            self.init_default_configs()
+            self._journal_store.migrate_from_json(self.journals_config_file)
+            self._initialized = True
+    
+    @property
+    def journal_store(self):
+        # Las revistas del antiguo journals.json se migran antes del primer acceso
+        self.initialize()
+        return self._journal_store
+    
+    @property
+    def telegram_state(self):
+        self.initialize()
+        return self._telegram_state
     
     def init_default_configs(self):
         """Inicializar configuraciones por defecto"""
@@ -32,7 +271,7 @@ class ConfigManager:
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
             }
-            self.save_json(self.admin_config_file, default_admin)
+            create_json_if_missing(self.admin_config_file, default_admin)
         
         # ============================================================
         # ⭐⭐ CONFIGURACIÓN DE TELEGRAM - AQUÍ PONES TUS DATOS ⭐⭐
@@ -77,13 +316,8 @@ class ConfigManager:
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
             }
-            self.save_json(self.telegram_config_file, default_telegram)
+            create_json_if_missing(self.telegram_config_file, default_telegram)
         # ============================================================
-        
-        # Configuración de revistas
-        if not os.path.exists(self.journals_config_file):
-            default_journals = {}
-            self.save_json(self.journals_config_file, default_journals)
     
     # ==================== MÉTODOS PARA ADMIN ====================
     def get_admin_config(self):
@@ -92,23 +326,47 @@ class ConfigManager:
     
     def update_admin_config(self, config):
         """Actualizar configuración de administrador"""
-        current = self.get_admin_config()
-        current.update(config)
-        current['updated_at'] = datetime.now().isoformat()
-        self.save_json(self.admin_config_file, current)
+        def mutate(current):
+            current.update(config)
+            current['updated_at'] = datetime.now().isoformat()
+        
+        self.initialize()
+        update_json(self.admin_config_file, mutate)
         return True
     
     # ==================== MÉTODOS PARA TELEGRAM ====================
     def get_telegram_config(self):
-        """Obtener configuración de Telegram"""
-        return self.load_json(self.telegram_config_file)
+        """Obtener configuración de Telegram (estática + estado de ejecución)"""
+        static = self.load_json(self.telegram_config_file)
+        state = self.telegram_state.snapshot()
+        
+        # Reutilizar la combinación mientras ninguna de las dos partes cambie
+        cached_static, cached_state, merged = self._telegram_view
+        if cached_static is static and cached_state is state:
+            return merged
+        
+        merged = FrozenDict({**static, **state})
+        self._telegram_view = (static, state, merged)
+        return merged
+    
+    def get_telegram_state(self):
+        """Obtener solo el estado de ejecución de Telegram"""
+        return self.telegram_state.snapshot()
     
     def update_telegram_config(self, config):
         """Actualizar configuración de Telegram"""
-        current = self.get_telegram_config()
-        current.update(config)
-        current['updated_at'] = datetime.now().isoformat()
-        self.save_json(self.telegram_config_file, current)
+        def mutate(current):
+            current.update(config)
+            current['updated_at'] = datetime.now().isoformat()
+        
+        self.initialize()
+        update_json(self.telegram_config_file, mutate)
+        
+        # Un cambio del admin debe prevalecer sobre el estado de ejecución
+        state = self.telegram_state.snapshot()
+        for key, value in config.items():
+            if key in state:
+                self.telegram_state.set(key, value)
         return True
     
     def is_telegram_configured(self):
@@ -148,22 +406,17 @@ class ConfigManager:
     
     def set_telegram_bot_info(self, bot_username, bot_name):
         """Actualizar información del bot de Telegram"""
-        config = self.get_telegram_config()
-        config['bot_username'] = bot_username
-        config['bot_name'] = bot_name
-        config['updated_at'] = datetime.now().isoformat()
-        self.save_json(self.telegram_config_file, config)
+        self.telegram_state.set('bot_username', bot_username)
+        self.telegram_state.set('bot_name', bot_name)
         return True
     
     def record_notification(self, message):
         """Registrar última notificación enviada"""
-        config = self.get_telegram_config()
-        config['last_notification'] = {
+        self.telegram_state.set('last_notification', {
             'message': message[:100] + '...' if len(message) > 100 else message,
             'timestamp': datetime.now().isoformat()
-        }
-        config['updated_at'] = datetime.now().isoformat()
-        self.save_json(self.telegram_config_file, config)
+        })
+        self.telegram_state.incr('notifications_sent')
     
     def get_telegram_commands(self):
         """Obtener lista de comandos de Telegram"""
@@ -172,86 +425,63 @@ class ConfigManager:
     
     def update_telegram_chat_id(self, chat_id):
         """Actualizar ID del chat de Telegram"""
-        config = self.get_telegram_config()
-        config['telegram_chat_id'] = chat_id
-        config['updated_at'] = datetime.now().isoformat()
-        self.save_json(self.telegram_config_file, config)
+        self.telegram_state.set('telegram_chat_id', chat_id)
         return True
     
     # ==================== MÉTODOS PARA REVISTAS ====================
     def get_all_journal_configs(self):
         """Obtener todas las configuraciones de revistas"""
-        journals = self.load_json(self.journals_config_file)
-        
-        # Convertir a lista para frontend
-        journal_list = []
-        for journal_id, config in journals.items():
-            config['id'] = journal_id
-            journal_list.append(config)
-        
-        return journal_list
+        return self.journal_store.list()
+    
+    def list_journal_configs(self, offset=0, limit=50):
+        """Obtener una página de configuraciones de revistas"""
+        return self.journal_store.list(offset=offset, limit=limit)
+    
+    def count_journal_configs(self):
+        """Contar revistas configuradas"""
+        return self.journal_store.count()
+    
+    def find_journal_configs_by_host(self, host):
+        """Obtener revistas configuradas para un host"""
+        return self.journal_store.find_by_host(host)
     
     def get_journal_config(self, journal_id):
         """Obtener configuración de una revista específica"""
-        journals = self.load_json(self.journals_config_file)
-        return journals.get(journal_id)
+        return self.journal_store.get(journal_id)
     
     def add_journal_config(self, config):
         """Agregar nueva configuración de revista"""
-        journals = self.load_json(self.journals_config_file)
-        
-        # Generar ID único
-        journal_id = str(uuid.uuid4())[:8]
-        
-        # Asegurar campos requeridos
-        config['id'] = journal_id
-        config['created_at'] = datetime.now().isoformat()
-        config['updated_at'] = datetime.now().isoformat()
-        
-        journals[journal_id] = config
-        self.save_json(self.journals_config_file, journals)
-        
-        return journal_id
+        config.pop('id', None)
+        return self.journal_store.add(config)
     
     def update_journal_config(self, journal_id, updates):
         """Actualizar configuración de revista"""
-        journals = self.load_json(self.journals_config_file)
-        
-        if journal_id not in journals:
-            return False
-        
-        journals[journal_id].update(updates)
-        journals[journal_id]['updated_at'] = datetime.now().isoformat()
-        
-        self.save_json(self.journals_config_file, journals)
-        return True
+        return self.journal_store.update(journal_id, updates)
     
     def delete_journal_config(self, journal_id):
         """Eliminar configuración de revista"""
-        journals = self.load_json(self.journals_config_file)
-        
-        if journal_id not in journals:
-            return False
-        
-        del journals[journal_id]
-        self.save_json(self.journals_config_file, journals)
-        return True
+        return self.journal_store.delete(journal_id)
     
     # ==================== MÉTODOS UTILITARIOS ====================
     def save_json(self, filepath, data):
-        """Guardar datos en archivo JSON"""
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        """Reemplazar el archivo JSON completo (atómico, bajo lock, con versión)"""
+        def replace(current):
+            version = current.get(VERSION_KEY, 0)
+            current.clear()
+            current.update(thaw(data))
+            current[VERSION_KEY] = version
+        
+        self.initialize()
+        update_json(filepath, replace)
+    
+    def get_version(self, filepath):
+        """Contador de versión del archivo (barato: usa la instantánea cacheada)"""
+        return self.load_json(filepath).get(VERSION_KEY, 0)
     
     def load_json(self, filepath):
-        """Cargar datos desde archivo JSON"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-        except json.JSONDecodeError:
-            return {}
+        """Cargar datos desde archivo JSON (instantánea inmutable cacheada)"""
+        self.initialize()
+        return json_cache.load(filepath)
     
     def get_all_configs(self):
         """Obtener todas las configuraciones"""
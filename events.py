@@ -0,0 +1,185 @@
+"""
+Eventos en vivo para el panel de administración (Server-Sent Events)
+
+Un único EventBroadcaster por proceso reparte cada evento (estado de
+trabajos, progreso, líneas de log) a todos los suscriptores. Cada
+suscriptor tiene un buffer acotado: si un cliente lento se queda atrás se
+descartan sus eventos más antiguos (y se le avisa) en lugar de acumular
+memoria o frenar a quien publica.
+
+Los últimos eventos se guardan con id creciente para que un EventSource
+que se reconecta con Last-Event-ID reciba lo que se perdió. El id lleva el
+pid delante (`<pid>-<n>`): con varios workers la reconexión puede llegar
+a otro proceso, cuyo historial no sirve, y entonces se empieza de cero.
+
+Las tareas periódicas (add_poller) corren en un solo hilo por proceso y
+solo mientras haya suscriptores, así que su coste no crece con los
+paneles abiertos.
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SSE_SUBSCRIBERS = metrics.REGISTRY.gauge(
+    'sse_subscribers',
+    'Conexiones SSE abiertas en este proceso'
+)
+SSE_EVENTS = metrics.REGISTRY.counter(
+    'sse_events_total',
+    'Eventos publicados por tipo',
+    ('event',)
+)
+SSE_DROPPED = metrics.REGISTRY.counter(
+    'sse_events_dropped_total',
+    'Eventos descartados por suscriptores lentos'
+)
+
+
+def format_sse(event):
+    """Texto SSE de un evento (id si lo tiene, event, data en una línea JSON)"""
+    data = json.dumps(event['data'], ensure_ascii=False, separators=(',', ':'))
+    text = f"id: {event['id']}\n" if event.get('id') is not None else ""
+    return text + f"event: {event['event']}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """Buffer acotado de un suscriptor"""
+
+    def __init__(self, buffer_size):
+        self.events = deque()
+        self.buffer_size = buffer_size
+        self.dropped = 0
+        self.resumed = False
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        with self._cond:
+            if len(self.events) >= self.buffer_size:
+                self.events.popleft()
+                self.dropped += 1
+                SSE_DROPPED.inc()
+            self.events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Eventos pendientes (lista vacía si vence el timeout)"""
+        with self._cond:
+            if not self.events:
+                self._cond.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+
+class EventBroadcaster:
+    """Fan-out de eventos a suscriptores con buffers acotados"""
+
+    def __init__(self, buffer_size=200, history=200):
+        self.buffer_size = buffer_size
+        self.history = deque(maxlen=history)
+        self._subscribers = set()
+        self._pollers = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._poll_cond = threading.Condition(self._lock)
+        self._poll_pid = None
+
+    def publish(self, event, data):
+        """Enviar un evento a todos los suscriptores (nunca bloquea)"""
+        with self._lock:
+            seq = next(self._ids)
+            item = {'id': f"{os.getpid()}-{seq}", 'seq': seq, 'event': event, 'data': data}
+            self.history.append(item)
+            subscribers = list(self._subscribers)
+        SSE_EVENTS.inc(event=event)
+        for subscription in subscribers:
+            subscription.push(item)
+        return item
+
+    @staticmethod
+    def _sequence(last_event_id):
+        """Número de un Last-Event-ID emitido por este proceso (None si es de otro o no es válido)"""
+        pid, _, seq = str(last_event_id or '').partition('-')
+        return int(seq) if pid == str(os.getpid()) and seq.isdigit() else None
+
+    def subscribe(self, last_event_id=None):
+        """Nuevo suscriptor; con last_event_id recibe primero lo que se perdió
+
+        subscription.resumed es False si no se pudo reanudar (id de otro
+        proceso o fuera del historial): el cliente necesita el estado completo.
+        """
+        subscription = Subscription(self.buffer_size)
+        seq = self._sequence(last_event_id)
+        with self._lock:
+            subscription.resumed = (seq is not None and bool(self.history)
+                                    and self.history[0]['seq'] <= seq + 1 and seq <= self.history[-1]['seq'])
+            if subscription.resumed:
+                for item in self.history:
+                    if item['seq'] > seq:
+                        subscription.push(item)
+            self._subscribers.add(subscription)
+            SSE_SUBSCRIBERS.set(len(self._subscribers))
+            self._ensure_poller()
+            self._poll_cond.notify_all()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            SSE_SUBSCRIBERS.set(len(self._subscribers))
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    # ==================== TAREAS PERIÓDICAS ====================
+    def add_poller(self, func, interval):
+        """Ejecutar func() cada `interval` segundos mientras haya suscriptores"""
+        with self._lock:
+            self._pollers.append([func, interval, 0.0])
+
+    def _ensure_poller(self):
+        """Hilo de tareas periódicas (uno por proceso, bajo self._lock)"""
+        if not self._pollers or self._poll_pid == os.getpid():
+            return
+        self._poll_pid = os.getpid()
+        threading.Thread(target=self._poll_loop, name="sse-poller", daemon=True).start()
+
+    def _poll_loop(self):
+        while True:
+            with self._lock:
+                while not self._subscribers:
+                    self._poll_cond.wait()
+                now = time.monotonic()
+                due = [poller for poller in self._pollers if poller[2] <= now]
+                for poller in due:
+                    poller[2] = now + poller[1]
+                wait = min(poller[2] for poller in self._pollers) - now
+            for func, _, _ in due:
+                try:
+                    func()
+                except Exception as e:
+                    logger.error(f"❌ Error en tarea de eventos: {str(e)}")
+            time.sleep(max(0.05, wait))
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """Broadcaster compartido del proceso"""
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = EventBroadcaster()
+        return _broadcaster
@@ -0,0 +1,710 @@
+"""
+Gestor de trabajos de subida en segundo plano
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit
+
+import metrics
+from bandwidth import get_shaper
+from events import get_broadcaster
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    'upload_job_queue_depth',
+    'Trabajos de subida en cola (base compartida, todas las instancias)'
+)
+JOBS_REJECTED = metrics.REGISTRY.counter(
+    'upload_jobs_rejected_total',
+    'Trabajos rechazados por cola llena'
+)
+
+
+class QueueFullError(Exception):
+    """La cola de trabajos alcanzó max_queue_depth"""
+
+    def __init__(self, depth, retry_after):
+        super().__init__(f"Cola de subidas llena ({depth} trabajos en espera)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+def normalize_link(url):
+    """Forma canónica de un enlace para comparar: sin espacios ni fragmento, esquema y host en minúsculas"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+def default_idempotency_key(journal_id, submission_id, links):
+    """Clave derivada de la petición: revista + envío + enlaces normalizados (sin orden)"""
+    payload = json.dumps([journal_id, str(submission_id or ''), sorted({normalize_link(link) for link in links})])
+    return 'auto:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class UploadJob:
+    """Trabajo de subida: enlaces (o archivos de Telegram) hacia un envío de una revista"""
+
+    def __init__(self, journal_id, submission_id, links, profile=None, chat_id=None, files=None,
+                 owner=None):
+        self.id = str(uuid.uuid4())[:12]
+        self.journal_id = journal_id
+        self.submission_id = submission_id
+        self.links = links
+        self.files = files or []
+        self.idempotency_key = None
+        self.owner = owner
+        self.profile = profile
+        self.chat_id = chat_id
+        self.status = 'queued'
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.report_file = None
+        self.manifest = None
+        self.profile_summary = None
+        self.error = None
+        self.logs = []
+        self.attempt = 1
+        # Se activa si la instancia pierde el lease: el uploader se detiene (OJSUploader.check_cancelled)
+        self.cancelled = threading.Event()
+
+    def spec(self):
+        """Datos necesarios para ejecutar el trabajo en otra instancia"""
+        return {
+            'links': self.links,
+            'files': self.files,
+            'profile': self.profile,
+            'chat_id': self.chat_id,
+        }
+
+    @classmethod
+    def from_record(cls, data, spec):
+        """Reconstruir un trabajo encolado por otra instancia"""
+        job = cls(data['journal_id'], data.get('submission_id'), list(spec.get('links') or []),
+                  spec.get('profile'), spec.get('chat_id'), [dict(item) for item in spec.get('files') or []],
+                  data.get('owner'))
+        job.id = data['job_id']
+        job.idempotency_key = data.get('idempotency_key')
+        job.created_at = data['created_at']
+        return job
+
+    def to_dict(self):
+        """Representación para la API"""
+        return {
+            'job_id': self.id,
+            'journal_id': self.journal_id,
+            'submission_id': self.submission_id,
+            'links': len(self.links),
+            'files': [item['file_name'] for item in self.files],
+            'profile': bool(self.profile),
+            'chat_id': self.chat_id,
+            'idempotency_key': self.idempotency_key,
+            'owner': self.owner,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'report_file': self.report_file,
+            'manifest': self.manifest,
+            'profile_summary': self.profile_summary,
+            'error': self.error,
+            'logs': self.logs[-20:]
+        }
+
+
+class _JobProgress:
+    """Progreso de un trabajo: reporter de Telegram (si hay) y eventos del panel
+
+    Los eventos de progreso se limitan a uno cada `interval` segundos por
+    trabajo (siempre se publica un cambio de etapa).
+    """
+
+    def __init__(self, job_id, events, reporter=None, interval=0.5):
+        self.job_id = job_id
+        self.events = events
+        self.reporter = reporter
+        self.interval = interval
+        self.stage = None
+        self._last = 0.0
+
+    def update(self, stage=None, **fields):
+        if self.reporter is not None:
+            self.reporter.update(stage, **fields)
+        now = time.monotonic()
+        if (stage is None or stage == self.stage) and now - self._last < self.interval:
+            return
+        self.stage = stage or self.stage
+        self._last = now
+        self.events.publish('progress', {'job_id': self.job_id, 'stage': self.stage, **fields})
+
+    def finish(self, ok=True, detail=None):
+        if self.reporter is not None:
+            self.reporter.finish(ok, detail)
+
+
+class JobManager:
+    """Ejecuta trabajos de subida con un pool de workers sobre la cola compartida
+
+    Los trabajos se guardan en la base (JobStore) y cada worker reclama el
+    siguiente según JobScheduler (reparto justo por dueño, más corto primero,
+    límite por host). Varias instancias pueden compartir la base: cada
+    trabajo reclamado tiene un lease que se renueva con un heartbeat y, si la
+    instancia cae, otra lo retoma cuando vence. Cada trabajo usa su propio
+    directorio bajo temp/.
+
+    Con engine='async' no hay un hilo por trabajo: un único hilo reclama
+    hasta `async_jobs` trabajos a la vez y los ejecuta en el event loop de
+    AsyncUploadEngine (async_uploader).
+    """
+
+    def __init__(self, config_manager, max_workers=2, idempotency_ttl=24 * 3600, per_host_limit=2,
+                 lease_seconds=60, poll_interval=2.0, max_queue_depth=200, queue_retry_after=30,
+                 events=None, bandwidth=None, engine='sync', async_jobs=100, scheduler_weights=None):
+        from scheduler import JobScheduler
+
+        if engine not in ('sync', 'async'):
+            raise ValueError(f"Motor de subidas no válido: {engine}")
+
+        self.config_manager = config_manager
+        self.max_workers = max_workers
+        self.engine = engine
+        self.async_jobs = async_jobs
+        self.idempotency_ttl = idempotency_ttl
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_queue_depth = max_queue_depth
+        self.queue_retry_after = queue_retry_after
+        self.scheduler = JobScheduler(per_host_limit=per_host_limit, weights=scheduler_weights)
+        self.events = events or get_broadcaster()
+        self.bandwidth = bandwidth or get_shaper()
+        # Límites de ancho de banda compartidos entre procesos (tabla meta)
+        self.bandwidth.use_store(config_manager.db)
+        self._published = {}        # Último estado publicado por trabajo
+        self._rotated_at = None     # Última rotación de reportes (monotonic)
+        self.instance_id = None
+        self.jobs = {}              # Trabajos en curso en esta instancia
+        self._active = set()        # Trabajos con lease de esta instancia
+        self._workers = []
+        self._engine = None         # AsyncUploadEngine con engine='async'
+        self._pid = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._submit_lock = threading.Lock()  # Serializa la comprobación de claves entre hilos
+
+    @property
+    def job_store(self):
+        return self.config_manager.job_store
+
+    def _ensure_workers(self):
+        """Arrancar workers y heartbeat en el primer uso (por proceso)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+            self._active = set()
+            self._workers = []
+            if self.engine == 'async':
+                from async_uploader import AsyncUploadEngine
+                self._engine = AsyncUploadEngine().start()
+                targets = [("upload-async-dispatch", self._async_dispatcher)]
+                description = f"motor asyncio, hasta {self.async_jobs} trabajos"
+            else:
+                targets = [(f"upload-job-{i}", self._worker) for i in range(self.max_workers)]
+                description = f"{self.max_workers} workers de subida"
+            for name, target in targets:
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._workers.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="upload-heartbeat", daemon=True)
+            thread.start()
+        logger.info(f"🧵 Instancia {self.instance_id}: {description}")
+
+    def start(self):
+        """Empezar a reclamar trabajos de la cola compartida sin esperar a un submit"""
+        self._ensure_workers()
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def stop(self, timeout=None):
+        """Dejar de reclamar y esperar a los trabajos en curso; False si vence el timeout
+
+        Lo que no termine a tiempo lo retomará otra instancia al vencer el lease.
+        """
+        self._stopping.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._wakeup:
+            self._wakeup.notify_all()
+            while self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+        if self._engine is not None:
+            self._engine.stop()
+        return True
+
+    def _claim(self):
+        """Reclamar el siguiente trabajo de la cola compartida (None si no hay)"""
+        try:
+            return self.job_store.claim(self.instance_id, self.lease_seconds, self.scheduler.choose)
+        except Exception as e:
+            logger.error(f"❌ Error reclamando trabajo: {str(e)}")
+            return None
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            record = self._claim()
+            if record is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            job = self._job_from_record(record)
+            with self._lock:
+                self._active.add(job.id)
+            try:
+                self._run(job, self._journal_for(job, record))
+            except Exception as e:
+                self._fail(job, e)
+            finally:
+                self._release(job.id)
+
+    def _async_dispatcher(self):
+        """Reclamar trabajos para el motor asyncio mientras haya hueco (async_jobs en curso)"""
+        while not self._stopping.is_set():
+            with self._wakeup:
+                if len(self._active) >= self.async_jobs:
+                    self._wakeup.wait(self.poll_interval)
+                    continue
+
+            record = self._claim()
+            if record is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            job = self._job_from_record(record)
+            with self._lock:
+                self._active.add(job.id)
+            future = self._engine.submit(self._execute_async(job, record))
+            future.add_done_callback(lambda _, job_id=job.id: self._release(job_id))
+
+    async def _execute_async(self, job, record):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            journal = await loop.run_in_executor(None, self._journal_for, job, record)
+            await self._run_async(job, journal)
+        except Exception as e:
+            await loop.run_in_executor(None, self._fail, job, e)
+
+    def _journal_for(self, job, record):
+        """Configuración de la revista del trabajo reclamado"""
+        journal = self.config_manager.get_journal_config(job.journal_id)
+        if not journal:
+            raise ValueError(f"Revista no encontrada: {job.journal_id}")
+        if record['attempts'] > 1:
+            logger.warning(f"♻️ Retomando trabajo {job.id} (intento {record['attempts']})")
+        return journal
+
+    def _fail(self, job, error):
+        """Trabajo que no llegó a ejecutarse (revista inexistente, error inesperado)"""
+        logger.error(f"❌ Error en worker de subidas: {str(error)}")
+        job.status = 'failed'
+        job.error = str(error)
+        job.finished_at = datetime.now().isoformat()
+        self._persist(job, final=True)
+
+    def _release(self, job_id):
+        with self._wakeup:
+            self._active.discard(job_id)
+            self.jobs.pop(job_id, None)
+            # Se liberó un hueco de host: otros workers pueden reclamar
+            self._wakeup.notify_all()
+
+    def _job_from_record(self, record):
+        """UploadJob de una fila reclamada (de esta u otra instancia)"""
+        job = UploadJob.from_record(self.job_store.get(record['id']), json.loads(record['spec'] or '{}'))
+        job.attempt = record['attempts']
+        with self._lock:
+            self.jobs[job.id] = job
+        return job
+
+    def _heartbeat(self):
+        """Renovar los leases de los trabajos en curso cada tercio del lease
+
+        Con stop() el bucle termina, pero los trabajos que stop() sigue
+        esperando mantienen su lease hasta acabar: si venciera, otra
+        instancia los retomaría mientras este proceso aún sube.
+        """
+        interval = self.lease_seconds / 3
+        while not self._stopping.wait(interval):
+            self._renew_leases()
+        while self._active:
+            time.sleep(interval)
+            self._renew_leases()
+
+    def _renew_leases(self):
+        with self._lock:
+            active = list(self._active)
+        if not active:
+            return
+        try:
+            lost = self.job_store.heartbeat(active, self.instance_id, self.lease_seconds)
+            for job_id in lost:
+                with self._lock:
+                    job = self.jobs.get(job_id)
+                if job is None or job.cancelled.is_set():
+                    continue
+                # Detener el uploader: seguir subiendo duplicaría los archivos de la otra instancia
+                job.cancelled.set()
+                logger.warning(f"⚠️ Lease perdido para trabajo {job_id}; se detiene y lo retomará otra instancia")
+        except Exception as e:
+            logger.error(f"❌ Error renovando leases: {str(e)}")
+
+    def submit_or_get(self, idempotency_key, journal_id, submission_id, links, **kwargs):
+        """Encolar salvo que ya exista un trabajo en curso o completado con la clave
+
+        Devuelve (estado del trabajo, creado). Los trabajos fallidos o más
+        antiguos que idempotency_ttl no cuentan, así que se pueden reintentar.
+        La búsqueda y el alta van en una transacción BEGIN IMMEDIATE: dos
+        procesos con la misma clave no pueden encolar dos trabajos.
+        """
+        with self._submit_lock, self.job_store.db.transaction(immediate=True):
+            existing = self._find_by_key(idempotency_key)
+            if existing:
+                logger.info(f"🔁 Petición repetida ({idempotency_key[:20]}...), trabajo {existing['job_id']}")
+                return existing, False
+            job = self.submit(journal_id, submission_id, links, idempotency_key=idempotency_key, **kwargs)
+            return job.to_dict(), True
+
+    def submit_links(self, journal_id, submission_id, source, idempotency_key=None, ingestor=None,
+                     batch_size=None, **kwargs):
+        """Ingerir enlaces en streaming (link_ingest) y encolar un trabajo por lote
+
+        `source` es texto, un stream o una lista. Devuelve una lista de
+        (estado del trabajo, creado). Cada lote tiene su propia clave de
+        idempotencia (la indicada con sufijo #n, o la derivada de sus
+        enlaces), así que repetir la petición tras un QueueFullError encola
+        solo los lotes que faltaban.
+        """
+        from link_ingest import LINK_BATCH_SIZE, LinkIngestor
+
+        ingestor = ingestor if ingestor is not None else LinkIngestor()
+        results = []
+        for index, batch in enumerate(ingestor.batches(source, batch_size or LINK_BATCH_SIZE)):
+            if idempotency_key:
+                key = idempotency_key if index == 0 else f"{idempotency_key}#{index + 1}"
+            else:
+                key = default_idempotency_key(journal_id, submission_id, batch)
+            results.append(self.submit_or_get(key, journal_id, submission_id, batch, **kwargs))
+        return results
+
+    def _find_by_key(self, key):
+        """Trabajo vigente con la clave en la base compartida (cualquier instancia)"""
+        cutoff = (datetime.now() - timedelta(seconds=self.idempotency_ttl)).isoformat()
+        try:
+            return self.job_store.find_by_idempotency_key(key, cutoff)
+        except Exception as e:
+            logger.error(f"❌ Error buscando clave de idempotencia: {str(e)}")
+            return None
+
+    def queue_depth(self):
+        """Trabajos en cola en la base compartida (actualiza la métrica)"""
+        depth = self.job_store.queued_count()
+        JOB_QUEUE_DEPTH.set(depth)
+        return depth
+
+    def submit(self, journal_id, submission_id, links, profile=None, chat_id=None, files=None,
+               idempotency_key=None, owner=None):
+        """Encolar un trabajo; devuelve el UploadJob o lanza ValueError / QueueFullError
+
+        Con chat_id el progreso se publica en ese chat de Telegram. `files`
+        son archivos recibidos por el bot (ver telegram_files.message_attachment).
+        `owner` identifica al usuario o token para el reparto justo.
+        """
+        from scheduler import initial_cost, job_host
+
+        journal = self.config_manager.get_journal_config(journal_id)
+        if not journal:
+            raise ValueError(f"Revista no encontrada: {journal_id}")
+
+        depth = self.queue_depth()
+        if self.max_queue_depth and depth >= self.max_queue_depth:
+            JOBS_REJECTED.inc()
+            logger.warning(f"🚦 Cola llena ({depth} trabajos), rechazando trabajo nuevo")
+            raise QueueFullError(depth, self.queue_retry_after)
+
+        submission_id = submission_id or journal.get('default_submission_id')
+        job = UploadJob(journal_id, submission_id, links, profile, chat_id, files,
+                        owner or (f"telegram:{chat_id}" if chat_id else 'anonymous'))
+        job.idempotency_key = idempotency_key
+
+        known_size = sum(item.get('file_size') or 0 for item in job.files) if job.files else None
+        self.job_store.enqueue(job.to_dict(), job.spec(), job_host(journal['host']), job.owner,
+                               initial_cost(links, known_size))
+        if known_size is None and links:
+            self.scheduler.estimate(links, lambda size: self.job_store.set_cost(job.id, size))
+
+        JOB_QUEUE_DEPTH.set(depth + 1)
+        self._publish_job(job.to_dict())
+        self._ensure_workers()
+        with self._wakeup:
+            self._wakeup.notify()
+        logger.info(f"📥 Trabajo {job.id} encolado ({len(links)} enlaces, {len(job.files)} archivos)")
+        return job
+
+    def get(self, job_id):
+        """Obtener trabajo por ID"""
+        return self.jobs.get(job_id)
+
+    def get_status(self, job_id):
+        """Estado de un trabajo: en memoria si corre aquí, si no desde la base compartida"""
+        with self._lock:
+            job = self.jobs.get(job_id) if job_id in self._active else None
+        if job:
+            return job.to_dict()
+        return self.job_store.get(job_id)
+
+    # ==================== EVENTOS ====================
+    def _publish_job(self, data):
+        """Publicar el estado de un trabajo para el panel (sin el log completo)"""
+        self._published[data['job_id']] = data['status']
+        self.events.publish('job', {key: value for key, value in data.items() if key != 'logs'})
+
+    def publish_remote_changes(self, limit=50):
+        """Publicar cambios de estado de trabajos que corren en otras instancias
+
+        Una consulta por proceso (tarea periódica del broadcaster), no por panel abierto.
+        """
+        for data in self.job_store.list(limit=limit):
+            if self._published.get(data['job_id']) != data['status']:
+                self._publish_job(data)
+        if len(self._published) > 10 * limit:
+            for job_id in list(self._published)[:len(self._published) - limit]:
+                self._published.pop(job_id, None)
+
+    def recent_jobs(self, limit=20):
+        """Estado de los últimos trabajos (el propio en memoria si corre aquí)"""
+        with self._lock:
+            local = {job_id: self.jobs[job_id] for job_id in self._active if job_id in self.jobs}
+        return [local[data['job_id']].to_dict() if data['job_id'] in local else data
+                for data in self.job_store.list(limit=limit)]
+
+    def _persist(self, job, final=False):
+        """Guardar el estado del trabajo (solo mientras esta instancia tenga el lease)"""
+        try:
+            if final:
+                saved = self.job_store.finish(job.to_dict(), self.instance_id)
+            else:
+                saved = self.job_store.save(job.to_dict(), lease_owner=self.instance_id)
+            if not saved:
+                logger.warning(f"⚠️ Trabajo {job.id} reclamado por otra instancia; estado no guardado")
+                return
+        except Exception as e:
+            logger.error(f"❌ Error guardando trabajo {job.id}: {str(e)}")
+            return
+        self._publish_job(job.to_dict())
+
+    def _progress_reporter(self, job, journal):
+        """Mensaje de progreso en Telegram para el trabajo, si tiene chat"""
+        if not job.chat_id:
+            return None
+        token = self.config_manager.get_telegram_bot_token()
+        if not token:
+            return None
+        from progress import ProgressReporter
+        title = f"Trabajo {job.id} → {journal.get('name') or journal['host']}"
+        return ProgressReporter(token, job.chat_id, title).start()
+
+    # ==================== REPORTES ====================
+    def _open_manifest(self, job, journal):
+        """Manifiesto JSONL del trabajo (None si no se puede crear)"""
+        from reports import UploadManifest
+
+        try:
+            manifest = UploadManifest.for_job(job.id)
+            manifest.write('job', job_id=job.id, journal_id=job.journal_id, host=journal['host'],
+                           submission_id=job.submission_id, links=len(job.links), files=len(job.files),
+                           owner=job.owner, created_at=job.created_at, started_at=job.started_at)
+            job.manifest = manifest.path
+            return manifest
+        except Exception as e:
+            logger.error(f"❌ Error creando manifiesto de {job.id}: {str(e)}")
+            return None
+
+    def _close_manifest(self, job, journal, manifest):
+        """Cerrar el manifiesto, registrarlo en el índice y rotar reportes antiguos"""
+        try:
+            manifest.close(job.status, error=job.error, report_file=job.report_file)
+            self.config_manager.report_store.add({
+                'job_id': job.id,
+                'journal_id': job.journal_id,
+                'submission_id': str(job.submission_id) if job.submission_id else None,
+                'host': journal['host'],
+                'status': job.status,
+                'created_at': job.finished_at,
+                'files': manifest.files,
+                'bytes': manifest.bytes,
+                'manifest': manifest.path,
+                'report_file': job.report_file,
+            })
+        except Exception as e:
+            logger.error(f"❌ Error indexando reporte de {job.id}: {str(e)}")
+        self._maybe_rotate_reports()
+
+    def _maybe_rotate_reports(self):
+        """Rotación de reportes como mucho una vez por ROTATION_INTERVAL en cada proceso"""
+        from reports import ROTATION_INTERVAL, rotate_reports
+
+        now = time.monotonic()
+        with self._lock:
+            if self._rotated_at is not None and now - self._rotated_at < ROTATION_INTERVAL:
+                return
+            self._rotated_at = now
+        try:
+            rotate_reports(self.config_manager.report_store)
+        except Exception as e:
+            logger.error(f"❌ Error rotando reportes: {str(e)}")
+
+    # ==================== EJECUCIÓN ====================
+    def _start_run(self, job):
+        job.status = 'running'
+        job.started_at = datetime.now().isoformat()
+        self._persist(job)
+
+    def _job_progress(self, job, journal):
+        return _JobProgress(job.id, self.events, self._progress_reporter(job, journal))
+
+    def _attach(self, uploader, job, progress, manifest, bandwidth):
+        """Conectar progreso, manifiesto, ancho de banda y log del trabajo al uploader"""
+        uploader.progress = progress
+        uploader.manifest = manifest
+        uploader.bandwidth = bandwidth
+        uploader.cancelled = job.cancelled
+        uploader.on_log = lambda line: self.events.publish('log', {'job_id': job.id, 'line': line})
+        return uploader
+
+    def _collect(self, job, uploader, ok):
+        """Resultado del uploader en el trabajo"""
+        job.status = 'completed' if ok else 'failed'
+        job.submission_id = job.submission_id or uploader.submission_id
+        job.report_file = uploader.report_file
+        job.profile_summary = uploader.profile_summary
+        job.logs = uploader.get_logs()
+
+    @staticmethod
+    def _work_dir(job):
+        """Directorio temporal del intento: una instancia que perdió el lease no toca el del siguiente"""
+        suffix = f"_{job.attempt}" if job.attempt > 1 else ""
+        return os.path.join("temp", f"job_{job.id}{suffix}")
+
+    def _finish_run(self, job, journal, progress, manifest, bandwidth):
+        """Cerrar manifiesto y ancho de banda, guardar el estado final y avisar del resultado"""
+        bandwidth.close()
+        job.finished_at = datetime.now().isoformat()
+        if job.cancelled.is_set():
+            # El trabajo es ya de otra instancia: ni su estado ni su reporte se pisan
+            job.status = 'cancelled'
+            logger.info(f"♻️ Trabajo {job.id} cancelado (lease perdido), lo retoma otra instancia")
+            if manifest is not None:
+                manifest.close('cancelled', error=job.error)
+            if progress is not None:
+                progress.finish(False, "♻️ Lease perdido, el trabajo lo retoma otra instancia")
+            return
+        if manifest is not None:
+            self._close_manifest(job, journal, manifest)
+        self._persist(job, final=True)
+        if progress is not None:
+            detail = job.error or (f"📄 {job.report_file}" if job.report_file else None)
+            progress.finish(job.status == 'completed', detail)
+
+    def _run(self, job, journal):
+        """Ejecutar un trabajo con OJSUploader"""
+        from bot_core import OJSUploader, UploadCancelled
+
+        self._start_run(job)
+
+        # El flag del trabajo tiene prioridad sobre el de la revista
+        profile = job.profile if job.profile is not None else journal.get('profile_uploads', False)
+
+        progress = None
+        manifest = None
+        bandwidth = self.bandwidth.for_job(job.id)
+        try:
+            progress = self._job_progress(job, journal)
+            manifest = self._open_manifest(job, journal)
+            uploader = self._attach(OJSUploader(journal['host'], journal['username'], journal['password'],
+                                                work_dir=self._work_dir(job)),
+                                    job, progress, manifest, bandwidth)
+            if job.files:
+                from telegram_files import TelegramFileClient
+                client = TelegramFileClient(self.config_manager.get_telegram_bot_token())
+                ok = uploader.upload_telegram_files(client, job.files, job.submission_id, profile=profile)
+            else:
+                ok = uploader.upload_from_links(job.links, job.submission_id, profile=profile)
+            self._collect(job, uploader, ok)
+        except UploadCancelled as e:
+            job.error = str(e)
+        except Exception as e:
+            logger.error(f"❌ Error en trabajo {job.id}: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            self._finish_run(job, journal, progress, manifest, bandwidth)
+
+    async def _run_async(self, job, journal):
+        """Ejecutar un trabajo con AsyncOJSUploader en el loop del motor asyncio
+
+        Lo que toca la base, el disco de reportes o Telegram (estado,
+        manifiesto, progreso) va al executor por defecto del loop.
+        """
+        import asyncio
+
+        from bot_core import UploadCancelled
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._start_run, job)
+        profile = job.profile if job.profile is not None else journal.get('profile_uploads', False)
+
+        progress = None
+        manifest = None
+        bandwidth = self.bandwidth.for_job(job.id)
+        try:
+            progress = await loop.run_in_executor(None, self._job_progress, job, journal)
+            manifest = await loop.run_in_executor(None, self._open_manifest, job, journal)
+            uploader = self._attach(self._engine.uploader(journal['host'], journal['username'],
+                                                          journal['password'],
+                                                          self._work_dir(job)),
+                                    job, progress, manifest, bandwidth)
+            async with uploader:
+                if job.files:
+                    from telegram_files import TelegramFileClient
+                    client = TelegramFileClient(self.config_manager.get_telegram_bot_token())
+                    ok = await uploader.upload_telegram_files(client, job.files, job.submission_id,
+                                                              profile=profile)
+                else:
+                    ok = await uploader.upload_from_links(job.links, job.submission_id, profile=profile)
+            self._collect(job, uploader, ok)
+        except UploadCancelled as e:
+            job.error = str(e)
+        except Exception as e:
+            logger.error(f"❌ Error en trabajo {job.id}: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            await loop.run_in_executor(None, self._finish_run, job, journal, progress, manifest, bandwidth)
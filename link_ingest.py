@@ -0,0 +1,208 @@
+"""
+Ingesta de enlaces en bloque
+
+Los enlaces llegan como texto libre (cuerpo de /api/upload, archivo .txt,
+mensaje o documento de Telegram) y se procesan línea a línea sin cargar
+la lista completa: se extraen las URLs, se normalizan, se descartan las
+no válidas y las repetidas, y se entregan por lotes para encolar trabajos
+de tamaño manejable.
+
+Normalización:
+- esquema y host en minúsculas, sin puerto por defecto ni fragmento
+- sin barra final en la ruta
+- sin parámetros de seguimiento (utm_*, fbclid, gclid, ...)
+- espejos reescritos a su enlace de descarga directa (Dropbox, Google
+  Drive) y hosts configurados en LINK_MIRRORS ("espejo=origen,...")
+"""
+
+import hashlib
+import logging
+import os
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_SCHEMES = ('http', 'https')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+MAX_URL_LENGTH = 2048
+MAX_LINE_LENGTH = 64 * 1024
+# Enlaces por petición y por trabajo encolado
+MAX_LINKS = int(os.environ.get('MAX_LINKS_PER_REQUEST', 10000))
+LINK_BATCH_SIZE = int(os.environ.get('LINK_BATCH_SIZE', 100))
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga',
+                   'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+
+# Candidatos: cualquier esquema (para poder rechazarlo) o www. sin esquema
+CANDIDATE_PATTERN = re.compile(r'(?:[a-z][a-z0-9+.\-]*://|www\.)[^\s<>"]+', re.IGNORECASE)
+TRAILING_PUNCTUATION = '.,;:!?)]}\'"'
+GOOGLE_DRIVE_FILE = re.compile(r'^/file/d/([\w-]+)')
+
+LINKS_INGESTED = metrics.REGISTRY.counter(
+    'links_ingested_total',
+    'Enlaces procesados en la ingesta por resultado (accepted, duplicate, invalid)',
+    ('result',)
+)
+
+
+class InvalidLink(ValueError):
+    """Enlace rechazado en la validación"""
+
+
+def load_mirrors(value=None):
+    """Reescrituras de host desde LINK_MIRRORS: "espejo=origen,espejo2=origen2" """
+    value = os.environ.get('LINK_MIRRORS', '') if value is None else value
+    mirrors = {}
+    for pair in value.split(','):
+        mirror, _, origin = pair.partition('=')
+        if mirror.strip() and origin.strip():
+            mirrors[mirror.strip().lower()] = origin.strip().lower()
+    return mirrors
+
+
+def rewrite_mirror(host, path, query):
+    """Enlace de descarga directa para hosts conocidos; devuelve (host, path, query)"""
+    if host in ('dropbox.com', 'www.dropbox.com'):
+        # dl=0 abre la vista previa en HTML; dl=1 descarga el archivo
+        query = [(key, value) for key, value in query if key != 'dl'] + [('dl', '1')]
+        return 'www.dropbox.com', path, query
+    if host == 'drive.google.com':
+        match = GOOGLE_DRIVE_FILE.match(path)
+        if match:
+            file_id = match.group(1)
+        else:
+            file_id = dict(query).get('id') if path == '/open' else None
+        if file_id:
+            return host, '/uc', [('export', 'download'), ('id', file_id)]
+    return host, path, query
+
+
+def normalize_url(url, mirrors=None):
+    """Forma canónica de un enlace; InvalidLink si no se puede descargar"""
+    url = url.strip().strip('<>')
+    if url.lower().startswith('www.'):
+        url = 'https://' + url
+    if len(url) > MAX_URL_LENGTH:
+        raise InvalidLink("enlace demasiado largo")
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        raise InvalidLink("enlace mal formado")
+
+    scheme = parts.scheme.lower()
+    if scheme not in ALLOWED_SCHEMES:
+        raise InvalidLink(f"esquema no permitido: {scheme or 'ninguno'}")
+    if not parts.hostname:
+        raise InvalidLink("sin host")
+    if parts.username or parts.password:
+        raise InvalidLink("credenciales en el enlace")
+
+    host = parts.hostname.lower().rstrip('.')
+    host = (mirrors or {}).get(host, host)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    path = parts.path.rstrip('/') if len(parts.path) > 1 else ''
+    host, path, query = rewrite_mirror(host, path, query)
+
+    netloc = f"[{host}]" if ':' in host else host
+    if port not in (None, DEFAULT_PORTS[scheme]):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+
+def iter_lines(source):
+    """Líneas de texto de un str, bytes, stream (texto o binario) o iterable de str"""
+    if isinstance(source, bytes):
+        source = source.decode('utf-8', errors='replace')
+    if isinstance(source, str):
+        yield from source.splitlines()
+        return
+    if hasattr(source, 'readline'):
+        # Líneas acotadas: un archivo sin saltos de línea no se carga entero
+        while True:
+            line = source.readline(MAX_LINE_LENGTH)
+            if not line:
+                return
+            yield line.decode('utf-8', errors='replace') if isinstance(line, bytes) else line
+    for item in source:
+        if isinstance(item, str):
+            yield item
+
+
+def iter_candidates(source):
+    """Cadenas con aspecto de enlace dentro del texto"""
+    for line in iter_lines(source):
+        for match in CANDIDATE_PATTERN.finditer(line):
+            yield match.group(0).rstrip(TRAILING_PUNCTUATION)
+
+
+class LinkIngestor:
+    """Extrae, normaliza, valida y deduplica enlaces en streaming
+
+    La deduplicación guarda solo un resumen de 16 bytes por enlace, así que
+    miles de enlaces ocupan poca memoria. `rejected` conserva los primeros
+    enlaces descartados con su motivo para informar al usuario.
+    """
+
+    def __init__(self, max_links=MAX_LINKS, mirrors=None, max_rejected=10):
+        self.max_links = max_links
+        self.mirrors = load_mirrors() if mirrors is None else mirrors
+        self.max_rejected = max_rejected
+        self.accepted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.truncated = False
+        self.rejected = []
+        self._seen = set()
+
+    def feed(self, source):
+        """Enlaces normalizados y únicos, en el orden de llegada"""
+        for candidate in iter_candidates(source):
+            try:
+                url = normalize_url(candidate, self.mirrors)
+            except InvalidLink as e:
+                self.invalid += 1
+                LINKS_INGESTED.inc(result='invalid')
+                if len(self.rejected) < self.max_rejected:
+                    self.rejected.append({'link': candidate[:200], 'reason': str(e)})
+                continue
+
+            digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+            if digest in self._seen:
+                self.duplicates += 1
+                LINKS_INGESTED.inc(result='duplicate')
+                continue
+            if self.max_links and self.accepted >= self.max_links:
+                # Se deja de leer la fuente: el resto no se procesa
+                self.truncated = True
+                logger.warning(f"⚠️ Límite de {self.max_links} enlaces alcanzado, resto ignorado")
+                return
+            self._seen.add(digest)
+            self.accepted += 1
+            LINKS_INGESTED.inc(result='accepted')
+            yield url
+
+    def batches(self, source, size=LINK_BATCH_SIZE):
+        """Listas de hasta `size` enlaces según se van leyendo"""
+        batch = []
+        for url in self.feed(source):
+            batch.append(url)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def summary(self):
+        return {
+            'accepted': self.accepted,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'truncated': self.truncated,
+            'rejected': self.rejected,
+        }
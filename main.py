@@ -7,6 +7,62 @@ import subprocess
 import sys
 from datetime import datetime
 
+def run_polling():
+    """Recibir updates de Telegram por long polling (sin webhook público)"""
+    import logging
+    import signal
+    
+    os.environ['TELEGRAM_MODE'] = 'polling'
+    from app import config_manager, initialize, job_manager, shared_metrics, update_queue, TELEGRAM_TOKEN
+    from telegram_dispatcher import get_dispatcher
+    from telegram_polling import TelegramPoller
+    
+    initialize()
+    token = config_manager.get_telegram_bot_token() or TELEGRAM_TOKEN
+    if not token:
+        logging.error("❌ Token de Telegram no configurado")
+        return 1
+    
+    poller = TelegramPoller(token, update_queue, state=config_manager.telegram_state)
+    job_manager.start()
+    shared_metrics.start()
+    signal.signal(signal.SIGTERM, lambda *args: poller.stop())
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        poller.stop()
+    finally:
+        update_queue.join(timeout=30)
+        get_dispatcher().shutdown()
+    return 0
+
+def run_worker():
+    """Solo workers de subida: reclaman trabajos de la base compartida"""
+    import signal
+    import threading
+    
+    from app import initialize, job_manager, shared_metrics
+    
+    initialize()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    job_manager.start()
+    shared_metrics.start()
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("🛑 Esperando a los trabajos en curso...")
+    job_manager.stop(timeout=float(os.environ.get('WORKER_STOP_TIMEOUT', 30)))
+    return 0
+
+def run_serve():
+    """Servidor de producción con gunicorn (ver serving.py)"""
+    from serving import serve
+    
+    return serve()
+
 def main():
     print("=" * 50)
     print("🤖 BOT OJS UPLOADER - PUNTO DE ENTRADA")
@@ -16,14 +72,20 @@ def main():
     print(f"Directorio: {os.getcwd()}")
     print("=" * 50)
     
-    # Verificar si usar start.sh o app.py directamente
-    if os.path.exists("start.sh"):
-        print("🚀 Ejecutando start.sh...")
-        os.system("chmod +x start.sh")
-        os.system("./start.sh")
-    else:
-        print("🚀 Ejecutando app.py directamente...")
-        os.system(f"python app.py")
+    # Modo long polling: python main.py poll
+    if len(sys.argv) > 1 and sys.argv[1] == 'poll':
+        print("📡 Modo long polling")
+        sys.exit(run_polling())
+    
+    # Solo workers de subida: python main.py worker
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        print("🧵 Modo worker de subidas")
+        sys.exit(run_worker())
+    
+    # Servidor de producción (por defecto): python main.py [serve]
+    # Arranca en este mismo proceso, sin pasar por start.sh ni otro intérprete
+    print("🚀 Modo servidor (gunicorn)")
+    sys.exit(run_serve())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
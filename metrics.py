@@ -0,0 +1,447 @@
+"""
+Métricas en formato Prometheus para el Bot OJS Uploader
+Contadores, gauges e histogramas en memoria, sin dependencias externas
+
+Con varios procesos (workers de gunicorn, main.py worker) cada uno tiene su
+registro; SharedMetrics publica instantáneas en un almacén compartido y
+/api/metrics exporta la suma de todos.
+"""
+
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Buckets de latencia (segundos) pensados para etapas de red y disco
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Buckets de throughput (bytes/segundo): de 64 KB/s a 100 MB/s
+THROUGHPUT_BUCKETS = (65536, 262144, 1048576, 4194304, 10485760, 26214400, 52428800, 104857600)
+
+
+def _escape(value):
+    """Escapar valor de etiqueta según el formato de texto de Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    """Formatear etiquetas como {a="1",b="2"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    """Formatear número para la salida de texto"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base común: nombre, ayuda, etiquetas y valores por combinación de etiquetas"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """Convertir kwargs de etiquetas en tupla ordenada"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: etiquetas esperadas {self.labelnames}, recibidas {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """Líneas de texto Prometheus para esta métrica"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+    def snapshot(self):
+        """Definición y valores serializables en JSON (ver SharedMetrics)"""
+        with self._lock:
+            values = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.metric_type, 'help': self.documentation, 'labels': list(self.labelnames),
+                'values': values}
+
+
+class Counter(_Metric):
+    """Contador monotónico"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Valor que puede subir y bajar"""
+
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Histograma con buckets fijos (acumulativos al exportar)"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [conteos por bucket (+Inf al final), suma, total]
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager que observa la duración del bloque"""
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            values = [[list(key), [list(state[0]), state[1], state[2]]] for key, state in self._values.items()]
+        return {'type': self.metric_type, 'help': self.documentation, 'labels': list(self.labelnames),
+                'buckets': list(self.buckets), 'values': values}
+
+    def _render_sample(self, key, state):
+        counts, total_sum, total_count = state
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{labels} {total_count}")
+        return lines
+
+
+class _Timer:
+    """Medidor de duración para Histogram.time()"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.monotonic() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Registro de métricas del proceso"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Exportar todas las métricas en formato de texto Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Instantánea de todas las métricas: {nombre: definición y valores}"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = MetricsRegistry()
+
+# ==================== MÉTRICAS DEL UPLOADER ====================
+STAGE_DURATION = REGISTRY.histogram(
+    'ojs_stage_duration_seconds',
+    'Duración de cada etapa del uploader (login, discover, download, zip, upload, job)',
+    ('stage', 'host')
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'ojs_stage_errors_total',
+    'Errores por etapa del uploader',
+    ('stage', 'host')
+)
+STAGE_RETRIES = REGISTRY.counter(
+    'ojs_stage_retries_total',
+    'Reintentos por etapa del uploader',
+    ('stage', 'host')
+)
+TRANSFER_BYTES = REGISTRY.counter(
+    'ojs_transfer_bytes_total',
+    'Bytes transferidos por etapa (download, zip, upload)',
+    ('stage', 'host')
+)
+TRANSFER_THROUGHPUT = REGISTRY.histogram(
+    'ojs_transfer_throughput_bytes_per_second',
+    'Throughput de cada transferencia individual',
+    ('stage', 'host'),
+    buckets=THROUGHPUT_BUCKETS
+)
+JOBS_TOTAL = REGISTRY.counter(
+    'ojs_jobs_total',
+    'Procesos de subida finalizados por resultado (success, failure, cancelled)',
+    ('host', 'outcome')
+)
+
+# ==================== MÉTRICAS DE TELEGRAM ====================
+TELEGRAM_SEND_DURATION = REGISTRY.histogram(
+    'telegram_send_duration_seconds',
+    'Latencia de llamadas salientes a la API de Telegram',
+    ('method',)
+)
+TELEGRAM_SEND_ERRORS = REGISTRY.counter(
+    'telegram_send_errors_total',
+    'Errores en llamadas salientes a la API de Telegram',
+    ('method',)
+)
+WEBHOOK_DURATION = REGISTRY.histogram(
+    'telegram_webhook_duration_seconds',
+    'Tiempo de manejo de cada update recibido por el webhook',
+    ('outcome',)
+)
+
+PROCESS_START_TIME = REGISTRY.gauge(
+    'process_start_time_seconds',
+    'Hora de inicio del proceso (epoch)'
+)
+PROCESS_START_TIME.set(time.time())
+
+
+def host_label(url):
+    """Reducir una URL de revista a su host para usarla como etiqueta"""
+    parsed = urlparse(url if '://' in url else f"http://{url}")
+    return parsed.netloc or url
+
+
+def record_stage(stage, host, seconds, ok=True, cancelled=False):
+    """Registrar duración y posible error de una etapa ('job' cuenta además el resultado)
+
+    Una etapa cancelada (lease perdido) no es un error ni una duración
+    representativa: solo cuenta en ojs_jobs_total con outcome 'cancelled'.
+    """
+    if cancelled:
+        if stage == 'job':
+            JOBS_TOTAL.inc(host=host, outcome='cancelled')
+        return
+    STAGE_DURATION.observe(seconds, stage=stage, host=host)
+    if not ok:
+        STAGE_ERRORS.inc(stage=stage, host=host)
+    if stage == 'job':
+        JOBS_TOTAL.inc(host=host, outcome='success' if ok else 'failure')
+
+
+def record_transfer(stage, host, nbytes, seconds):
+    """Registrar bytes y throughput de una transferencia"""
+    TRANSFER_BYTES.inc(nbytes, stage=stage, host=host)
+    if seconds > 0 and nbytes > 0:
+        TRANSFER_THROUGHPUT.observe(nbytes / seconds, stage=stage, host=host)
+
+
+def record_retry(stage, host):
+    """Registrar un reintento"""
+    STAGE_RETRIES.inc(stage=stage, host=host)
+
+
+def render():
+    """Texto Prometheus de todas las métricas registradas"""
+    return REGISTRY.render()
+
+
+# ==================== AGREGACIÓN ENTRE PROCESOS ====================
+_TYPES = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+
+def _add(metric_type, current, value):
+    if current is None:
+        return [list(value[0]), value[1], value[2]] if metric_type == 'histogram' else value
+    if metric_type == 'histogram':
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1], current[2] + value[2]]
+    return current + value
+
+
+def merge_snapshots(snapshots, gauge_label='instance'):
+    """Combinar instantáneas de varios procesos ({fuente: instantánea})
+
+    Contadores e histogramas se suman. Los gauges son propios de cada
+    proceso: se conservan con la fuente en la etiqueta `gauge_label`, o se
+    descartan si gauge_label es None.
+    """
+    merged = {}
+    for source, snapshot in snapshots.items():
+        for name, data in snapshot.items():
+            is_gauge = data['type'] == 'gauge'
+            if is_gauge and not gauge_label:
+                continue
+            labels = data['labels'] + [gauge_label] if is_gauge else data['labels']
+            target = merged.setdefault(name, dict(data, labels=labels, values={}))
+            # Definición distinta (proceso con otra versión del código): se ignora
+            if (target['type'], target['labels'], target.get('buckets')) != (data['type'], labels,
+                                                                              data.get('buckets')):
+                continue
+            for key, value in data['values']:
+                key = tuple(key) + ((str(source),) if is_gauge else ())
+                target['values'][key] = _add(data['type'], target['values'].get(key), value)
+    return {name: dict(data, values=[[list(key), value] for key, value in data['values'].items()])
+            for name, data in merged.items()}
+
+
+def render_snapshot(snapshot):
+    """Texto Prometheus de una instantánea (de un proceso o combinada)"""
+    lines = []
+    for name, data in snapshot.items():
+        kwargs = {'buckets': data['buckets']} if data['type'] == 'histogram' else {}
+        metric = _TYPES[data['type']](name, data['help'], data['labels'], **kwargs)
+        metric._values = {tuple(key): value for key, value in data['values']}
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class SharedMetrics:
+    """Métricas de todos los procesos que comparten un almacén (storage.MetricsStore)
+
+    Cada proceso publica su registro cada `interval` segundos (hilo perezoso
+    por proceso) con clave host:pid y render() combina las instantáneas sin
+    escribir en la base. Las de procesos que llevan `max_age` segundos sin
+    publicar cuentan sin sus gauges y el hilo de publicación las pliega en
+    una fila acumulada, así que los contadores no retroceden cuando un
+    worker termina. Con interval=0 render() exporta solo el registro del
+    proceso.
+    """
+
+    def __init__(self, registry, store, interval=10, max_age=60):
+        self.registry = registry
+        self.store = store
+        self.interval = interval
+        self.max_age = max_age
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def instance():
+        """Clave del proceso: el pid solo no distingue procesos de hosts distintos"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Arrancar la publicación periódica (una vez por proceso)"""
+        if not self.interval:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._publish_loop, name="metrics-publish", daemon=True).start()
+
+    def _publish_loop(self):
+        while True:
+            try:
+                self.publish()
+                self.store.retire(time.time() - self.max_age,
+                                  lambda stale: merge_snapshots(stale, gauge_label=None))
+            except Exception as e:
+                logger.warning(f"⚠️ Error publicando métricas: {str(e)}")
+            time.sleep(self.interval)
+
+    def publish(self):
+        self.store.save(self.instance(), json.dumps(self.registry.snapshot(), separators=(',', ':')))
+
+    def render(self):
+        """Texto Prometheus con la suma de todos los procesos (o solo este si falla el almacén)"""
+        if not self.interval:
+            return self.registry.render()
+        try:
+            rows = self.store.snapshots()
+        except Exception as e:
+            logger.error(f"❌ Error agregando métricas de los procesos: {str(e)}")
+            return self.registry.render()
+
+        # Este proceso con su registro actual; los que no publican, sin gauges
+        instance = self.instance()
+        before = time.time() - self.max_age
+        live = {key: data for key, updated_at, data in rows
+                if key not in (instance, self.store.RETIRED) and updated_at >= before}
+        stale = {key: data for key, updated_at, data in rows
+                 if key == self.store.RETIRED or (key != instance and updated_at < before)}
+        live[instance] = self.registry.snapshot()
+        if stale:
+            live[self.store.RETIRED] = merge_snapshots(stale, gauge_label=None)
+        return render_snapshot(merge_snapshots(live))
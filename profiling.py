@@ -0,0 +1,140 @@
+"""
+Perfilado opcional de procesos de subida (CPU y memoria)
+Genera artefactos pstats, pilas colapsadas para flamegraphs y un resumen TXT
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class JobProfiler:
+    """Perfilador de un proceso: cProfile + muestreo de pilas + tracemalloc
+
+    Se usa como context manager en el hilo que ejecuta el trabajo. tracemalloc
+    es global al proceso, así que con trabajos concurrentes las asignaciones
+    de otros hilos también aparecen en el resumen de memoria.
+    """
+
+    def __init__(self, sample_interval=0.01, top_allocations=15):
+        self.sample_interval = sample_interval
+        self.top_allocations = top_allocations
+        self.profile = cProfile.Profile()
+        self.profile_enabled = False
+        self.samples = Counter()
+        self.sample_count = 0
+        self.peak_memory = 0
+        self.allocations = []
+        self.started_at = None
+        self.elapsed = 0.0
+        self._owns_tracemalloc = False
+        self._target_thread = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self.started_at = time.monotonic()
+        self._target_thread = threading.get_ident()
+
+        # Memoria: solo detener tracemalloc al final si lo iniciamos aquí
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+        tracemalloc.reset_peak()
+
+        # CPU determinista (puede fallar si ya hay otro perfilador activo)
+        try:
+            self.profile.enable()
+            self.profile_enabled = True
+        except ValueError as e:
+            logger.warning(f"⚠️ cProfile no disponible: {e}")
+
+        # Muestreo de pilas para flamegraphs
+        self._sampler = threading.Thread(target=self._sample_loop, name="job-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profile_enabled:
+            self.profile.disable()
+        self._stop_event.set()
+        self._sampler.join()
+        self.elapsed = time.monotonic() - self.started_at
+
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        self.allocations = snapshot.statistics('lineno')[:self.top_allocations]
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        return False
+
+    def _sample_loop(self):
+        """Tomar muestras periódicas de la pila del hilo perfilado"""
+        while not self._stop_event.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def top_functions(self, limit=25, sort_key='cumulative'):
+        """Texto pstats con las funciones más costosas"""
+        if not self.profile_enabled:
+            return "cProfile no disponible para este proceso\n"
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.sort_stats(sort_key).print_stats(limit)
+        return stream.getvalue()
+
+    def save(self, prefix):
+        """Guardar artefactos con el prefijo dado y devolver un resumen"""
+        artifacts = {}
+
+        if self.profile_enabled:
+            artifacts['pstats'] = f"{prefix}.pstats"
+            self.profile.dump_stats(artifacts['pstats'])
+
+        artifacts['collapsed'] = f"{prefix}.collapsed"
+        with open(artifacts['collapsed'], 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        artifacts['summary'] = f"{prefix}_summary.txt"
+        with open(artifacts['summary'], 'w', encoding='utf-8') as f:
+            f.write("=" * 60 + "\n")
+            f.write("PERFIL DE PROCESO - BOT OJS UPLOADER\n")
+            f.write("=" * 60 + "\n\n")
+            f.write(f"Duración: {self.elapsed:.2f} s\n")
+            f.write(f"Muestras de pila: {self.sample_count} (cada {self.sample_interval * 1000:.0f} ms)\n")
+            f.write(f"Pico de memoria (tracemalloc): {self.peak_memory:,} bytes\n")
+            f.write("\nMAYORES ASIGNACIONES:\n")
+            f.write("-" * 60 + "\n")
+            for stat in self.allocations:
+                f.write(f"{stat.size:>12,} bytes  {stat.count:>7,} bloques  {stat.traceback}\n")
+            f.write("\nFUNCIONES MÁS COSTOSAS (cumulative):\n")
+            f.write("-" * 60 + "\n")
+            f.write(self.top_functions())
+
+        return {
+            'elapsed': round(self.elapsed, 3),
+            'peak_memory': self.peak_memory,
+            'samples': self.sample_count,
+            'artifacts': artifacts
+        }
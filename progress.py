@@ -0,0 +1,187 @@
+"""
+Progreso en vivo de un trabajo como un único mensaje de Telegram editado
+
+Las etapas del uploader publican su estado con update(); los estados
+intermedios se combinan y el mensaje se edita con editMessageText como
+mucho una vez por intervalo, así las llamadas a la API dependen de la
+duración del trabajo y no del número de archivos.
+"""
+
+import logging
+import threading
+import time
+
+from telegram_dispatcher import get_dispatcher
+
+logger = logging.getLogger(__name__)
+
+STAGE_LABELS = {
+    'queued': '🕐 En cola',
+    'login': '🔐 Iniciando sesión',
+    'discover': '🔎 Buscando envío',
+    'download': '⬇️ Descargando',
+    'zip': '📦 Comprimiendo',
+    'upload': '⬆️ Subiendo',
+    'done': '✅ Completado',
+    'failed': '❌ Fallido',
+}
+
+
+def format_bytes(nbytes):
+    """Tamaño legible (KB, MB, GB)"""
+    value = float(nbytes or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def format_duration(seconds):
+    """Duración corta: 45s, 3m 10s, 1h 05m"""
+    seconds = int(max(0, seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+
+def progress_bar(fraction, width=12):
+    fraction = min(1.0, max(0.0, fraction))
+    filled = int(round(fraction * width))
+    return '█' * filled + '░' * (width - filled)
+
+
+class ProgressReporter:
+    """Mensaje de progreso de un trabajo, editado con limitación de frecuencia"""
+
+    def __init__(self, token, chat_id, title, interval=3.0, dispatcher=None):
+        self.token = token
+        self.chat_id = chat_id
+        self.title = title
+        self.interval = interval
+        self.dispatcher = dispatcher or get_dispatcher()
+        self.message_id = None
+        self.started = time.monotonic()
+        self.ended = None
+        self.state = {'stage': 'queued'}
+        self.stage_started = self.started
+        self.edits = 0
+        self._last_text = None
+        self._last_sent = 0.0
+        self._inflight = None
+        self._timer = None
+        self._finished = False
+        # Reentrante: un Future ya resuelto ejecuta el callback en el acto
+        self._lock = threading.RLock()
+
+    # ==================== PUBLICACIÓN ====================
+    def start(self):
+        """Publicar el mensaje inicial"""
+        with self._lock:
+            text = self.render()
+            self._last_text = text
+            self._last_sent = time.monotonic()
+            self._inflight = self.dispatcher.send_message(self.token, self.chat_id, text)
+            self._inflight.add_done_callback(self._on_created)
+        return self
+
+    def update(self, stage=None, **fields):
+        """Publicar un estado (done/total, bytes_done/bytes_total, detail)"""
+        with self._lock:
+            if self._finished:
+                return
+            if stage and stage != self.state.get('stage'):
+                self.state = {'stage': stage}
+                self.stage_started = time.monotonic()
+            self.state.update(fields)
+            self._maybe_flush()
+
+    def finish(self, ok=True, detail=None):
+        """Estado final: siempre se envía (tras la edición en curso)"""
+        with self._lock:
+            self._finished = True
+            self.ended = time.monotonic()
+            self.state = {'stage': 'done' if ok else 'failed', 'detail': detail}
+            self._maybe_flush(force=True)
+
+    # ==================== ENVÍO LIMITADO ====================
+    def _maybe_flush(self, force=False):
+        """Editar ahora si pasó el intervalo; si no, programar un único temporizador"""
+        if self._inflight is not None and not self._inflight.done():
+            return  # _on_sent volverá a llamar cuando termine la edición actual
+        wait = 0 if force else self._last_sent + self.interval - time.monotonic()
+        if wait > 0:
+            if self._timer is None:
+                self._timer = threading.Timer(wait, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            return
+        self._send_edit()
+
+    def _send_edit(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        text = self.render()
+        if text == self._last_text or self.message_id is None:
+            return
+        self._last_text = text
+        self._last_sent = time.monotonic()
+        self.edits += 1
+        self._inflight = self.dispatcher.call(self.token, 'editMessageText', {
+            'chat_id': self.chat_id,
+            'message_id': self.message_id,
+            'text': text,
+        }, self.chat_id)
+        self._inflight.add_done_callback(self._on_sent)
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._maybe_flush()
+
+    def _on_created(self, future):
+        try:
+            self.message_id = future.result()['result']['message_id']
+        except Exception as e:
+            logger.error(f"❌ No se pudo crear mensaje de progreso: {e}")
+            return
+        self._on_sent(future)
+
+    def _on_sent(self, future):
+        with self._lock:
+            if self.render() != self._last_text:
+                self._maybe_flush(force=self._finished)
+
+    # ==================== RENDER ====================
+    def render(self):
+        """Texto del mensaje para el estado actual"""
+        state = self.state
+        stage = state.get('stage', 'queued')
+        lines = [f"📤 {self.title}", STAGE_LABELS.get(stage, stage)]
+
+        done, total = state.get('done'), state.get('total')
+        fraction = None
+        if total:
+            fraction = (done or 0) / total
+            lines[-1] += f" ({done or 0}/{total})"
+        if state.get('bytes_total'):
+            fraction = state.get('bytes_done', 0) / state['bytes_total']
+        if fraction is not None and stage not in ('done', 'failed'):
+            lines.append(f"[{progress_bar(fraction)}] {fraction * 100:.0f}%")
+
+        if state.get('bytes_done') is not None:
+            line = f"💾 {format_bytes(state['bytes_done'])}"
+            if state.get('bytes_total'):
+                line += f" / {format_bytes(state['bytes_total'])}"
+            lines.append(line)
+
+        elapsed = time.monotonic() - self.stage_started
+        if fraction and 0 < fraction < 1 and elapsed > 1:
+            lines.append(f"⏱️ ETA: {format_duration(elapsed * (1 - fraction) / fraction)}")
+        if state.get('detail'):
+            lines.append(str(state['detail']))
+        # Al terminar el tiempo queda fijo para que el texto final no cambie
+        lines.append(f"🕐 Tiempo total: {format_duration((self.ended or time.monotonic()) - self.started)}")
+        return '\n'.join(lines)
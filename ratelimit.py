@@ -0,0 +1,57 @@
+"""
+Limitadores de tasa (token bucket) reutilizables
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens por segundo con ráfagas de hasta `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, amount=1):
+        """Tomar tokens si hay; si no, devolver los segundos a esperar (0 = tomados)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Peticiones mayores que la capacidad se permiten con el bucket lleno
+            needed = min(amount, self.capacity)
+            if self._tokens >= needed:
+                self._tokens -= amount
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, amount=1, timeout=None):
+        """Bloquear hasta obtener los tokens; False si vence el timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(amount)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def set_rate(self, rate, capacity=None):
+        """Cambiar la tasa en caliente"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = float(capacity if capacity is not None else rate)
+            self._tokens = min(self._tokens, self.capacity)
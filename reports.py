@@ -0,0 +1,185 @@
+"""
+Manifiestos de subida e índice de reportes
+
+Cada trabajo escribe en reports/ un manifiesto JSONL, una línea por
+registro:
+
+- job: revista, host, envío y origen (enlaces o archivos de Telegram)
+- file: archivo descargado o recibido (nombre, origen, tamaño, sha256, ms)
+- chunk: ZIP creado (nombre, tamaño, sha256 y archivos que contiene)
+- upload: subida a OJS (archivo, tamaño, ms, resultado)
+- summary: estado final, contadores, reporte TXT y duración
+
+y queda registrado en la tabla `reports` de SQLite (storage.ReportStore),
+indexada por revista, envío y fecha: "último reporte del envío X" es una
+búsqueda en el índice, sin recorrer el directorio.
+
+Los reportes con más de REPORT_COMPRESS_DAYS días se comprimen con gzip y
+los de más de REPORT_RETENTION_DAYS se borran. Cada proceso reclama las
+filas a rotar en el índice, así que varias instancias no se pisan.
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+REPORT_DIR = "reports"
+COMPRESS_AFTER_DAYS = int(os.environ.get('REPORT_COMPRESS_DAYS', 7))
+RETENTION_DAYS = int(os.environ.get('REPORT_RETENTION_DAYS', 90))
+# Como mucho una rotación por proceso en este intervalo (segundos)
+ROTATION_INTERVAL = 3600
+
+
+class UploadManifest:
+    """Manifiesto JSONL de un trabajo, escrito a medida que avanza"""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = 0
+        self.bytes = 0
+        self.uploaded = 0
+        self.failed = 0
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @classmethod
+    def for_job(cls, job_id, report_dir=REPORT_DIR):
+        return cls(os.path.join(report_dir, f"manifest_{time.strftime('%Y%m%d')}_{job_id}.jsonl"))
+
+    def write(self, record_type, **fields):
+        """Añadir un registro (se escribe y se vuelca al momento)"""
+        if record_type == 'file' and fields.get('status') != 'failed':
+            self.files += 1
+            self.bytes += fields.get('size') or 0
+        elif record_type == 'upload':
+            if fields.get('status') == 'uploaded':
+                self.uploaded += 1
+            else:
+                self.failed += 1
+        record = {'type': record_type, 'ts': datetime.now().isoformat(timespec='milliseconds'), **fields}
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            self._file.flush()
+
+    def close(self, status, **fields):
+        """Registro final con los contadores; cierra el archivo"""
+        self.write('summary', status=status, files=self.files, bytes=self.bytes, uploaded=self.uploaded,
+                   failed=self.failed, elapsed=round(time.monotonic() - self._started, 3), **fields)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_manifest(path):
+    """Registros de un manifiesto (comprimido o no)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def gzip_file(path):
+    """Comprimir `path` a `path`.gz y borrar el original; devuelve la ruta nueva"""
+    target = path + '.gz'
+    with open(path, 'rb') as source, gzip.open(target + '.tmp', 'wb') as dest:
+        shutil.copyfileobj(source, dest)
+    os.replace(target + '.tmp', target)
+    os.remove(path)
+    return target
+
+
+def _compress(path):
+    if not path or path.endswith('.gz'):
+        return path
+    if not os.path.exists(path):
+        return path + '.gz' if os.path.exists(path + '.gz') else path
+    return gzip_file(path)
+
+
+def _remove(path):
+    for candidate in (path, (path or '') + '.gz'):
+        if candidate and os.path.exists(candidate):
+            os.remove(candidate)
+
+
+def rotate_reports(report_store, report_dir=REPORT_DIR, compress_after=COMPRESS_AFTER_DAYS,
+                   retention=RETENTION_DAYS, now=None):
+    """Comprimir los reportes antiguos y borrar los vencidos; devuelve (comprimidos, borrados)"""
+    now = now or datetime.now()
+    compressed = deleted = 0
+
+    if retention:
+        cutoff = (now - timedelta(days=retention)).isoformat()
+        for row in report_store.expired(cutoff):
+            for path in (row['manifest'], row['report_file']):
+                try:
+                    _remove(path)
+                except OSError as e:
+                    logger.warning(f"⚠️ No se pudo borrar {path}: {str(e)}")
+            report_store.delete(row['job_id'])
+            deleted += 1
+
+    cutoff = (now - timedelta(days=compress_after)).isoformat()
+    for row in report_store.claim_rotation(cutoff):
+        try:
+            report_store.set_rotated(row['job_id'], _compress(row['manifest']), _compress(row['report_file']))
+            compressed += 1
+        except OSError as e:
+            logger.warning(f"⚠️ Error comprimiendo reporte de {row['job_id']}: {str(e)}")
+            report_store.set_rotated(row['job_id'], row['manifest'], row['report_file'], rotation=0)
+
+    # Reportes TXT sueltos de antes del índice: se comprimen por antigüedad
+    if os.path.isdir(report_dir):
+        limit = (now - timedelta(days=compress_after)).timestamp()
+        for entry in os.scandir(report_dir):
+            if (entry.name.startswith('upload_report_') and entry.name.endswith('.txt')
+                    and entry.stat().st_mtime < limit):
+                try:
+                    gzip_file(entry.path)
+                    compressed += 1
+                except OSError:
+                    pass
+
+    if compressed or deleted:
+        logger.info(f"🗜️ Reportes rotados: {compressed} comprimidos, {deleted} borrados")
+    return compressed, deleted
+
+
+def describe_report(report, max_uploads=10):
+    """Resumen en texto de un reporte del índice (para Telegram)"""
+    icon = '✅' if report['status'] == 'completed' else '❌'
+    lines = [
+        f"📄 Reporte del trabajo {report['job_id']}",
+        f"Revista: {report['journal_id']} ({report['host']}) / envío {report['submission_id'] or '-'}",
+        f"Fecha: {report['created_at'][:19].replace('T', ' ')}  {icon} {report['status']}",
+        f"Archivos: {report['files']} ({report['bytes']:,} bytes)",
+    ]
+    uploads = []
+    try:
+        for record in read_manifest(report['manifest']):
+            if record['type'] == 'upload' and record.get('status') == 'uploaded':
+                uploads.append(record)
+                if len(uploads) >= max_uploads:
+                    break
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"⚠️ No se pudo leer el manifiesto {report['manifest']}: {str(e)}")
+    if uploads:
+        lines.append("Subidos:")
+        lines.extend(f"  • {record['file']} ({record.get('size') or 0:,} bytes)" for record in uploads)
+    lines.append(f"Manifiesto: {report['manifest']}")
+    if report.get('report_file'):
+        lines.append(f"Reporte TXT: {report['report_file']}")
+    return "\n".join(lines)
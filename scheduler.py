@@ -0,0 +1,144 @@
+"""
+Planificador de trabajos de subida
+
+Decide qué trabajo en cola arranca cuando queda libre un worker:
+
+- Reparto justo ponderado entre dueños (usuario de Telegram / token de la
+  API): se atiende primero al dueño que menos servicio (bytes / peso) ha
+  recibido en la última ventana.
+- Dentro de un dueño, el trabajo más corto primero según el tamaño
+  estimado con peticiones HEAD previas.
+- Envejecimiento: la espera descuenta tamaño (aging_rate bytes por segundo)
+  y pasado max_wait el trabajo va primero, así nada se queda sin atender.
+- Como mucho per_host_limit trabajos simultáneos contra un mismo host OJS.
+
+La cola vive en la base compartida (storage.JobStore.claim), así que la
+política y los límites se aplican entre todas las instancias.
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tamaño supuesto de un enlace sin Content-Length (o antes del HEAD)
+DEFAULT_LINK_SIZE = 5 * 1024 * 1024
+# Coste mínimo por trabajo: login + descubrimiento también cuestan
+MIN_JOB_COST = 1024 * 1024
+
+SCHEDULER_WAIT = metrics.REGISTRY.histogram(
+    'upload_scheduler_wait_seconds',
+    'Tiempo en cola antes de arrancar un trabajo',
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+
+
+def job_host(url):
+    """Host OJS de un trabajo (clave del límite de concurrencia)"""
+    return urlsplit(url or '').netloc.lower() or (url or '')
+
+
+def initial_cost(links=(), known_size=None):
+    """Coste de un trabajo antes (o en lugar) de la estimación con HEAD"""
+    cost = known_size if known_size is not None else len(links) * DEFAULT_LINK_SIZE
+    return max(MIN_JOB_COST, cost)
+
+
+def parse_weights(text):
+    """Pesos por dueño desde JSON ({"admin": 2, "telegram:123": 0.5}); {} si no hay o no es válido
+
+    Los dueños sin peso cuentan como 1.0; los pesos no positivos se ignoran.
+    """
+    if not text:
+        return {}
+    try:
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("se esperaba un objeto {dueño: peso}")
+        weights = {str(owner): float(weight) for owner, weight in data.items()}
+    except (TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Pesos del planificador no válidos, se ignoran: {str(e)}")
+        return {}
+    invalid = [owner for owner, weight in weights.items() if weight <= 0]
+    if invalid:
+        logger.warning(f"⚠️ Pesos no positivos ignorados: {', '.join(invalid)}")
+    return {owner: weight for owner, weight in weights.items() if weight > 0}
+
+
+def preflight_size(links, session=None, timeout=5):
+    """Tamaño estimado de los enlaces con HEAD (DEFAULT_LINK_SIZE si no se sabe)"""
+    import requests
+
+    session = session or requests
+    total = 0
+    for url in links:
+        size = None
+        try:
+            response = session.head(url, allow_redirects=True, timeout=timeout)
+            if response.ok:
+                size = int(response.headers.get('Content-Length') or 0) or None
+        except (requests.RequestException, ValueError):
+            pass
+        total += size if size is not None else DEFAULT_LINK_SIZE
+    return total
+
+
+class JobScheduler:
+    """Política de orden: reparto justo, más corto primero, envejecimiento y límite por host"""
+
+    def __init__(self, per_host_limit=2, weights=None, aging_rate=10 * 1024 * 1024, max_wait=600,
+                 preflight_workers=4):
+        self.per_host_limit = per_host_limit
+        self.weights = dict(weights or {})
+        self.aging_rate = aging_rate
+        self.max_wait = max_wait
+        self.preflight_workers = preflight_workers
+        self._preflight = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def priority(self, candidate, service, now):
+        """Menor es antes: (vencido, servicio del dueño, tamaño envejecido, llegada)"""
+        waited = now - candidate['queued_at']
+        if waited >= self.max_wait:
+            return (0, -waited, 0, candidate['queued_at'])
+        weight = self.weights.get(candidate['owner'], 1.0)
+        served = (service.get(candidate['owner']) or 0) / weight
+        aged_cost = (candidate['cost'] or MIN_JOB_COST) - waited * self.aging_rate
+        return (1, served, aged_cost, candidate['queued_at'])
+
+    def choose(self, candidates, running, service, now):
+        """Mejor candidato cuyo host tenga hueco, o None
+
+        candidates: dicts con owner, host, cost y queued_at (epoch);
+        running: trabajos vivos por host; service: bytes servidos por dueño.
+        """
+        eligible = [c for c in candidates if running.get(c['host'], 0) < self.per_host_limit]
+        if not eligible:
+            return None
+        chosen = min(eligible, key=lambda c: self.priority(c, service, now))
+        SCHEDULER_WAIT.observe(max(0.0, now - chosen['queued_at']))
+        return chosen
+
+    # ==================== ESTIMACIÓN ====================
+    def estimate(self, links, on_done):
+        """Estimar en segundo plano el tamaño de los enlaces; on_done(bytes)"""
+        with self._lock:
+            if self._preflight is None:
+                self._preflight = ThreadPoolExecutor(max_workers=self.preflight_workers,
+                                                     thread_name_prefix="preflight")
+                import requests
+
+                self._session = requests.Session()
+        self._preflight.submit(self._estimate, list(links), on_done)
+
+    def _estimate(self, links, on_done):
+        try:
+            on_done(max(MIN_JOB_COST, preflight_size(links, self._session)))
+        except Exception as e:
+            logger.warning(f"⚠️ Error estimando tamaño: {str(e)}")
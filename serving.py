@@ -0,0 +1,162 @@
+"""
+Servidor de producción: gunicorn lanzado desde Python (python main.py serve)
+
+La app se precarga en el master y los workers (gthread) se crean con fork;
+los hilos de fondo (subidas, updates, dispatcher) arrancan de forma
+perezosa en cada worker. El número de workers se calcula a partir de las
+CPUs y la memoria disponibles (respetando los límites de cgroup) y se
+puede fijar con variables de entorno.
+
+Señales del master: HUP recarga los workers de forma ordenada (con
+GUNICORN_PRELOAD=0 también recarga el código), TERM apaga esperando a las
+peticiones en curso.
+"""
+
+import logging
+import os
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Memoria que se reserva por worker al calcular cuántos caben
+WORKER_MEMORY = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 200)) * MB
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs utilizables: afinidad del proceso y cuota de cgroup (v2 o v1)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota, period = None, None
+    cpu_max = _read('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        value, _, per = cpu_max.partition(' ')
+        if value != 'max':
+            quota, period = int(value), int(per or 100000)
+    else:
+        value = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        if value and int(value) > 0:
+            quota, period = int(value), int(_read('/sys/fs/cgroup/cpu/cpu.cfs_period_us') or 100000)
+    if quota:
+        cpus = min(cpus, max(1, quota // period))
+    return cpus
+
+
+def available_memory():
+    """Memoria utilizable en bytes: la menor entre el límite de cgroup y la del sistema"""
+    limits = []
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = _read(path)
+        if value and value.isdigit():
+            limits.append(int(value))
+    meminfo = _read('/proc/meminfo') or ''
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            limits.append(int(line.split()[1]) * 1024)
+            break
+    return min(limits) if limits else None
+
+
+def auto_workers(cpus=None, memory=None):
+    """Workers = 2 × CPUs + 1, limitado por la memoria disponible"""
+    cpus = cpus or available_cpus()
+    workers = 2 * cpus + 1
+    memory = memory if memory is not None else available_memory()
+    if memory:
+        workers = min(workers, memory // WORKER_MEMORY)
+    return max(1, workers)
+
+
+def server_options():
+    """Opciones de gunicorn a partir del entorno"""
+    workers = int(os.environ.get('GUNICORN_WORKERS') or 0) or auto_workers()
+    return {
+        'bind': os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', 5000)}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        # Webhooks y API esperan sobre todo red y SQLite: varios hilos por worker
+        'threads': int(os.environ.get('GUNICORN_THREADS', 4)),
+        # Colas cortas: con los hilos ocupados el exceso se rechaza pronto en lugar de esperar
+        # minutos (worker_connections cuenta también las conexiones keep-alive del proxy)
+        'worker_connections': int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100)),
+        'backlog': int(os.environ.get('GUNICORN_BACKLOG', 64)),
+        'preload_app': os.environ.get('GUNICORN_PRELOAD', '1') != '0',
+        # Mayor que el timeout de inactividad del proxy para no cortar conexiones reutilizadas
+        'keepalive': int(os.environ.get('GUNICORN_KEEPALIVE', 75)),
+        'timeout': int(os.environ.get('GUNICORN_TIMEOUT', 120)),
+        'graceful_timeout': int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30)),
+        'max_requests': int(os.environ.get('GUNICORN_MAX_REQUESTS', 0)),
+        'max_requests_jitter': int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0)),
+        'accesslog': os.environ.get('GUNICORN_ACCESS_LOG') or None,
+        'errorlog': '-',
+        'loglevel': os.environ.get('GUNICORN_LOG_LEVEL', 'info'),
+        'when_ready': when_ready,
+        'worker_exit': worker_exit,
+        'on_exit': on_exit,
+    }
+
+
+# ==================== HOOKS ====================
+def when_ready(server):
+    """Señal de disponibilidad: log y archivo READY_FILE (si se configura)"""
+    ready_file = os.environ.get('READY_FILE')
+    if ready_file:
+        with open(ready_file, 'w') as f:
+            f.write(str(os.getpid()))
+    server.log.info(f"✅ Listo: {server.cfg.workers} workers × {server.cfg.threads} hilos en "
+                    f"{', '.join(server.cfg.bind)}")
+
+
+def worker_exit(server, worker):
+    """Al salir un worker, esperar a sus subidas (lo pendiente lo retoma otra instancia)"""
+    from app import job_manager
+
+    job_manager.stop(timeout=max(1, server.cfg.graceful_timeout - 5))
+
+
+def on_exit(server):
+    ready_file = os.environ.get('READY_FILE')
+    if ready_file and os.path.exists(ready_file):
+        os.remove(ready_file)
+
+
+class BotApplication(BaseApplication):
+    """Aplicación gunicorn para app:app"""
+
+    def __init__(self, options=None):
+        self.options = options or server_options()
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        # Con preload se ejecuta una vez en el master y los workers lo heredan
+        from app import app, initialize
+
+        initialize()
+        return app
+
+
+def serve(options=None):
+    """Arrancar gunicorn (bloquea hasta el apagado)"""
+    application = BotApplication(options)
+    logger.info(f"🚀 gunicorn: {application.options['workers']} workers, "
+                f"{application.options['threads']} hilos, preload={application.options['preload_app']}")
+    application.run()
+    return 0
@@ -1,7 +1,3 @@
-mkdir server
-python3 -m http.server -d server &
-python3 main.py
-
 #!/bin/bash
 echo "🚀 Iniciando Bot OJS Uploader en Render..."
 echo "=========================================="
@@ -9,7 +5,6 @@ echo "=========================================="
 # Crear directorios necesarios
 echo "📁 Creando estructura de directorios..."
 mkdir -p templates static/css config
-mkdir -p server
 
 # Verificar que existen los templates básicos
 if [ ! -f "templates/index.html" ]; then
@@ -84,15 +79,10 @@ print('Configuración admin creada')
     "
 fi
 
-# Iniciar servidor HTTP estático en segundo plano (opcional)
-echo "🌐 Iniciando servidor HTTP estático en puerto 8080..."
-python3 -m http.server 8080 -d server > /dev/null 2>&1 &
-HTTP_PID=$!
-echo "✅ Servidor HTTP iniciado (PID: $HTTP_PID) en: http://localhost:8080"
-
-# Iniciar la aplicación Flask principal
+# Reportes y chunks se descargan desde Flask (/api/artifacts/...), sin servidor estático aparte
+# Iniciar la aplicación Flask principal con gunicorn (workers según CPU y memoria)
 echo "🚀 Iniciando aplicación Flask en puerto \$PORT..."
-python3 app.py &
+python3 main.py serve &
 FLASK_PID=$!
 echo "✅ Flask iniciado (PID: $FLASK_PID)"
 
@@ -124,7 +114,6 @@ echo ""
 cleanup() {
     echo ""
     echo "🛑 Deteniendo todos los servicios..."
-    kill $HTTP_PID 2>/dev/null
     kill $FLASK_PID 2>/dev/null
     kill $TELEGRAM_PID 2>/dev/null
     echo "✅ Servicios detenidos"
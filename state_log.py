@@ -0,0 +1,183 @@
+"""
+Estado de ejecución en un log de solo anexado (JSON lines)
+
+Para datos que cambian a menudo (última notificación, chat ids, contadores)
+sin reescribir los archivos de configuración estática. Las escrituras se
+acumulan en memoria y se vuelcan juntas; el log se compacta al crecer.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+
+from config_manager import file_lock, freeze
+
+logger = logging.getLogger(__name__)
+
+
+class StateLog:
+    """Almacén clave-valor respaldado por un log de solo anexado
+
+    Registros: {"k": clave, "v": valor} (asignación) o {"k": clave, "d": n}
+    (incremento). Varios procesos pueden compartir el archivo: los anexados
+    y la compactación se hacen bajo file_lock y cada lector sigue el archivo
+    desde su último offset.
+    """
+
+    def __init__(self, path, flush_interval=2.0, max_pending=50, compact_bytes=256 * 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.compact_bytes = compact_bytes
+        self.version = 0
+        self._state = {}            # Estado reconstruido desde el archivo
+        self._pending_sets = {}     # Asignaciones aún no escritas
+        self._pending_incr = {}     # Incrementos aún no escritos
+        self._snapshot = None
+        self._offset = 0
+        self._inode = None
+        self._timer = None
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    # ==================== LECTURA ====================
+    def _apply(self, record):
+        key = record.get('k')
+        if key is None:
+            return
+        if 'd' in record:
+            self._state[key] = self._state.get(key, 0) + record['d']
+        else:
+            self._state[key] = record.get('v')
+
+    def _refresh(self):
+        """Leer registros nuevos del archivo (o recargar si fue compactado)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Archivo nuevo o compactado por otro proceso: recargar completo
+            self._state = {}
+            self._offset = 0
+            self._inode = stat.st_ino
+        elif stat.st_size == self._offset:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+
+        # Ignorar una última línea incompleta (anexado en curso)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Registro inválido en {self.path}")
+        if end:
+            self._offset += end
+            self._changed()
+
+    def _changed(self):
+        self._snapshot = None
+        self.version += 1
+
+    def snapshot(self):
+        """Estado actual, incluidos cambios no volcados (instantánea inmutable)"""
+        with self._lock:
+            self._refresh()
+            if self._snapshot is None:
+                state = dict(self._state)
+                state.update(self._pending_sets)
+                for key, amount in self._pending_incr.items():
+                    state[key] = state.get(key, 0) + amount
+                self._snapshot = freeze(state)
+            return self._snapshot
+
+    def get(self, key, default=None):
+        return self.snapshot().get(key, default)
+
+    # ==================== ESCRITURA ====================
+    def set(self, key, value):
+        """Asignar un valor (se persiste en el próximo volcado)"""
+        with self._lock:
+            self._pending_sets[key] = value
+            self._changed()
+            self._schedule_flush()
+
+    def incr(self, key, amount=1):
+        """Incrementar un contador"""
+        with self._lock:
+            self._pending_incr[key] = self._pending_incr.get(key, 0) + amount
+            self._changed()
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if len(self._pending_sets) + len(self._pending_incr) >= self.max_pending:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Anexar los cambios pendientes como un solo bloque de registros"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending_sets and not self._pending_incr:
+                return
+
+            records = [{'k': key, 'v': value} for key, value in self._pending_sets.items()]
+            records += [{'k': key, 'd': amount} for key, amount in self._pending_incr.items()]
+            payload = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with file_lock(self.path):
+                    # Incorporar lo que otros procesos anexaron antes que nosotros
+                    self._refresh()
+                    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    try:
+                        os.write(fd, payload.encode('utf-8'))
+                    finally:
+                        os.close(fd)
+
+                    # Nadie más escribe mientras tenemos el lock: aplicar lo propio
+                    for record in records:
+                        self._apply(record)
+                    stat = os.stat(self.path)
+                    self._inode = stat.st_ino
+                    self._offset = stat.st_size
+                    self._pending_sets = {}
+                    self._pending_incr = {}
+                    self._changed()
+
+                    if stat.st_size > self.compact_bytes:
+                        self._compact()
+            except OSError as e:
+                # Los cambios siguen pendientes para el próximo volcado
+                logger.error(f"❌ Error escribiendo {self.path}: {e}")
+
+    def _compact(self):
+        """Reescribir el log con un registro por clave (llamar con file_lock tomado)"""
+        tmp_path = f"{self.path}.compact"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, value in self._state.items():
+                f.write(json.dumps({'k': key, 'v': value}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+        logger.info(f"🗜️ Log de estado compactado: {self.path} ({stat.st_size:,} bytes)")
@@ -0,0 +1,632 @@
+"""
+Almacenamiento SQLite (modo WAL) para revistas e historial de trabajos
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from config_manager import freeze
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS journals (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    host TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_journals_host ON journals(host);
+CREATE INDEX IF NOT EXISTS idx_journals_created ON journals(created_at, id);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    journal_id TEXT,
+    submission_id TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    report_file TEXT,
+    error TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_journal ON jobs(journal_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+
+CREATE TABLE IF NOT EXISTS reports (
+    job_id TEXT PRIMARY KEY,
+    journal_id TEXT,
+    submission_id TEXT,
+    host TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    manifest TEXT,
+    report_file TEXT,
+    rotation INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reports_submission ON reports(journal_id, submission_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_submission_any ON reports(submission_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_reports_created ON reports(created_at);
+
+CREATE TABLE IF NOT EXISTS telegram_updates (
+    update_id INTEGER PRIMARY KEY,
+    received_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_received ON telegram_updates(received_at);
+
+-- Instantáneas por proceso, con clave host:pid (varios hosts pueden compartir la base)
+CREATE TABLE IF NOT EXISTS process_metrics (
+    instance TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+DROP TABLE IF EXISTS metrics_snapshots;
+"""
+
+# Columnas añadidas después de la primera versión del esquema: se crean con
+# ALTER TABLE en bases existentes y después se aplican sus índices
+COLUMNS = {
+    'jobs': [
+        ('idempotency_key', 'TEXT'),
+        # Cola compartida entre instancias (ver JobStore.claim)
+        ('host', 'TEXT'),
+        ('owner', 'TEXT'),
+        ('cost', 'INTEGER'),
+        ('queued_at', 'REAL'),
+        ('spec', 'TEXT'),
+        ('lease_owner', 'TEXT'),
+        ('lease_expires', 'REAL'),
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ],
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs(idempotency_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner_started ON jobs(owner, started_at);
+"""
+
+
+class Database:
+    """Base SQLite con una conexión por hilo (y por proceso, tras fork)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        """Conexión del hilo actual, creada bajo demanda"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._add_columns(conn)
+                conn.executescript(INDEXES)
+                self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _add_columns(conn):
+        """Añadir a tablas existentes las columnas que falten"""
+        for table, columns in COLUMNS.items():
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns:
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    except sqlite3.OperationalError as e:
+                        # Otro proceso pudo añadirla al mismo tiempo
+                        if 'duplicate column' not in str(e):
+                            raise
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Transacción explícita; immediate=True toma el lock de escritura al empezar
+
+        Dentro de otra transacción del mismo hilo no abre una nueva: las
+        operaciones pasan a formar parte de la exterior.
+        """
+        conn = self.connect()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        return self.connect().execute(sql, params)
+
+    def get_meta(self, key, default=None):
+        row = self.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value, conn=None):
+        (conn or self.connect()).execute(
+            "INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+
+class JournalStore:
+    """Registro de revistas con búsqueda indexada por id y host"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _row_to_config(row):
+        config = json.loads(row['data'])
+        config['id'] = row['id']
+        return freeze(config)
+
+    @staticmethod
+    def _normalize_host(host):
+        return (host or '').strip().rstrip('/')
+
+    def get(self, journal_id):
+        """Configuración de una revista (instantánea inmutable) o None"""
+        row = self.db.execute("SELECT id, data FROM journals WHERE id = ?", (journal_id,)).fetchone()
+        return self._row_to_config(row) if row else None
+
+    def list(self, offset=0, limit=None):
+        """Listado paginado, en orden de creación"""
+        limit = -1 if limit is None else int(limit)
+        rows = self.db.execute(
+            "SELECT id, data FROM journals ORDER BY created_at, id LIMIT ? OFFSET ?",
+            (limit, int(offset))
+        ).fetchall()
+        return [self._row_to_config(row) for row in rows]
+
+    def count(self):
+        """Número de revistas (sin materializar ninguna)"""
+        return self.db.execute("SELECT COUNT(*) FROM journals").fetchone()[0]
+
+    def find_by_host(self, host):
+        """Revistas configuradas para un host"""
+        rows = self.db.execute(
+            "SELECT id, data FROM journals WHERE host = ? ORDER BY created_at, id",
+            (self._normalize_host(host),)
+        ).fetchall()
+        return [self._row_to_config(row) for row in rows]
+
+    def _insert(self, conn, journal_id, config):
+        conn.execute(
+            "INSERT OR IGNORE INTO journals(id, name, host, data, created_at, updated_at) VALUES(?, ?, ?, ?, ?, ?)",
+            (journal_id, config.get('name', ''), self._normalize_host(config.get('host')),
+             json.dumps(config, ensure_ascii=False),
+             config.get('created_at') or datetime.now().isoformat(),
+             config.get('updated_at') or datetime.now().isoformat())
+        )
+
+    def add(self, config):
+        """Agregar revista; devuelve su ID"""
+        journal_id = config.get('id') or str(uuid.uuid4())[:8]
+        config['id'] = journal_id
+        config.setdefault('created_at', datetime.now().isoformat())
+        config.setdefault('updated_at', datetime.now().isoformat())
+        with self.db.transaction(immediate=True) as conn:
+            self._insert(conn, journal_id, config)
+        return journal_id
+
+    def update(self, journal_id, updates):
+        """Actualizar campos de una revista (read-modify-write atómico)"""
+        with self.db.transaction(immediate=True) as conn:
+            row = conn.execute("SELECT data FROM journals WHERE id = ?", (journal_id,)).fetchone()
+            if not row:
+                return False
+            config = json.loads(row['data'])
+            config.update(updates)
+            config['id'] = journal_id
+            config['updated_at'] = datetime.now().isoformat()
+            conn.execute(
+                "UPDATE journals SET name = ?, host = ?, data = ?, updated_at = ? WHERE id = ?",
+                (config.get('name', ''), self._normalize_host(config.get('host')),
+                 json.dumps(config, ensure_ascii=False), config['updated_at'], journal_id)
+            )
+        return True
+
+    def delete(self, journal_id):
+        """Eliminar revista"""
+        with self.db.transaction(immediate=True) as conn:
+            cursor = conn.execute("DELETE FROM journals WHERE id = ?", (journal_id,))
+        return cursor.rowcount > 0
+
+    def migrate_from_json(self, json_path):
+        """Importar una sola vez el antiguo journals.json y renombrarlo a .migrated"""
+        if self.db.get_meta('journals_migrated') or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                journals = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"❌ No se pudo leer {json_path} para migrar: {e}")
+            return 0
+
+        imported = 0
+        with self.db.transaction(immediate=True) as conn:
+            # Otro proceso pudo migrar mientras esperábamos el lock
+            row = conn.execute("SELECT value FROM meta WHERE key = 'journals_migrated'").fetchone()
+            if row:
+                return 0
+            for journal_id, config in journals.items():
+                if journal_id.startswith('_') or not isinstance(config, dict):
+                    continue
+                config = dict(config, id=journal_id)
+                self._insert(conn, journal_id, config)
+                imported += 1
+            self.db.set_meta('journals_migrated', datetime.now().isoformat(), conn)
+
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except OSError:
+            pass
+        logger.info(f"📦 Migradas {imported} revistas de {json_path} a SQLite")
+        return imported
+
+
+class JobStore:
+    """Historial persistente de trabajos de subida y cola compartida entre instancias
+
+    Un trabajo en cola (status 'queued') lo reclama una instancia con claim(),
+    que le asigna un lease; la instancia lo renueva con heartbeat() mientras
+    lo ejecuta. Si la instancia cae, el lease vence y otra lo reclama.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def save(self, job_data, lease_owner=None):
+        """Insertar o actualizar un trabajo a partir de su representación dict
+
+        Con lease_owner solo se actualiza si la instancia conserva el lease
+        (un trabajo reclamado por otra no se pisa); devuelve False si no.
+        """
+        cursor = self.db.execute(
+            """INSERT INTO jobs(id, journal_id, submission_id, status, created_at, started_at,
+                                finished_at, report_file, error, idempotency_key, data)
+               VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET
+                   status = excluded.status, started_at = excluded.started_at,
+                   finished_at = excluded.finished_at, report_file = excluded.report_file,
+                   error = excluded.error, data = excluded.data
+               WHERE ? IS NULL OR jobs.lease_owner = ?""",
+            (job_data['job_id'], job_data.get('journal_id'), job_data.get('submission_id'),
+             job_data['status'], job_data['created_at'], job_data.get('started_at'),
+             job_data.get('finished_at'), job_data.get('report_file'), job_data.get('error'),
+             job_data.get('idempotency_key'), json.dumps(job_data, ensure_ascii=False),
+             lease_owner, lease_owner)
+        )
+        return cursor.rowcount > 0
+
+    # ==================== COLA ====================
+    def enqueue(self, job_data, spec, host, owner, cost):
+        """Guardar un trabajo nuevo como pendiente de reclamar"""
+        with self.db.transaction() as conn:
+            self.save(job_data)
+            conn.execute(
+                """UPDATE jobs SET host = ?, owner = ?, cost = ?, queued_at = ?, spec = ?,
+                                   lease_owner = NULL, lease_expires = NULL
+                   WHERE id = ?""",
+                (host, owner, cost, time.time(), json.dumps(spec, ensure_ascii=False), job_data['job_id'])
+            )
+
+    def set_cost(self, job_id, cost):
+        """Actualizar el tamaño estimado de un trabajo aún en cola"""
+        self.db.execute("UPDATE jobs SET cost = ? WHERE id = ? AND status = 'queued'", (cost, job_id))
+
+    def claim(self, instance_id, lease_seconds, choose, max_attempts=3, service_window=3600):
+        """Reclamar el siguiente trabajo según `choose`; devuelve la fila (dict) o None
+
+        Candidatos: en cola o con lease vencido. `choose(candidates, running,
+        service, now)` recibe también los trabajos vivos por host y el coste
+        servido por dueño en la ventana, calculados en la misma transacción.
+        """
+        now = time.time()
+        with self.db.transaction(immediate=True) as conn:
+            # Trabajos de instancias caídas demasiadas veces: fallidos
+            conn.execute(
+                """UPDATE jobs SET status = 'failed', lease_owner = NULL,
+                                   error = 'Lease vencido demasiadas veces',
+                                   data = json_set(data, '$.status', 'failed',
+                                                   '$.error', 'Lease vencido demasiadas veces')
+                   WHERE status = 'running' AND lease_expires < ? AND attempts >= ?""",
+                (now, max_attempts)
+            )
+            running = {row['host']: row['n'] for row in conn.execute(
+                """SELECT host, COUNT(*) AS n FROM jobs
+                   WHERE status = 'running' AND lease_expires >= ? GROUP BY host""", (now,)
+            )}
+            candidates = [dict(row) for row in conn.execute(
+                """SELECT id, owner, host, cost, queued_at, attempts, spec FROM jobs
+                   WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)
+                   ORDER BY queued_at LIMIT 1000""", (now,)
+            )]
+            if not candidates:
+                return None
+            owners = {c['owner'] for c in candidates}
+            cutoff = datetime.fromtimestamp(now - service_window).isoformat()
+            service = {row['owner']: row['served'] for row in conn.execute(
+                f"""SELECT owner, SUM(cost) AS served FROM jobs
+                    WHERE started_at >= ? AND owner IN ({','.join('?' * len(owners))})
+                    GROUP BY owner""", (cutoff, *owners)
+            )}
+
+            chosen = choose(candidates, running, service, now)
+            if chosen is None:
+                return None
+            conn.execute(
+                """UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?,
+                                   attempts = attempts + 1, started_at = ?
+                   WHERE id = ?""",
+                (instance_id, now + lease_seconds, datetime.now().isoformat(), chosen['id'])
+            )
+            chosen['attempts'] += 1
+            return chosen
+
+    def heartbeat(self, job_ids, instance_id, lease_seconds):
+        """Renovar los leases de la instancia; devuelve los ids que ya no le pertenecen"""
+        lost = []
+        expires = time.time() + lease_seconds
+        for job_id in job_ids:
+            cursor = self.db.execute(
+                """UPDATE jobs SET lease_expires = ?
+                   WHERE id = ? AND lease_owner = ? AND status = 'running'""",
+                (expires, job_id, instance_id)
+            )
+            if cursor.rowcount == 0:
+                lost.append(job_id)
+        return lost
+
+    def finish(self, job_data, instance_id):
+        """Guardar el estado final y liberar el lease (si aún es de la instancia)"""
+        with self.db.transaction():
+            if not self.save(job_data, lease_owner=instance_id):
+                return False
+            self.db.execute("UPDATE jobs SET lease_owner = NULL, lease_expires = NULL WHERE id = ?",
+                            (job_data['job_id'],))
+            return True
+
+    def queued_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def get(self, job_id):
+        row = self.db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return freeze(json.loads(row['data'])) if row else None
+
+    def find_by_idempotency_key(self, key, since):
+        """Último trabajo no fallido con esa clave creado desde `since` (ISO) o None"""
+        row = self.db.execute(
+            """SELECT data FROM jobs
+               WHERE idempotency_key = ? AND created_at >= ? AND status != 'failed'
+               ORDER BY created_at DESC LIMIT 1""",
+            (key, since)
+        ).fetchone()
+        return freeze(json.loads(row['data'])) if row else None
+
+    def list(self, journal_id=None, offset=0, limit=50):
+        """Trabajos más recientes primero (opcionalmente de una revista)"""
+        if journal_id:
+            rows = self.db.execute(
+                "SELECT data FROM jobs WHERE journal_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (journal_id, int(limit), int(offset))
+            ).fetchall()
+        else:
+            rows = self.db.execute(
+                "SELECT data FROM jobs ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (int(limit), int(offset))
+            ).fetchall()
+        return [freeze(json.loads(row['data'])) for row in rows]
+
+    def count(self, status=None):
+        if status:
+            return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+        return self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+class ReportStore:
+    """Índice de reportes y manifiestos por revista, envío y fecha (ver reports.py)
+
+    rotation: 0 archivos originales, 1 comprimiéndose (reclamado por un
+    proceso), 2 comprimidos con gzip.
+    """
+
+    FIELDS = ('job_id', 'journal_id', 'submission_id', 'host', 'status', 'created_at', 'files', 'bytes',
+              'manifest', 'report_file', 'rotation')
+
+    def __init__(self, db):
+        self.db = db
+
+    def add(self, record):
+        """Registrar (o reemplazar, si el trabajo se reintentó) el reporte de un trabajo"""
+        values = [record.get(field) for field in self.FIELDS[:-1]]
+        self.db.execute(
+            f"""INSERT OR REPLACE INTO reports({', '.join(self.FIELDS)})
+                VALUES({', '.join('?' * len(self.FIELDS))})""",
+            (*values, 0)
+        )
+
+    def latest(self, submission_id, journal_id=None):
+        """Último reporte de un envío (de una revista, si se indica) o None"""
+        if journal_id:
+            row = self.db.execute(
+                """SELECT * FROM reports WHERE journal_id = ? AND submission_id = ?
+                   ORDER BY created_at DESC LIMIT 1""",
+                (journal_id, str(submission_id))
+            ).fetchone()
+        else:
+            row = self.db.execute(
+                "SELECT * FROM reports WHERE submission_id = ? ORDER BY created_at DESC LIMIT 1",
+                (str(submission_id),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, journal_id=None, submission_id=None, since=None, until=None, limit=20):
+        """Reportes más recientes primero, filtrados por revista, envío y rango de fechas (ISO)"""
+        conditions, params = [], []
+        for column, value in (('journal_id', journal_id), ('submission_id', submission_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(str(value))
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(
+            f"SELECT * FROM reports {where} ORDER BY created_at DESC LIMIT ?", (*params, int(limit))
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # ==================== ROTACIÓN ====================
+    def claim_rotation(self, before, limit=100):
+        """Reportes anteriores a `before` sin comprimir, reclamados por este proceso"""
+        claimed = []
+        rows = self.db.execute(
+            "SELECT * FROM reports WHERE rotation = 0 AND created_at < ? ORDER BY created_at LIMIT ?",
+            (before, int(limit))
+        ).fetchall()
+        for row in rows:
+            cursor = self.db.execute("UPDATE reports SET rotation = 1 WHERE job_id = ? AND rotation = 0",
+                                     (row['job_id'],))
+            if cursor.rowcount:
+                claimed.append(dict(row))
+        return claimed
+
+    def set_rotated(self, job_id, manifest, report_file, rotation=2):
+        self.db.execute(
+            "UPDATE reports SET manifest = ?, report_file = ?, rotation = ? WHERE job_id = ?",
+            (manifest, report_file, rotation, job_id)
+        )
+
+    def expired(self, before, limit=100):
+        rows = self.db.execute(
+            "SELECT * FROM reports WHERE created_at < ? ORDER BY created_at LIMIT ?", (before, int(limit))
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, job_id):
+        self.db.execute("DELETE FROM reports WHERE job_id = ?", (job_id,))
+
+
+class UpdateStore:
+    """update_id de Telegram ya recibidos, compartidos entre procesos
+
+    Telegram reentrega un update durante como mucho 24 horas, así que los
+    ids más antiguos se purgan cada `prune_every` reclamaciones.
+    """
+
+    def __init__(self, db, max_age=86400, prune_every=1000):
+        self.db = db
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._claims = 0
+        self._lock = threading.Lock()
+
+    def claim(self, update_id):
+        """Registrar un update; False si otro proceso (o este) ya lo recibió"""
+        now = time.time()
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO telegram_updates(update_id, received_at) VALUES(?, ?)",
+            (int(update_id), now)
+        )
+        with self._lock:
+            self._claims += 1
+            prune = self._claims % self.prune_every == 0
+        if prune:
+            self.prune(now - self.max_age)
+        return cursor.rowcount == 1
+
+    def prune(self, before):
+        return self.db.execute("DELETE FROM telegram_updates WHERE received_at < ?", (before,)).rowcount
+
+
+class MetricsStore:
+    """Instantáneas de métricas por proceso (ver metrics.SharedMetrics)
+
+    La fila RETIRED acumula las de procesos que dejaron de publicar. Leer
+    es una consulta simple; solo los procesos que publican escriben.
+    """
+
+    RETIRED = 'retired'
+
+    def __init__(self, db):
+        self.db = db
+
+    def save(self, instance, data):
+        self.db.execute(
+            "INSERT OR REPLACE INTO process_metrics(instance, updated_at, data) VALUES(?, ?, ?)",
+            (instance, time.time(), data)
+        )
+
+    def snapshots(self):
+        """Todas las instantáneas: [(instancia, updated_at, dict)]"""
+        rows = self.db.execute("SELECT instance, updated_at, data FROM process_metrics").fetchall()
+        return [(row['instance'], row['updated_at'], json.loads(row['data'])) for row in rows]
+
+    def retire(self, before, fold):
+        """Plegar con fold() en la fila RETIRED las instantáneas anteriores a `before`"""
+        stale = self.db.execute(
+            "SELECT 1 FROM process_metrics WHERE instance != ? AND updated_at < ? LIMIT 1",
+            (self.RETIRED, before)
+        ).fetchone()
+        if stale is None:
+            return 0
+        with self.db.transaction(immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT instance, data FROM process_metrics WHERE instance = ? OR updated_at < ?",
+                (self.RETIRED, before)
+            ).fetchall()
+            stale = [row['instance'] for row in rows if row['instance'] != self.RETIRED]
+            if not stale:
+                return 0
+            retired = fold({row['instance']: json.loads(row['data']) for row in rows})
+            conn.execute(
+                "INSERT OR REPLACE INTO process_metrics(instance, updated_at, data) VALUES(?, ?, ?)",
+                (self.RETIRED, time.time(), json.dumps(retired, separators=(',', ':')))
+            )
+            conn.executemany("DELETE FROM process_metrics WHERE instance = ?", [(i,) for i in stale])
+            return len(stale)
@@ -0,0 +1,108 @@
+"""
+Cuerpos de petición en streaming
+
+MultipartStream arma un multipart/form-data que se lee por bloques: el
+contenido del archivo se copia desde su origen (archivo local o respuesta
+HTTP) a la conexión sin cargarlo entero en memoria. multipart_envelope da
+las mismas cabeceras y cierre para cuerpos asíncronos (async_uploader).
+"""
+
+import hashlib
+import io
+import uuid
+
+
+def multipart_envelope(boundary, fields, file_field, file_name, content_type='application/octet-stream'):
+    """Bytes que van antes y después del contenido del archivo en el multipart"""
+    head = b''
+    for name, value in (fields or {}).items():
+        head += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode('utf-8')
+    safe_name = file_name.replace('"', '_')
+    head += (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode('utf-8')
+    return head, f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+
+class MultipartStream:
+    """Cuerpo multipart/form-data de tamaño conocido con un único archivo
+
+    requests lo envía por bloques con read() y usa len() para el
+    Content-Length (no hereda de io.IOBase: requests restaría tell()).
+    """
+
+    def __init__(self, fields, file_field, file_name, source, size, content_type='application/octet-stream'):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.size = size
+
+        head, tail = multipart_envelope(self.boundary, fields, file_field, file_name, content_type)
+        self._parts = [io.BytesIO(head), _LimitedReader(source, size), io.BytesIO(tail)]
+        self._length = len(head) + size + len(tail)
+        self._index = 0
+        self.bytes_read = 0
+        self.on_read = None  # callback(bytes_read) por bloque (progreso, shaping)
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        remaining = size
+        while remaining > 0 and self._index < len(self._parts):
+            data = self._parts[self._index].read(remaining)
+            if not data:
+                self._index += 1
+                continue
+            chunks.append(data)
+            remaining -= len(data)
+        data = b''.join(chunks)
+        if data:
+            self.bytes_read += len(data)
+            if self.on_read is not None:
+                self.on_read(len(data))
+        return data
+
+
+class _LimitedReader:
+    """Lee exactamente `size` bytes de `source`; error si el origen se acaba antes"""
+
+    def __init__(self, source, size):
+        self.source = source
+        self.remaining = size
+
+    def read(self, size):
+        if self.remaining <= 0:
+            return b''
+        data = self.source.read(min(size, self.remaining))
+        if not data:
+            raise IOError(f"Origen truncado: faltan {self.remaining:,} bytes")
+        self.remaining -= len(data)
+        return data
+
+
+class HashingReader:
+    """Envuelve un origen con read() y calcula su sha256 a medida que se lee"""
+
+    def __init__(self, source):
+        self.source = source
+        self.sha256 = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        if data:
+            self.sha256.update(data)
+            self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
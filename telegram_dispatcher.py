@@ -0,0 +1,301 @@
+"""
+Despachador único de llamadas salientes a la API de Telegram
+
+Un pool fijo de hilos sobre una sesión HTTP con keep-alive, con límite
+global (30 msg/s) y por chat (1 msg/s), respeta `retry_after` de los 429
+y reintenta errores de red/5xx con backoff exponencial.
+"""
+
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import metrics
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_SEND_RETRIES = metrics.REGISTRY.counter(
+    'telegram_send_retries_total',
+    'Reintentos de llamadas salientes a Telegram (429, 5xx, red)',
+    ('method', 'reason')
+)
+TELEGRAM_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    'telegram_outbound_queue_depth',
+    'Mensajes en cola del despachador de Telegram'
+)
+
+
+class _Request:
+    """Llamada pendiente a la API"""
+
+    __slots__ = ('token', 'method', 'payload', 'chat_key', 'future', 'attempts')
+
+    def __init__(self, token, method, payload, chat_key):
+        self.token = token
+        self.method = method
+        self.payload = payload
+        self.chat_key = chat_key
+        self.future = Future()
+        self.attempts = 0
+
+
+class _ChatQueue:
+    """Cola FIFO de un chat y el momento en que puede volver a enviarse"""
+
+    __slots__ = ('pending', 'next_allowed', 'scheduled', 'in_flight')
+
+    def __init__(self):
+        self.pending = deque()
+        self.next_allowed = 0.0
+        self.scheduled = False
+        self.in_flight = False
+
+
+class TelegramDispatcher:
+    """Cola de salida con pool de workers y token buckets global y por chat"""
+
+    def __init__(self, api_url=None, workers=4, global_rate=30.0, per_chat_interval=1.0,
+                 max_retries=5, timeout=10):
+        self.api_url = (api_url or os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')).rstrip('/')
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.global_bucket = TokenBucket(global_rate)
+        self._cond = threading.Condition()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        """Estado interno (también tras un fork: los hilos no sobreviven)"""
+        self._chats = {}
+        self._ready = []
+        self._seq = itertools.count()
+        self._queued = 0
+        self._in_flight = 0
+        self._stopping = False
+        self._threads = []
+        self.session = None
+
+    def _new_session(self):
+        # requests se importa con el primer envío: no retrasa el arranque
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _ensure_started(self):
+        """Arrancar los workers en el primer uso (por proceso)"""
+        if self._pid == os.getpid() and self._threads:
+            return
+        self._reset()
+        self.session = self._new_session()
+        self._pid = os.getpid()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"telegram-out-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # ==================== API PÚBLICA ====================
+    def call(self, token, method, payload, chat_id=None):
+        """Encolar una llamada a la API; devuelve un Future con la respuesta JSON"""
+        chat_key = str(chat_id if chat_id is not None else payload.get('chat_id', ''))
+        request = _Request(token, method, payload, chat_key)
+        with self._cond:
+            self._ensure_started()
+            if self._stopping:
+                request.future.set_exception(RuntimeError("Despachador detenido"))
+                return request.future
+            chat = self._chats.get(chat_key)
+            if chat is None:
+                chat = self._chats[chat_key] = _ChatQueue()
+            chat.pending.append(request)
+            self._queued += 1
+            TELEGRAM_QUEUE_DEPTH.set(self._queued)
+            self._schedule(chat_key, chat)
+        return request.future
+
+    def send_message(self, token, chat_id, text, parse_mode=None, **extra):
+        """Encolar un sendMessage"""
+        payload = {'chat_id': chat_id, 'text': text}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        payload.update(extra)
+        return self.call(token, 'sendMessage', payload, chat_id)
+
+    def pending(self):
+        """Mensajes en cola o en curso"""
+        with self._cond:
+            return self._queued + self._in_flight
+
+    def flush(self, timeout=None):
+        """Esperar a que se vacíe la cola; False si vence el timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 1.0)
+        return True
+
+    def shutdown(self, timeout=10):
+        """Vaciar la cola (hasta timeout) y detener los workers"""
+        if self._pid != os.getpid() or not self._threads:
+            return
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        if not flushed:
+            logger.warning(f"⚠️ Despachador detenido con {self.pending()} mensajes sin enviar")
+
+    # ==================== PLANIFICACIÓN ====================
+    def _schedule(self, chat_key, chat, not_before=0.0):
+        """Poner el chat en la cola de listos (llamar con _cond tomado)"""
+        if chat.scheduled or chat.in_flight or not chat.pending:
+            return
+        ready_at = max(time.monotonic(), chat.next_allowed, not_before)
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_key))
+        chat.scheduled = True
+        self._cond.notify()
+
+    def _next_request(self):
+        """Tomar la siguiente petición cuyo chat esté listo (bloquea)"""
+        with self._cond:
+            while not self._stopping:
+                if self._ready:
+                    ready_at, _, chat_key = self._ready[0]
+                    wait = ready_at - time.monotonic()
+                    if wait <= 0:
+                        heapq.heappop(self._ready)
+                        chat = self._chats[chat_key]
+                        chat.scheduled = False
+                        chat.in_flight = True
+                        request = chat.pending.popleft()
+                        self._queued -= 1
+                        self._in_flight += 1
+                        TELEGRAM_QUEUE_DEPTH.set(self._queued)
+                        return request
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _finish(self, request, retry_at=None):
+        """Liberar el chat y reprogramarlo; retry_at reencola la petición al frente"""
+        with self._cond:
+            chat = self._chats[request.chat_key]
+            chat.in_flight = False
+            self._in_flight -= 1
+            chat.next_allowed = time.monotonic() + self.per_chat_interval
+            if retry_at is not None:
+                chat.pending.appendleft(request)
+                self._queued += 1
+                chat.next_allowed = max(chat.next_allowed, retry_at)
+            if chat.pending:
+                self._schedule(request.chat_key, chat)
+            elif len(self._chats) > 10000:
+                self._purge_idle()
+            TELEGRAM_QUEUE_DEPTH.set(self._queued)
+            self._cond.notify_all()
+
+    def _purge_idle(self):
+        """Olvidar chats sin mensajes cuyo intervalo ya pasó"""
+        now = time.monotonic()
+        for key in [key for key, chat in self._chats.items()
+                    if not chat.pending and not chat.in_flight and chat.next_allowed < now]:
+            del self._chats[key]
+
+    # ==================== ENVÍO ====================
+    def _worker(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            retry_at = None
+            try:
+                self.global_bucket.acquire()
+                retry_at = self._send(request)
+            except Exception as e:
+                # Un error inesperado no debe matar el worker ni dejar el chat en vuelo
+                metrics.TELEGRAM_SEND_ERRORS.inc(method=request.method)
+                logger.error(f"❌ Error inesperado en Telegram {request.method}: {str(e)}")
+                if not request.future.done():
+                    request.future.set_exception(e)
+            finally:
+                self._finish(request, retry_at)
+
+    def _send(self, request):
+        """Ejecutar la llamada; devuelve el momento de reintento o None si terminó"""
+        import requests
+
+        url = f"{self.api_url}/bot{request.token}/{request.method}"
+        request.attempts += 1
+        try:
+            with metrics.TELEGRAM_SEND_DURATION.time(method=request.method):
+                response = self.session.post(url, json=request.payload, timeout=self.timeout)
+
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                data = {'ok': False, 'description': response.text[:200]}
+
+            if response.status_code == 429:
+                retry_after = (data.get('parameters') or {}).get('retry_after', 1)
+                return self._retry(request, 'rate_limited', retry_after, f"429 retry_after={retry_after}")
+
+            if response.status_code >= 500:
+                return self._retry(request, 'server_error', None, f"HTTP {response.status_code}")
+
+            if not data.get('ok'):
+                metrics.TELEGRAM_SEND_ERRORS.inc(method=request.method)
+                logger.error(f"❌ Telegram {request.method}: {data.get('description')}")
+            request.future.set_result(data)
+            return None
+
+        except requests.RequestException as e:
+            return self._retry(request, 'network', None, str(e))
+
+    def _retry(self, request, reason, delay, detail):
+        """Programar reintento o fallar definitivamente"""
+        if request.attempts > self.max_retries:
+            metrics.TELEGRAM_SEND_ERRORS.inc(method=request.method)
+            logger.error(f"❌ Telegram {request.method} falló tras {request.attempts} intentos: {detail}")
+            request.future.set_exception(RuntimeError(detail))
+            return None
+
+        if delay is None:
+            delay = min(30.0, 0.5 * 2 ** (request.attempts - 1))
+        TELEGRAM_SEND_RETRIES.inc(method=request.method, reason=reason)
+        logger.warning(f"⚠️ Reintentando Telegram {request.method} en {delay}s ({detail})")
+        return time.monotonic() + delay
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Despachador compartido del proceso"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = TelegramDispatcher()
+            atexit.register(_dispatcher.shutdown)
+        return _dispatcher
@@ -0,0 +1,90 @@
+"""
+Archivos enviados al bot (documentos y fotos)
+
+Resuelve el file_id con getFile y abre la descarga como stream para que el
+uploader la reenvíe a OJS sin guardarla en disco ni en memoria.
+"""
+
+import os
+import threading
+
+# La Bot API solo permite descargar archivos de hasta 20 MB con getFile
+MAX_FILE_SIZE = 20 * 1024 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sesión HTTP compartida con pool de conexiones"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def message_attachment(message):
+    """Documento o foto (la de mayor resolución) de un mensaje, o None"""
+    document = message.get('document')
+    if document:
+        return {
+            'file_id': document['file_id'],
+            'file_name': document.get('file_name') or f"documento_{document.get('file_unique_id', 'telegram')}",
+            'file_size': document.get('file_size'),
+            'mime_type': document.get('mime_type'),
+        }
+
+    photos = message.get('photo')
+    if photos:
+        photo = max(photos, key=lambda p: p.get('file_size') or p.get('width', 0) * p.get('height', 0))
+        return {
+            'file_id': photo['file_id'],
+            'file_name': f"foto_{photo.get('file_unique_id', 'telegram')}.jpg",
+            'file_size': photo.get('file_size'),
+            'mime_type': 'image/jpeg',
+        }
+    return None
+
+
+def is_link_list(attachment):
+    """Documento de texto plano que puede ser una lista de enlaces (link_ingest)"""
+    return (attachment.get('mime_type') == 'text/plain'
+            or attachment.get('file_name', '').lower().endswith('.txt'))
+
+
+class TelegramFileClient:
+    """Descarga de archivos de la Bot API"""
+
+    def __init__(self, token, api_url=None, timeout=30):
+        self.token = token
+        self.api_url = (api_url or os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')).rstrip('/')
+        self.timeout = timeout
+        self.session = get_session()
+
+    def get_file(self, file_id):
+        """Metadatos del archivo (file_path, file_size)"""
+        response = self.session.post(f"{self.api_url}/bot{self.token}/getFile",
+                                     json={'file_id': file_id}, timeout=self.timeout)
+        data = response.json()
+        if not data.get('ok'):
+            raise RuntimeError(data.get('description') or f"getFile HTTP {response.status_code}")
+        return data['result']
+
+    def file_url(self, file_path):
+        """URL de descarga del contenido de un archivo"""
+        return f"{self.api_url}/file/bot{self.token}/{file_path}"
+
+    def open(self, file_path):
+        """Respuesta en streaming con el contenido (cerrar al terminar)"""
+        response = self.session.get(self.file_url(file_path),
+                                    stream=True, timeout=self.timeout,
+                                    headers={'Accept-Encoding': 'identity'})
+        response.raise_for_status()
+        return response
@@ -3,25 +3,33 @@ Manejador de Telegram para Render
 """
 
 import logging
-import requests
+import os
 import json
 from datetime import datetime
-import threading
+
+from jobs import QueueFullError
+from link_ingest import CANDIDATE_PATTERN, LinkIngestor
+from telegram_dispatcher import get_dispatcher
+from telegram_files import MAX_FILE_SIZE, is_link_list, message_attachment
 
 logger = logging.getLogger(__name__)
 
 class TelegramHandler:
     """Manejador de Telegram para el bot en Render"""
     
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, job_manager=None):
         self.config_manager = config_manager
-        self.base_url = "https://api.telegram.org/bot"
-        self.config = {}
-        self.load_config()
+        self.job_manager = job_manager
+        self.base_url = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/') + "/bot"
         
+    @property
+    def config(self):
+        """Configuración actual (instantánea cacheada por ConfigManager)"""
+        return self.config_manager.get_telegram_config()
+    
     def load_config(self):
         """Cargar configuración"""
-        self.config = self.config_manager.get_telegram_config()
+        return self.config
     
     def get_bot_token(self):
         """Obtener token del bot"""
@@ -59,6 +67,7 @@ class TelegramHandler:
                 'drop_pending_updates': True
             }
             
+            import requests
             response = requests.post(url, json=payload, timeout=10)
             response.raise_for_status()
             
@@ -67,8 +76,7 @@ class TelegramHandler:
                 logger.info(f"✅ Webhook configurado: {webhook_url}")
                 
                 # Actualizar configuración
-                self.config['telegram_webhook_url'] = webhook_url
-                self.config_manager.update_telegram_config(self.config)
+                self.config_manager.update_telegram_config({'telegram_webhook_url': webhook_url})
                 
                 return True
             else:
@@ -87,6 +95,7 @@ class TelegramHandler:
                 return False
             
             url = f"{self.base_url}{token}/deleteWebhook"
+            import requests
             response = requests.post(url, timeout=10)
             response.raise_for_status()
             
@@ -104,29 +113,9 @@ class TelegramHandler:
             if not token:
                 return False
             
-            url = f"{self.base_url}{token}/sendMessage"
-            
-            payload = {
-                'chat_id': chat_id,
-                'text': text,
-                'parse_mode': parse_mode,
-                'disable_web_page_preview': True
-            }
-            
-            # Intentar enviar sin bloquear
-            def send_async():
-                try:
-                    response = requests.post(url, json=payload, timeout=10)
-                    response.raise_for_status()
-                    logger.info(f"📤 Mensaje enviado a {chat_id}")
-                except Exception as e:
-                    logger.error(f"❌ Error enviando mensaje: {str(e)}")
-            
-            # Enviar en hilo separado
-            thread = threading.Thread(target=send_async)
-            thread.daemon = True
-            thread.start()
-            
+            # Encolar en el despachador compartido (no bloquea)
+            get_dispatcher().send_message(token, chat_id, text, parse_mode=parse_mode,
+                                          disable_web_page_preview=True)
             return True
             
         except Exception as e:
@@ -141,7 +130,7 @@ class TelegramHandler:
         return False
     
     def handle_webhook_update(self, update):
-        """Manejar actualizaciones del webhook"""
+        """Manejar actualizaciones del webhook (desde la cola de updates)"""
         try:
             if 'message' in update:
                 message = update['message']
@@ -164,8 +153,19 @@ class TelegramHandler:
                     return True
                     
                 elif text.startswith('/upload'):
-                    # Implementar lógica de subida
-                    self.send_message(chat_id, "⏳ Procesando subida...")
+                    self.handle_upload_command(message)
+                    return True
+                
+                elif text.startswith('/report'):
+                    self.handle_report_command(message)
+                    return True
+                
+                elif message.get('document') or message.get('photo'):
+                    self.handle_attachment(message)
+                    return True
+                
+                elif text and not text.startswith('/') and CANDIDATE_PATTERN.search(text):
+                    self.handle_links_message(message)
                     return True
             
             return False
@@ -174,6 +174,186 @@ class TelegramHandler:
             logger.error(f"❌ Error manejando webhook: {str(e)}")
             return False
     
+    # ==================== SUBIDA DESDE TELEGRAM ====================
+    def is_admin_message(self, message):
+        """Solo el administrador puede subir archivos"""
+        admin_id = str(self.get_admin_id() or '')
+        sender = str((message.get('from') or {}).get('id', ''))
+        return bool(admin_id) and sender == admin_id
+    
+    def get_upload_target(self, chat_id):
+        """Revista y envío elegidos con /upload para un chat"""
+        return self.config_manager.telegram_state.get(f"upload_target:{chat_id}")
+    
+    def handle_upload_command(self, message):
+        """/upload <revista> [envío]: elegir destino de los archivos enviados"""
+        chat_id = message['chat']['id']
+        if not self.is_admin_message(message):
+            self.send_message(chat_id, "⛔ Solo el administrador puede subir archivos", parse_mode=None)
+            return
+        
+        args = message.get('text', '').split()[1:]
+        if not args:
+            target = self.get_upload_target(chat_id)
+            current = (f"Destino actual: {target['journal_id']} / envío {target.get('submission_id') or 'automático'}"
+                       if target else "Sin destino configurado")
+            self.send_message(chat_id, f"📤 {current}\n\nUso: /upload <revista> [envío]\n"
+                                       "Después envía documentos o fotos al bot.", parse_mode=None)
+            return
+        
+        journal_id = args[0]
+        journal = self.config_manager.get_journal_config(journal_id)
+        if not journal:
+            self.send_message(chat_id, f"❌ Revista no encontrada: {journal_id}", parse_mode=None)
+            return
+        
+        submission_id = args[1] if len(args) > 1 else journal.get('default_submission_id')
+        self.config_manager.telegram_state.set(f"upload_target:{chat_id}",
+                                               {'journal_id': journal_id, 'submission_id': submission_id})
+        self.send_message(chat_id, f"✅ Destino: {journal.get('name') or journal_id} / envío "
+                                   f"{submission_id or 'automático'}\nEnvía documentos, fotos o enlaces (texto o .txt) "
+                                   "para subirlos.",
+                          parse_mode=None)
+    
+    def handle_report_command(self, message):
+        """/report [revista] [envío]: último reporte (por defecto, del destino del chat)"""
+        chat_id = message['chat']['id']
+        if not self.is_admin_message(message):
+            self.send_message(chat_id, "⛔ Solo el administrador puede ver reportes", parse_mode=None)
+            return
+        
+        from reports import describe_report
+        
+        args = message.get('text', '').split()[1:]
+        if len(args) >= 2:
+            journal_id, submission_id = args[0], args[1]
+        elif args:
+            journal_id, submission_id = None, args[0]
+        else:
+            target = self.get_upload_target(chat_id) or {}
+            journal_id, submission_id = target.get('journal_id'), target.get('submission_id')
+        
+        # Búsqueda en el índice de reportes (SQLite), sin recorrer reports/
+        store = self.config_manager.report_store
+        if submission_id:
+            report = store.latest(submission_id, journal_id)
+        else:
+            reports = store.list(journal_id=journal_id, limit=1)
+            report = reports[0] if reports else None
+        
+        if not report:
+            scope = f"el envío {submission_id}" if submission_id else "este destino"
+            self.send_message(chat_id, f"📄 No hay reportes para {scope}\n\nUso: /report [revista] [envío]",
+                              parse_mode=None)
+            return
+        self.send_message(chat_id, describe_report(report), parse_mode=None)
+    
+    def handle_attachment(self, message):
+        """Documento o foto recibido: encolar su subida al destino del chat"""
+        chat_id = message['chat']['id']
+        if not self.is_admin_message(message):
+            self.send_message(chat_id, "⛔ Solo el administrador puede subir archivos", parse_mode=None)
+            return
+        
+        target = self.get_upload_target(chat_id)
+        if not target:
+            self.send_message(chat_id, "⚠️ Primero elige destino: /upload <revista> [envío]", parse_mode=None)
+            return
+        
+        attachment = message_attachment(message)
+        # Un .txt con enlaces es una lista para descargar; sin enlaces se sube como archivo
+        if is_link_list(attachment) and self.handle_link_file(chat_id, target, attachment):
+            return
+        
+        if (attachment.get('file_size') or 0) > MAX_FILE_SIZE:
+            self.send_message(chat_id, "❌ Telegram solo permite a los bots descargar archivos de hasta 20 MB",
+                              parse_mode=None)
+            return
+        
+        if self.job_manager is None:
+            self.send_message(chat_id, "❌ Subidas no disponibles en este proceso", parse_mode=None)
+            return
+        
+        try:
+            self.job_manager.submit(target['journal_id'], target.get('submission_id'), [],
+                                    chat_id=chat_id, files=[attachment])
+        except ValueError as e:
+            self.send_message(chat_id, f"❌ {str(e)}", parse_mode=None)
+        except QueueFullError as e:
+            self.send_message(chat_id, f"⏳ {str(e)}. Vuelve a enviar el archivo en unos minutos.",
+                              parse_mode=None)
+    
+    def handle_links_message(self, message):
+        """Mensaje de texto con enlaces: encolarlos al destino del chat"""
+        chat_id = message['chat']['id']
+        if not self.is_admin_message(message):
+            self.send_message(chat_id, "⛔ Solo el administrador puede subir archivos", parse_mode=None)
+            return
+        
+        target = self.get_upload_target(chat_id)
+        if not target:
+            self.send_message(chat_id, "⚠️ Primero elige destino: /upload <revista> [envío]", parse_mode=None)
+            return
+        
+        if not self.submit_link_list(chat_id, target, message.get('text', '')):
+            self.send_message(chat_id, "❌ No se encontraron enlaces válidos", parse_mode=None)
+    
+    def handle_link_file(self, chat_id, target, attachment):
+        """Archivo .txt: leer sus enlaces en streaming; False si no tiene ninguno"""
+        if (attachment.get('file_size') or 0) > MAX_FILE_SIZE:
+            return False
+        
+        from telegram_files import TelegramFileClient
+        
+        try:
+            client = TelegramFileClient(self.get_bot_token())
+            response = client.open(client.get_file(attachment['file_id'])['file_path'])
+        except Exception as e:
+            logger.error(f"❌ Error descargando lista de enlaces: {str(e)}")
+            return False
+        try:
+            lines = (line.decode('utf-8', errors='replace') for line in response.iter_lines())
+            return self.submit_link_list(chat_id, target, lines)
+        finally:
+            response.close()
+    
+    def submit_link_list(self, chat_id, target, source):
+        """Ingerir enlaces (texto o líneas) y encolar un trabajo por lote
+        
+        Responde al chat con el resumen; devuelve False si no había enlaces.
+        """
+        if self.job_manager is None:
+            self.send_message(chat_id, "❌ Subidas no disponibles en este proceso", parse_mode=None)
+            return True
+        
+        ingestor = LinkIngestor()
+        try:
+            results = self.job_manager.submit_links(target['journal_id'], target.get('submission_id'), source,
+                                                    ingestor=ingestor, chat_id=chat_id,
+                                                    owner=f"telegram:{chat_id}")
+        except ValueError as e:
+            self.send_message(chat_id, f"❌ {str(e)}", parse_mode=None)
+            return True
+        except QueueFullError as e:
+            self.send_message(chat_id, f"⏳ {str(e)}. Vuelve a enviar los enlaces en unos minutos "
+                                       "(los ya encolados no se repiten).", parse_mode=None)
+            return True
+        
+        if not results and not ingestor.invalid:
+            return False
+        
+        created = sum(1 for _, new in results if new)
+        lines = [f"📥 {ingestor.accepted} enlaces en {len(results)} trabajos ({created} nuevos)"]
+        if ingestor.duplicates:
+            lines.append(f"🔁 Duplicados ignorados: {ingestor.duplicates}")
+        if ingestor.invalid:
+            lines.append(f"⚠️ No válidos: {ingestor.invalid}")
+            lines.extend(f"  • {item['link'][:80]} ({item['reason']})" for item in ingestor.rejected[:5])
+        if ingestor.truncated:
+            lines.append(f"✂️ Límite de {ingestor.max_links} enlaces alcanzado; el resto se ignoró")
+        self.send_message(chat_id, "\n".join(lines), parse_mode=None)
+        return True
+    
     def get_start_message(self):
         """Mensaje de inicio del bot"""
         return """
@@ -183,6 +363,7 @@ class TelegramHandler:
 /start - Mostrar este mensaje
 /status - Ver estado del sistema  
 /help - Mostrar ayuda
+/report - Último reporte de subida
 /journals - Listar revistas configuradas
 
 *Configurado para:*
@@ -200,7 +381,7 @@ class TelegramHandler:
 
 *¿Qué puedo hacer?*
 • Subir archivos automáticamente a revistas OJS
-• Descargar desde enlaces directos
+• Descargar desde enlaces directos (pegados o en un archivo .txt)
 • Comprimir en chunks de 10MB
 • Generar reportes en TXT
 
@@ -215,13 +396,13 @@ class TelegramHandler:
     def get_status_message(self):
         """Mensaje de estado"""
         config_status = "✅" if self.is_configured() else "❌"
-        journals = self.config_manager.get_all_journal_configs()
+        journal_count = self.config_manager.count_journal_configs()
         
         return f"""
 📊 *Estado del Sistema*
 
 *Configuración Telegram:* {config_status}
-*Revistas configuradas:* {len(journals)}
+*Revistas configuradas:* {journal_count}
 *Webhook:* {'✅ Activo' if self.config.get('telegram_webhook_url') else '❌ Inactivo'}
 
 *Última actividad:* {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -237,6 +418,7 @@ class TelegramHandler:
                 return False, "Token no configurado"
             
             url = f"{self.base_url}{token}/getMe"
+            import requests
             response = requests.get(url, timeout=10)
             response.raise_for_status()
             
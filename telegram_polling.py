@@ -0,0 +1,119 @@
+"""
+Recepción de updates de Telegram por long polling (getUpdates)
+
+Alternativa al webhook para workers sin acceso público: pide los updates
+en lotes, avanza el offset y los entrega a la misma UpdateQueue que usa el
+webhook, así que los comandos se procesan igual en ambos modos.
+"""
+
+import logging
+import os
+import threading
+
+import requests
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OFFSET_KEY = 'telegram_polling_offset'
+
+TELEGRAM_POLL_BATCH = metrics.REGISTRY.histogram(
+    'telegram_poll_batch_size',
+    'Updates recibidos por llamada a getUpdates',
+    buckets=(0, 1, 5, 10, 25, 50, 100)
+)
+TELEGRAM_POLL_ERRORS = metrics.REGISTRY.counter(
+    'telegram_poll_errors_total',
+    'Errores en llamadas a getUpdates'
+)
+
+
+class TelegramPoller:
+    """Bucle de getUpdates con offset persistente"""
+
+    def __init__(self, token, update_queue, state=None, api_url=None, timeout=30, limit=100,
+                 allowed_updates=None):
+        self.token = token
+        self.update_queue = update_queue
+        self.state = state
+        self.api_url = (api_url or os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')).rstrip('/')
+        self.timeout = timeout
+        self.limit = limit
+        self.allowed_updates = allowed_updates
+        self.offset = int(state.get(OFFSET_KEY, 0) or 0) if state is not None else 0
+        self.session = requests.Session()
+        self.stop_event = threading.Event()
+        self.backlogged = False
+
+    def _call(self, method, payload, timeout):
+        response = self.session.post(f"{self.api_url}/bot{self.token}/{method}",
+                                     json=payload, timeout=timeout)
+        data = response.json()
+        if not data.get('ok'):
+            raise RuntimeError(data.get('description') or f"HTTP {response.status_code}")
+        return data.get('result')
+
+    def delete_webhook(self):
+        """getUpdates no funciona con un webhook activo"""
+        self._call('deleteWebhook', {'drop_pending_updates': False}, timeout=10)
+        logger.info("✅ Webhook eliminado, usando long polling")
+
+    def poll_once(self, timeout=None):
+        """Pedir un lote y encolarlo; devuelve el número de updates aceptados
+
+        Si la cola está llena el offset se queda en el primer update
+        rechazado y se vuelve a pedir más tarde (backlogged=True).
+        """
+        payload = {
+            'offset': self.offset,
+            'timeout': self.timeout if timeout is None else timeout,
+            'limit': self.limit,
+        }
+        if self.allowed_updates is not None:
+            payload['allowed_updates'] = self.allowed_updates
+
+        updates = self._call('getUpdates', payload, timeout=payload['timeout'] + 10) or []
+        accepted = 0
+        self.backlogged = False
+        for update in updates:
+            if self.update_queue.submit(update) == 'shed':
+                self.backlogged = True
+                break
+            self.offset = max(self.offset, update['update_id'] + 1)
+            accepted += 1
+
+        TELEGRAM_POLL_BATCH.observe(len(updates))
+        if accepted and self.state is not None:
+            self.state.set(OFFSET_KEY, self.offset)
+        return accepted
+
+    def run(self):
+        """Bucle principal hasta stop(); reintenta errores con backoff"""
+        logger.info(f"📡 Long polling iniciado (offset {self.offset})")
+        failures = 0
+        webhook_deleted = False
+        while not self.stop_event.is_set():
+            try:
+                if not webhook_deleted:
+                    self.delete_webhook()
+                    webhook_deleted = True
+                self.poll_once()
+                failures = 0
+                if self.backlogged:
+                    logger.warning("🚦 Cola de updates llena, esperando antes de pedir más")
+                    self.stop_event.wait(1)
+            except Exception as e:
+                failures += 1
+                TELEGRAM_POLL_ERRORS.inc()
+                delay = min(60, 2 ** failures)
+                method = 'getUpdates' if webhook_deleted else 'deleteWebhook'
+                logger.error(f"❌ Error en {method}: {str(e)} (reintento en {delay}s)")
+                self.stop_event.wait(delay)
+
+        if self.state is not None:
+            self.state.flush()
+        logger.info("🛑 Long polling detenido")
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,171 @@
+"""
+Cola de updates entrantes de Telegram
+
+El webhook solo encola y responde; un pool de workers procesa los updates.
+Cada chat se asigna siempre al mismo worker (orden por chat) y los
+`update_id` recientes se recuerdan en un LRU acotado para descartar las
+reentregas que Telegram hace cuando el webhook tarda. Con varios procesos
+(workers de gunicorn) la reentrega puede llegar a otro proceso, así que el
+LRU se complementa con `claim`, un registro compartido (storage.UpdateStore).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_UPDATES = metrics.REGISTRY.counter(
+    'telegram_updates_total',
+    'Updates de Telegram recibidos por resultado (queued, duplicate, shed)',
+    ('outcome',)
+)
+TELEGRAM_UPDATE_QUEUE_DEPTH = metrics.REGISTRY.gauge(
+    'telegram_update_queue_depth',
+    'Updates de Telegram pendientes de procesar'
+)
+TELEGRAM_UPDATE_DURATION = metrics.REGISTRY.histogram(
+    'telegram_update_duration_seconds',
+    'Tiempo de procesamiento de un update de Telegram',
+    ('outcome',)
+)
+
+
+def update_chat_id(update):
+    """Chat al que pertenece un update (None si no tiene)"""
+    for key in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if key in update:
+            return (update[key].get('chat') or {}).get('id')
+    callback = update.get('callback_query')
+    if callback:
+        return ((callback.get('message') or {}).get('chat') or {}).get('id')
+    return None
+
+
+class RecentIds:
+    """Conjunto LRU de tamaño máximo fijo"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        """Registrar un id; False si ya estaba"""
+        with self._lock:
+            if value in self._ids:
+                self._ids.move_to_end(value)
+                return False
+            self._ids[value] = None
+            if len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class UpdateQueue:
+    """Pool de workers para updates con orden por chat y deduplicación
+
+    `handler(update)` puede devolver un texto ('ok', 'ignored', 'error') que
+    se usa como etiqueta de la métrica de duración. Con max_pending updates
+    sin procesar, submit() rechaza ('shed') para que Telegram los reentregue.
+    `claim(update_id)`, si se indica, devuelve False cuando otro proceso ya
+    recibió el update; si falla, el update se procesa igualmente.
+    """
+
+    def __init__(self, handler, workers=4, max_seen=10000, max_pending=1000, claim=None):
+        self.handler = handler
+        self.claim = claim
+        self.workers = workers
+        self.max_pending = max_pending
+        self.seen = RecentIds(max_seen)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queues = []
+        self._pending = 0
+
+    def _ensure_started(self):
+        """Arrancar los workers en el primer uso (por proceso)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending = 0
+        self._queues = []
+        for i in range(self.workers):
+            shard = queue.Queue()
+            thread = threading.Thread(target=self._worker, args=(shard,),
+                                      name=f"telegram-in-{i}", daemon=True)
+            thread.start()
+            self._queues.append(shard)
+
+    def submit(self, update):
+        """Encolar un update; devuelve 'queued', 'duplicate' o 'shed' (cola llena)"""
+        # Antes de marcarlo como visto: la reentrega de un update rechazado no es duplicado
+        if self.max_pending and self.pending() >= self.max_pending:
+            TELEGRAM_UPDATES.inc(outcome='shed')
+            return 'shed'
+
+        update_id = update.get('update_id')
+        if update_id is not None and (not self.seen.add(update_id) or not self._claim(update_id)):
+            TELEGRAM_UPDATES.inc(outcome='duplicate')
+            logger.info(f"🔁 Update {update_id} repetido, descartado")
+            return 'duplicate'
+
+        chat_id = update_chat_id(update)
+        with self._lock:
+            self._ensure_started()
+            shard = self._queues[hash(str(chat_id)) % self.workers]
+            self._pending += 1
+            TELEGRAM_UPDATE_QUEUE_DEPTH.set(self._pending)
+        shard.put(update)
+        TELEGRAM_UPDATES.inc(outcome='queued')
+        return 'queued'
+
+    def _claim(self, update_id):
+        """Registro compartido entre procesos; True si el update es nuevo"""
+        if self.claim is None:
+            return True
+        try:
+            return self.claim(update_id)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo registrar el update {update_id}: {str(e)}")
+            return True
+
+    def pending(self):
+        """Updates en cola o en proceso"""
+        with self._lock:
+            return self._pending
+
+    def join(self, timeout=None):
+        """Esperar a que se procesen los updates encolados; False si vence el timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _worker(self, shard):
+        while True:
+            update = shard.get()
+            started = time.monotonic()
+            outcome = 'ok'
+            try:
+                result = self.handler(update)
+                if isinstance(result, str):
+                    outcome = result
+            except Exception as e:
+                outcome = 'error'
+                logger.error(f"❌ Error procesando update {update.get('update_id')}: {str(e)}")
+            finally:
+                TELEGRAM_UPDATE_DURATION.observe(time.monotonic() - started, outcome=outcome)
+                with self._lock:
+                    self._pending -= 1
+                    TELEGRAM_UPDATE_QUEUE_DEPTH.set(self._pending)